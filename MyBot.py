@@ -12,32 +12,69 @@ to log anything use the logging module.
 """
 # Let's start by importing the Halite Starter Kit so we can interface with the Halite engine
 import hlt
+from hlt.distances import ENEMY_SHIPS, OWN_SHIPS, PLANETS
 import math
 # Then let's import the logging module so we can print out information
 import logging
 import random
-from collections import OrderedDict
+from enum import Enum
 
 NAV_CORRECTIONS = 6
 NAV_ANGLE_STEP = 15
+# Degrees the navigation may deviate to either side of the target
+NAV_MAX_DEVIATION = NAV_CORRECTIONS * NAV_ANGLE_STEP
+# Obstacles further along the path than two turns of travel are left for later turns
+NAV_LOOKAHEAD = 2 * hlt.constants.MAX_SPEED
+# A unit keeps its route while its destination stays this close to where the route was planned for
+ROUTE_TOLERANCE = hlt.constants.MAX_SPEED
+# The ships near a ship are only searched again once it moved half of this, every other turn at full speed
+NEIGHBOUR_SKIN = 2 * hlt.constants.MAX_SPEED
+# How many units may be sent after the same enemy ship
+HUNTERS_PER_TARGET = 2
+DEFENDERS_PER_THREAT = 2
+
+
+class Task(Enum):
+    STAY_DOCKED = "stay_docked"
+    AVOID_DANGER = "avoid_danger"
+    COLLONIZE_PLANET = "collonize_planet"
+    HUNTER = "hunter"
+    DEFENDER = "defender"
+    FIGHTER = "fighter"
+    OFFENSIVE_SWARM = "offensive_swarm"
+    CORNER_RAT = "corner_rat"
+
+
+# The current task of a unit without one yet is None
+ANY_TASK = frozenset(Task) | {None}
+
+# Targets the rules ask for are picked afterwards, for all units asking at once: the group searched, the mask of the
+# turn to apply (an attribute of CommandCenter), the max_distance passed to closest_entities, and how many units one
+# target takes (None for the free docking spots of a planet)
+DOCKED_ENEMY = (ENEMY_SHIPS, "docked_enemy_mask", 100, HUNTERS_PER_TARGET)
+EMPTY_PLANET = (PLANETS, "empty_planet_mask", math.inf, None)
+ANY_ENEMY = (ENEMY_SHIPS, None, 15, HUNTERS_PER_TARGET)
+THREAT = (ENEMY_SHIPS, "threat_mask", math.inf, DEFENDERS_PER_THREAT)
 
 
 class CommandCenter(object):
     def __init__(self, game):
         self.game = game
         self.game_map = None
+        # Planets never move: the ways around them are worked out once, before the first turn
+        self.paths = hlt.pathfinding.VisibilityGraph(game.initial_map.all_planets(),
+                                                     game.initial_map.width, game.initial_map.height)
         self.me = None
+        # Collision checks read the ships near a ship from lists kept across turns
+        game.map.track_neighbours(NAV_LOOKAHEAD, NEIGHBOUR_SKIN)
 
-        self.units = []
-        self.targeted_planets = {}
+        self.units = UnitRegistry()
+        # One assignment per kind of target, each starting from where it left off the turn before
+        self.assigners = {}
         self.targeted_enemy_ships = {}
 
-        self.owned_ships = None
-        self.all_planets = None
-        self.owned_planets = None
-        self.enemy_planets = None
-        self.empty_planets = None
-        self.full_planets = None
+        self.world = None
+        self.planner = None
 
         self.early_hunters = 0
 
@@ -47,7 +84,6 @@ class CommandCenter(object):
         self.turn += 1
         self.game_map = self.game.update_map()
         self.me = self.game_map.get_me()
-        self.owned_ships = self.me.all_ships()
 
         # # logging.info(":: updating map data ::")
         self.update_map_data()
@@ -60,401 +96,442 @@ class CommandCenter(object):
         # # logging.info(f"tasks: {[(u.get_ship(), u.get_task()) for u in self.units]}")
         # # logging.info(":: -------------- executing tasks")
         self.execute_tasks()
-        # # logging.info(f"-----active targets: {self.targeted_planets}")
 
     def update_units(self):
-        # # logging.info(f"owned_ships: {len(self.owned_ships)} - {self.owned_ships}")
-
-        updated_units = []
-        # Remove ships that have died
-        for unit in self.units:
-            # # logging.info(f"start compare: {unit.get_ship()} - {[s.id for s in self.owned_ships]}")
-            if unit.get_ship() in [s.id for s in self.owned_ships]:
-                # # logging.info(f"    still alive: {unit.get_ship()}")
-                updated_units.append(unit)
-            else: # unit died
-                self.update_targeted_planets(unit, None)
-                # else:
-                # # logging.info(f"    unit died: {unit.get_ship()}")
-                # self.units.pop(i)
-                # Remove it's targets from the targetlist
-                # if unit.target in self.targeted_planets.keys():
-                #     self.targeted_planets[unit.target] -= 1
-
-        self.units = updated_units
-        # # logging.info(f"unit_check A: {len(self.units)} - {[(unit.get_ship(), unit) for unit in self.units]}")
-
-        # Add new ships that are not yet in the log
-        for ship in self.owned_ships:
-            if ship.id not in [u.get_ship() for u in self.units]:
-                # # logging.info(f"    Adding: {ship.id}")
-                new_unit = Unit(ship.id)
-                self.units.append(new_unit)
-
-        # # logging.info(f"unit_check B: {len(self.units)} - {[(unit.get_ship(), unit) for unit in self.units]}")
+        # Forget the units whose ship died and start a unit for every new ship
+        self.units.reconcile(self.world.owned_ship_ids, self.world.owned_ships)
 
     def update_map_data(self):
-        self.all_planets = self.game_map.all_planets()
-        self.owned_ships = self.me.all_ships()
-        self.enemy_ships = [s for s in self.game_map._all_ships() if s.owner != self.me]
-        self.owned_planets = [p for p in self.game_map.all_planets() if p.is_owned() and p.owner == self.me]
-        self.enemy_planets = [p for p in self.game_map.all_planets() if p.is_owned() and p.owner != self.me]
-        self.empty_planets = [p for p in self.game_map.all_planets() if len(p.all_docked_ships()) == 0]
-        self.full_planets = [p for p in self.game_map.all_planets() if p.is_full()]
-
-    def update_targeted_planets(self, unit, planet):
-        previous_target = unit.get_target(self.game_map)
-        if (previous_target != None) and (previous_target.id in self.targeted_planets.keys()):
-            self.targeted_planets[previous_target.id] -= 1
-            # logging.info(f"SUBTRACTING, new value {self.targeted_planets[previous_target.id]}")
-        elif planet:
-            unit.set_target(planet)
-            if planet.id in self.targeted_planets.keys():
-                self.targeted_planets[planet.id] += 1
-                # logging.info(f"ADDING, new value {self.targeted_planets[planet.id]}")
-            else:
-                self.targeted_planets[planet.id] = 1
-                # logging.info(f"KEY NOT FOUND, SETTING, new value {self.targeted_planets[planet.id]}")
-        else:
-            pass
+        self.world = WorldView(self.game_map)
+        self.distances = self.game_map.distance_table()
+        self.docked_enemy_mask = self.distances.mask(ENEMY_SHIPS, self.is_docked_enemy_ship)
+        self.empty_planet_mask = self.distances.mask(PLANETS, is_empty_planet)
+
+    def is_docked_enemy_ship(self, ship):
+        return ship.owner != self.me and ship.docking_status is hlt.entity.Ship.DockingStatus.DOCKED
 
     def determine_threats(self, threat_distance=50):
         threats = {}
-        for planet in self.owned_planets:
-            for ship in self.enemy_ships:
-                distance = planet.calculate_distance_between(ship)
-                if distance <= threat_distance:
-                    if planet.id not in threats.keys():
-                        threats[planet.id] = [ship.id]
-                    else:
-                        threats[planet.id].append(ship.id)
+        for planet in self.world.owned_planets:
+            ships = self.distances.within(planet, ENEMY_SHIPS, threat_distance)
+            if ships:
+                threats[planet.id] = [ship.id for ship in ships]
         return threats
 
     def determine_defender_candidates(self, threat_distance=50):
         candidates = {}
-        for planet in self.owned_planets:
-            for ship in self.owned_ships:
-                distance = planet.calculate_distance_between(ship)
-                if distance <= threat_distance:
-                    if planet.id not in candidates.keys():
-                        candidates[planet.id] = [ship.id]
-                    else:
-                        candidates[planet.id].append(ship.id)
+        for planet in self.world.owned_planets:
+            ships = self.distances.within(planet, OWN_SHIPS, threat_distance)
+            if ships:
+                candidates[planet.id] = [ship.id for ship in ships]
         return candidates
 
     def determine_tasks(self):
         testing = False
 
-        threats = self.determine_threats(threat_distance=20)
-        defender_candidates = self.determine_defender_candidates(threat_distance=70)
+        self.threats = self.determine_threats(threat_distance=20)
+        self.defender_candidates = self.determine_defender_candidates(threat_distance=70)
+        # The threat an enemy poses is how close it is to the nearest of our planets it is near
+        self.threat_levels = {}
+        for planet_id, enemies in self.threats.items():
+            planet = self.game_map.get_planet(planet_id)
+            for enemy_id in enemies:
+                distance = self.distances.get(self.game_map.get_ship(enemy_id), planet)
+                self.threat_levels[enemy_id] = min(distance, self.threat_levels.get(enemy_id, math.inf))
+        self.threat_mask = self.distances.mask(ENEMY_SHIPS, lambda enemy: enemy.id in self.threat_levels)
         # logging.info(f"Threats: {threats}")
         # logging.info(f"Defender_candidates: {defender_candidates}")
+        self.picks = {}
 
         for unit in self.units:
-            ship = ship_by_id(self.owned_ships, unit.get_ship())
-            current_task = unit.get_task()
-            # # logging.info(f"previously: {unit.get_ship()} - {unit.get_age()} - {current_task}")
-            # # logging.info("[1]")
+            ship = self.game_map.get_ship(unit.get_ship())
             if testing == True:  # To test develop and test behaviour #
-                unit.set_task("corner_rat")
-                continue
-
-            if current_task == "stay_docked":
-                if ship.docking_status is hlt.entity.Ship.DockingStatus.DOCKED:
-                    continue
-
-            if current_task == "corner_rat":
-                # # logging.info("[2A] staying docked")
+                unit.set_task(Task.CORNER_RAT)
                 continue
 
-            if unit.get_age() == 0:
-                coinflip = random.random()
-                if coinflip > 0.5:
-                    will_dock = False
-                    for p in self.all_planets:
-                        if ship.can_dock(p) and p not in self.enemy_planets and not p.is_full():
-                            unit.set_target(p)
-                            unit.set_task("collonize_planet")
-                            will_dock = True
-                    if will_dock:
-                        continue
-
-                # # logging.info("[2B] ---> avoid danger!! <---")
-                unit.set_task("avoid_danger")
-                continue
-
-            # no planets anymore but we have ships and there are empty planest. GOGOGO!
-            if len(self.owned_planets) == 0 and len(self.empty_planets) > 0:
-                planets_by_distance = list(sort_entities_by_distance(ship, self.empty_planets).items())
-                # # logging.info(f"planets by distance: {planets_by_distance}")
-                # i = 0
-                if planets_by_distance:
-                    unit.set_task("collonize_planet")
-                    target = planets_by_distance[0][0]
-                    self.update_targeted_planets(unit, target)
-                    continue
-
-            # logging.info(f"early hunter testA: {(len(self.owned_ships) > 3)} - {(self.turn < 50)} - {(self.early_hunters < 2)}")
-            # logging.info(f"early hunter testB: {(len(self.owned_ships) > 3) and (self.turn < 50) and (self.early_hunters < 2)}")
-            if ((len(self.owned_ships) > 3) and (self.turn < 50) and (self.early_hunters < 2)) or current_task == "hunter":
-                # logging.info(f"------------assigning hunter: {ship.id}")
-                if current_task != "hunter":
-                    self.early_hunters += 1
-                closest_docked_enemy_ship = closest_entity(ship, [s for s in self.enemy_ships if s.docking_status is hlt.entity.Ship.DockingStatus.DOCKED], max_distance=100)
-                # logging.info(f"------closest_enemy_ship: {closest_docked_enemy_ship}")
-                if closest_docked_enemy_ship:
-                    unit.set_target(closest_docked_enemy_ship)
-                    unit.set_task("hunter")
-                else:
-                    unit.set_target(None)
-                    unit.set_task("hunter")
-                # whilst NOT close to the specific docked ship, increase the radius perhaps to avoid enemies
-                continue
-
-
-            # Defense calculation
-            bolster_defense = False
-            for planet in threats.keys():
-                if len(threats[planet]) > 0:
-                    if ship.id in defender_candidates[planet]:
-                        unit.set_task("defender")
-                        unit.set_target(ship_by_id(self.enemy_ships, threats[planet][0]))
-                        bolster_defense = True
+            current_task = unit.get_task()
+            for tasks, rule in TASK_RULES:
+                if current_task in tasks:
+                    task = rule(self, unit, ship, current_task)
+                    if task is not None:
+                        unit.set_task(task)
                         break
 
-            if bolster_defense:
-                continue
-
-
-            if current_task == "collonize_planet":
-                continue
-
-
-            # logging.info(f"empty_planets: {self.empty_planets}")
-            # logging.info(f"targets: {self.targeted_planets}")
-            if (len(self.empty_planets) > 0) and (current_task not in ["hunter", "defender"]):
-                unit.set_task("collonize_planet")
-                # # logging.info("[2C] updating task to collonization!!!")
-                planets_by_distance = list(sort_entities_by_distance(ship, self.empty_planets).items())
-                # # logging.info(f"planets by distance: {planets_by_distance}")
-                # i = 0
-                if planets_by_distance:
-                    target = planets_by_distance[0][0]
-                    self.update_targeted_planets(unit, target)
-                    continue
-                    # for planet, distance in planets_by_distance:
-                    #     # logging.info(f"planet: {planet.id} - in targets: {(planet.id in self.targeted_planets.keys())}")
-                    #     if planet.id in self.targeted_planets.keys():
-                    #         if self.targeted_planets[planet.id] > 0:
-                    #             continue
-                    #     else:
-                    #         target = planet
-                    #         self.update_targeted_planets(unit, target)
-                    #
-                    # if not unit.get_target(self.game_map):
-                    #     pass
-                    # else:
-                    #     continue
-
-            corner_rat = random.random()
-            if corner_rat > 0.92:
-                unit.set_task("corner_rat")
-                continue
-
-            if len(self.enemy_planets) > 0:
-                # # logging.info("[2D] offensive swarm branch")
-                # this takes more priority probably
-                closest_docked_enemy_ship = closest_entity(ship, [s for s in self.enemy_ships if s.docking_status is hlt.entity.Ship.DockingStatus.DOCKED], max_distance=100)
-                # logging.info(f"------closest_enemy_ship: {closest_docked_enemy_ship}")
-                if closest_docked_enemy_ship:
-                    unit.set_target(closest_docked_enemy_ship)
-                    unit.set_task("hunter")
-                else:
-                    unit.set_target(None)
-                    unit.set_task("hunter")
-
-                continue
-
-            if not unit.get_target(self.game_map) or not unit.get_task():
-                closest_enemy_ship = closest_entity(ship, self.enemy_ships)
-
-                if closest_enemy_ship:
-                    unit.set_target(closest_enemy_ship)
-                    unit.set_task("fighter")
-                else:
-                    unit.set_target(None)
-                    unit.set_task("fighter")
+        self.pick_targets()
+
+    def pick_target(self, unit, ship, kind):
+        self.picks.setdefault(kind, []).append((unit, ship))
+
+    def pick_targets(self):
+        # The targets of each kind are shared out among the units asking for one, at the least total distance. Units
+        # left over once every target is taken get the closest one anyway
+        for kind, requests in self.picks.items():
+            group, mask, max_distance, _ = kind
+            ships = [ship for _, ship in requests]
+            targets = self.assign_targets(kind, ships)
+            left_over = [index for index, target in enumerate(targets) if target is None]
+            if left_over:
+                closest = closest_entities(self.distances, [ships[index] for index in left_over], group,
+                                           getattr(self, mask) if mask else None, max_distance=max_distance)
+                for index, target in zip(left_over, closest):
+                    targets[index] = target
+            for (unit, _), target in zip(requests, targets):
+                unit.set_target(target)
+
+    def assign_targets(self, kind, ships):
+        group, mask, max_distance, share = kind
+        allowed = getattr(self, mask) if mask else None
+        # A column for every place at a target: a free docking spot of a planet, or one of the units an enemy takes
+        columns, keys = [], []
+        for index, target in enumerate(self.distances.entities(group)):
+            if allowed is None or allowed[index]:
+                places = share if share else target.num_docking_spots - len(target.all_docked_ships())
+                for place in range(places):
+                    columns.append(index)
+                    keys.append((target.id, place))
+        if not columns:
+            return [None] * len(ships)
+
+        targets = self.distances.entities(group)
+        offsets = [self.threat_levels[targets[index].id] if kind is THREAT else 0 for index in columns]
+        limit = max_distance * 8
+        costs = []
+        for ship in ships:
+            row = self.distances.row(ship, group)
+            costs.append([row[index] + offset if row[index] <= limit else hlt.assignment.FORBIDDEN
+                          for index, offset in zip(columns, offsets)])
+
+        if kind not in self.assigners:
+            self.assigners[kind] = hlt.assignment.Assigner()
+        assigner = self.assigners[kind]
+        assigned = assigner.assign([ship.id for ship in ships], keys, costs)
+        by_id = {target.id: target for target in targets}
+        return [by_id[assigned[ship.id][0]] if ship.id in assigned else None for ship in ships]
+
+    def rule_keep_task(self, unit, ship, current_task):
+        return current_task
+
+    def rule_stay_docked(self, unit, ship, current_task):
+        if ship.docking_status is hlt.entity.Ship.DockingStatus.DOCKED:
+            return current_task
+
+    def rule_new_unit(self, unit, ship, current_task):
+        if unit.get_age() == 0:
+            coinflip = random.random()
+            if coinflip > 0.5:
+                will_dock = False
+                for p in self.world.all_planets:
+                    if self.distances.can_dock(ship, p) and p.id not in self.world.enemy_planet_ids \
+                            and p.id not in self.world.full_planet_ids:
+                        unit.set_target(p)
+                        will_dock = True
+                if will_dock:
+                    return Task.COLLONIZE_PLANET
+
+            # # logging.info("[2B] ---> avoid danger!! <---")
+            return Task.AVOID_DANGER
+
+    def rule_no_planets_left(self, unit, ship, current_task):
+        # no planets anymore but we have ships and there are empty planest. GOGOGO!
+        if len(self.world.owned_planets) == 0 and len(self.world.empty_planets) > 0:
+            self.pick_target(unit, ship, EMPTY_PLANET)
+            return Task.COLLONIZE_PLANET
+
+    def rule_early_hunter(self, unit, ship, current_task):
+        if ((len(self.world.owned_ships) > 3) and (self.turn < 50) and (self.early_hunters < 2)) \
+                or current_task is Task.HUNTER:
+            if current_task is not Task.HUNTER:
+                self.early_hunters += 1
+            # whilst NOT close to the specific docked ship, increase the radius perhaps to avoid enemies
+            self.pick_target(unit, ship, DOCKED_ENEMY)
+            return Task.HUNTER
+
+    def rule_defend(self, unit, ship, current_task):
+        for planet in self.threats:
+            if ship.id in self.defender_candidates.get(planet, ()):
+                self.pick_target(unit, ship, THREAT)
+                return Task.DEFENDER
+
+    def rule_collonize(self, unit, ship, current_task):
+        if len(self.world.empty_planets) > 0:
+            self.pick_target(unit, ship, EMPTY_PLANET)
+            return Task.COLLONIZE_PLANET
+
+    def rule_corner_rat(self, unit, ship, current_task):
+        if random.random() > 0.92:
+            return Task.CORNER_RAT
+
+    def rule_raid(self, unit, ship, current_task):
+        if len(self.world.enemy_planets) > 0:
+            self.pick_target(unit, ship, DOCKED_ENEMY)
+            return Task.HUNTER
+
+    def rule_fight(self, unit, ship, current_task):
+        if not unit.get_target(self.game_map) or not current_task:
+            self.pick_target(unit, ship, ANY_ENEMY)
+            return Task.FIGHTER
 
     def execute_tasks(self):
-        self.command_queue = []
+        self.planner = hlt.navigation.MovePlanner(self.game_map, max_corrections=NAV_MAX_DEVIATION,
+                                                  lookahead=NAV_LOOKAHEAD)
+        commands = {}
 
+        batches = {}
         for unit in self.units:
-            ship = ship_by_id(self.owned_ships, unit.get_ship())
-            task = unit.get_task()
-            logging.info(task)
             unit.age()
-            # # logging.info(f"unit task: {unit.get_ship()} - age: {unit.get_age()} - {task}")
-            command = None
-
-            if task == "stay_docked" and ship.docking_status == hlt.entity.Ship.DockingStatus.DOCKED:
-                unit.set_task("stay_docked")
-                continue
-
-            elif task == "avoid_danger":
-                command = self.avoid_danger(unit)
-                # # logging.info(f"unit command: {command}")
-
-            elif task == "collonize_planet":
-                command = self.collonize_planet(unit)
-
-            elif task == "hunter":
-                command = self.hunter(unit)
-
-            elif task == "defender":
-                command = self.hunter(unit)
-
-            elif task == "fighter":
-                command = self.hunter(unit)
-
-            elif task == "offensive_swarm":
-                command = self.offensive_swarm(unit)
+            batches.setdefault(unit.get_task(), []).append(unit)
+
+        # Every handler moves all units of its task at once, one task after the other
+        for task, handler in TASK_HANDLERS.items():
+            units = batches.get(task)
+            if units:
+                commands.update(handler(self, units))
+
+        # Moves may have been re-planned to clear the way for ships planned after them
+        commands.update(self.planner.commands())
+        self.command_queue = list(commands.values())
+
+        # One record per turn, formatted on the log writer thread, whatever the size of the fleet
+        cache = self.game_map.planet_cache
+        task_counts = tuple((task.value if task else None, len(units)) for task, units in batches.items())
+        logging.debug("turn %d tasks %s planet cache hits %d misses %d", self.turn, task_counts,
+                      cache.hits if cache else 0, cache.misses if cache else 0)
+
+    def waypoint(self, unit, ship, destination):
+        # Next corner of the shortest way around the planets, the destination itself once it is in sight, and a point
+        # past the corner on the next leg once the corner is within a turn's travel. The way is only planned again once
+        # the destination moved, or a planet or a ship moved before this one blocks the leg the ship is on
+        route = unit.route
+        blocked = self.planner.blocked
+        if route is None or not route.is_valid(ship, destination, self.paths, ROUTE_TOLERANCE, blocked):
+            waypoints = self.paths.path(ship, destination, blocked)
+            if not waypoints:
+                unit.route = None
+                return destination
+            route = unit.route = hlt.pathfinding.Route(waypoints, destination, self.turn)
+        return route.next_waypoint(ship, destination, self.paths, reach=hlt.constants.MAX_SPEED, blocked=blocked)
+
+    def avoid_danger(self, units):
+        # TODO: great improvements to be had here
+        # Fanning out logic: the offsets to every other unit add up to the fleet's totals less this ship, counted
+        # once for every ship in the fleet
+        count, sum_x, sum_y = self.world.fleet
+        commands = {}
+        for unit in units:
+            ship = self.game_map.get_ship(unit.get_ship())
+            dx = sum_x - count * ship.x
+            dy = sum_y - count * ship.y
+
+            angle = (math.degrees(math.atan2(dy, dx)) + 180 ) % 360
+            target_x = 10 * math.cos(math.radians(angle))
+            target_y = 10 * math.sin(math.radians(angle))
+            target_position = hlt.entity.Position(target_x, target_y)
+
+            commands[unit.get_ship()] = self.planner.navigate(ship, target_position,
+                                                              speed=int(hlt.constants.MAX_SPEED))
+        return without_idle(commands)
+
+    def collonize_planet(self, units):
+        ships = [self.game_map.get_ship(unit.get_ship()) for unit in units]
+        planets = [unit.get_target(self.game_map) for unit in units]
+
+        # Units whose planet is gone go after the closest docked enemy instead, or any enemy if none is docked. Their
+        # enemies are looked up together, in one search of the distance table per mask
+        lost = [index for index, planet in enumerate(planets) if not planet]
+        enemies = dict(zip(lost, closest_entities(self.distances, [ships[index] for index in lost], ENEMY_SHIPS,
+                                                  self.docked_enemy_mask, max_distance=100)))
+        undocked = [index for index in lost if not enemies[index]]
+        enemies.update(zip(undocked, closest_entities(self.distances, [ships[index] for index in undocked],
+                                                      ENEMY_SHIPS, max_distance=100)))
+
+        commands = {}
+        for index, (unit, ship, planet) in enumerate(zip(units, ships, planets)):
+            if not planet:
+                unit.set_task(Task.HUNTER)
+                unit.set_target(enemies[index])
+                commands[unit.get_ship()] = self.chase(unit, ship)
+
+            elif self.distances.can_dock(ship, planet) and planet.id not in self.world.enemy_planet_ids \
+                    and planet.id not in self.world.full_planet_ids:
+                # # logging.info(":::::::::::::::::: HOTSWAP TO DOCKING")
+                unit.set_task(Task.STAY_DOCKED)
+                commands[unit.get_ship()] = ship.dock(planet)
+
+            elif planet.id in self.world.enemy_planet_ids:
+                # # logging.info(":::::::::::::::::: HOTSWAP TO OFFENSIVE SWARM")
+                unit.set_task(Task.HUNTER)
+                commands[unit.get_ship()] = self.chase(unit, ship)
 
-            elif task == "corner_rat":
-                command = self.corner_rat(unit)
             else:
-                pass
+                commands[unit.get_ship()] = self.planner.navigate(
+                    ship, self.waypoint(unit, ship, ship.closest_point_to(planet)), speed=int(hlt.constants.MAX_SPEED))
+        return without_idle(commands)
+
+    def offensive_swarm(self, units):
+        commands = {}
+        for unit in units:
+            ship = self.game_map.get_ship(unit.get_ship())
+            planet = unit.get_target(self.game_map)
+
+            if not planet:
+                if len(self.world.enemy_planets) > 0:
+                    unit.set_target(self.world.enemy_planets[0])
+                else:
+                    continue
+
+            if self.distances.can_dock(ship, planet) and planet.id not in self.world.enemy_planet_ids \
+                    and planet.id not in self.world.full_planet_ids:
+                # # logging.info(":::::::::::::::::: HOTSWAP TO DOCKING")
+                unit.set_task(Task.STAY_DOCKED)
+                commands[unit.get_ship()] = ship.dock(planet)
+                continue
 
-            if command:
-                self.command_queue.append(command)
+            target_position = swarm_point_to(ship, planet, swarmsize=3, swarmid=unit.get_ship(), offset=self.turn)
+            commands[unit.get_ship()] = self.planner.navigate(ship, target_position,
+                                                              speed=int(hlt.constants.MAX_SPEED))
+        return without_idle(commands)
 
-    def avoid_danger(self, unit):
-        # TODO: great improvements to be had here
-        ship = ship_by_id(self.owned_ships, unit.get_ship())
-
-        direction = 0
-        # Fanning out logic
-        dx = 0
-        dy = 0
-
-        for other_unit in self.units:
-            if other_unit != unit:
-                other_ship = ship_by_id(self.owned_ships, other_unit.get_ship())
-                dx += (other_ship.x - ship.x)
-                dy += (other_ship.y - ship.y)
-                direction += (ship.calculate_angle_between(other_ship) + 180) % 360
-
-        angle = (math.degrees(math.atan2(dy, dx)) + 180 ) % 360
-        target_x = 10 * math.cos(math.radians(angle))
-        target_y = 10 * math.sin(math.radians(angle))
-        target_position = hlt.entity.Position(target_x, target_y)
-
-        return ship.navigate(target_position,
-                             self.game_map,
-                             speed=int(hlt.constants.MAX_SPEED),
-                             ignore_ships=False,
-                             max_corrections=NAV_CORRECTIONS, angular_step=NAV_ANGLE_STEP)
-
-    def collonize_planet(self, unit):
-        ship = ship_by_id(self.owned_ships, unit.get_ship())
-        planet = unit.get_target(self.game_map)  # planet_by_id(self.all_planets, unit.get_target(self.game_map))
-        if not planet:
-            enemy_ship = closest_entity(ship, [s for s in self.enemy_ships if
-                                                              s.docking_status is hlt.entity.Ship.DockingStatus.DOCKED],
-                                                       max_distance=100)
-            if not enemy_ship:
-                enemy_ship = closest_entity(ship, self.enemy_ships, max_distance=100)
-            unit.set_task("hunter")
-            unit.set_target(enemy_ship)
-            return self.hunter(unit)
-
-        if ship.can_dock(planet) and planet not in self.enemy_planets and not planet.is_full():
-            # # logging.info(":::::::::::::::::: HOTSWAP TO DOCKING")
-            unit.set_task("stay_docked")
-            return ship.dock(planet)
-
-        elif planet in self.enemy_planets:
-            # # logging.info(":::::::::::::::::: HOTSWAP TO OFFENSIVE SWARM")
-            unit.set_task("hunter")
-            return self.hunter(unit)
+    def hunter(self, units): # reformat to attack probably
+        return without_idle({unit.get_ship(): self.chase(unit, self.game_map.get_ship(unit.get_ship()))
+                             for unit in units})
 
-        else:
-            return ship.navigate(ship.closest_point_to(planet),
-                                 self.game_map,
-                                 speed=int(hlt.constants.MAX_SPEED),
-                                 ignore_ships=False,
-                                 max_corrections=NAV_CORRECTIONS, angular_step=NAV_ANGLE_STEP)
-
-    def offensive_swarm(self, unit):
-        ship = ship_by_id(self.owned_ships, unit.get_ship())
-        planet = unit.get_target(self.game_map)  # planet_by_id(self.all_planets, unit.get_target(self.game_map))
-
-        if not planet:
-            if len(self.enemy_planets) > 0:
-                unit.set_target([p for p in self.enemy_planets][0])
-            else:
-                return
-
-        if ship.can_dock(planet) and planet not in self.enemy_planets and not planet.is_full():
-            # # logging.info(":::::::::::::::::: HOTSWAP TO DOCKING")
-            unit.set_task("stay_docked")
-            return ship.dock(planet)
-
-        target_position = swarm_point_to(ship, planet, swarmsize=3, swarmid=unit.get_ship(), offset=self.turn)
-        return ship.navigate(target_position,
-                             self.game_map,
-                             speed=int(hlt.constants.MAX_SPEED),
-                             ignore_ships=False,
-                             max_corrections=NAV_CORRECTIONS, angular_step=NAV_ANGLE_STEP)
-
-    def hunter(self, unit): # reformat to attack probably
-        ship = ship_by_id(self.owned_ships, unit.get_ship())
+    def chase(self, unit, ship):
         enemy_ship = unit.get_target(self.game_map)
         if not enemy_ship:
-            return
-        return ship.navigate(ship.closest_point_to(enemy_ship),
-                             self.game_map,
-                             speed = int(hlt.constants.MAX_SPEED),
-                             ignore_ships=False,
-                             max_corrections=NAV_CORRECTIONS, angular_step=NAV_ANGLE_STEP)
-
-    def corner_rat(self, unit):
-        ship = ship_by_id(self.owned_ships, unit.get_ship())
+            return None
+        return self.planner.navigate(ship, self.waypoint(unit, ship, ship.closest_point_to(enemy_ship)),
+                                     speed=int(hlt.constants.MAX_SPEED))
+
+    def corner_rat(self, units):
         width = self.game_map.width
         height = self.game_map.height
-        target_x = None
-        target_y = None
-        # go to closest edge
-        if ship.x < (width - ship.x):
-            target_x = 0 + ship.radius
-        else:
-            target_x = width - ship.radius
-
-        if ship.y < (height - ship.y):
-            target_y = 0 + ship.radius
-        else:
-            target_y = height - ship.radius
-
-        if target_x and target_y:
-            position = hlt.entity.Position(target_x, target_y)
-
-        return ship.navigate(ship.closest_point_to(position),
-                             self.game_map,
-                             speed = int(hlt.constants.MAX_SPEED),
-                             ignore_ships=False,
-                             max_corrections=NAV_CORRECTIONS, angular_step=NAV_ANGLE_STEP)
-
+        commands = {}
+        for unit in units:
+            ship = self.game_map.get_ship(unit.get_ship())
+            target_x = None
+            target_y = None
+            # go to closest edge
+            if ship.x < (width - ship.x):
+                target_x = 0 + ship.radius
+            else:
+                target_x = width - ship.radius
 
+            if ship.y < (height - ship.y):
+                target_y = 0 + ship.radius
+            else:
+                target_y = height - ship.radius
+
+            if target_x and target_y:
+                position = hlt.entity.Position(target_x, target_y)
+
+            commands[unit.get_ship()] = self.planner.navigate(ship, ship.closest_point_to(position),
+                                                              speed=int(hlt.constants.MAX_SPEED))
+        return without_idle(commands)
+
+
+# How a unit's task is decided every turn: the rules are tried in order, each only for the units whose current task
+# is in its set, and the first one to return a task settles it. Units no rule settles keep their task
+TASK_RULES = (
+    (frozenset({Task.STAY_DOCKED}), CommandCenter.rule_stay_docked),
+    (frozenset({Task.CORNER_RAT}), CommandCenter.rule_keep_task),
+    (ANY_TASK, CommandCenter.rule_new_unit),
+    (ANY_TASK, CommandCenter.rule_no_planets_left),
+    (ANY_TASK, CommandCenter.rule_early_hunter),
+    (ANY_TASK, CommandCenter.rule_defend),
+    (frozenset({Task.COLLONIZE_PLANET}), CommandCenter.rule_keep_task),
+    (ANY_TASK - {Task.HUNTER, Task.DEFENDER}, CommandCenter.rule_collonize),
+    (ANY_TASK, CommandCenter.rule_corner_rat),
+    (ANY_TASK, CommandCenter.rule_raid),
+    (ANY_TASK, CommandCenter.rule_fight),
+)
+
+# The CommandCenter method moving all units of a task at once; docked units and units without a task stay put
+TASK_HANDLERS = {
+    Task.AVOID_DANGER: CommandCenter.avoid_danger,
+    Task.COLLONIZE_PLANET: CommandCenter.collonize_planet,
+    Task.HUNTER: CommandCenter.hunter,
+    Task.DEFENDER: CommandCenter.hunter,
+    Task.FIGHTER: CommandCenter.hunter,
+    Task.OFFENSIVE_SWARM: CommandCenter.offensive_swarm,
+    Task.CORNER_RAT: CommandCenter.corner_rat,
+}
+
+
+class WorldView(object):
+    """
+    The planets and fleets of one turn, sorted out once when the turn starts: every group as a tuple to walk over
+    and as a set of ids to test membership against, and the number of ships of the fleet and their summed position.
+    """
+
+    def __init__(self, game_map):
+        self.me = game_map.get_me()
+
+        self.all_planets = game_map.planets()
+        self.owned_planets = game_map.planets(owner=self.me)
+        self.enemy_planets = game_map.planets(enemy=True)
+        self.empty_planets = game_map.planets(empty=True)
+        self.full_planets = game_map.planets(full=True)
+        self.owned_planet_ids = {p.id for p in self.owned_planets}
+        self.enemy_planet_ids = {p.id for p in self.enemy_planets}
+        self.empty_planet_ids = {p.id for p in self.empty_planets}
+        self.full_planet_ids = {p.id for p in self.full_planets}
+
+        self.owned_ships = game_map.ships(owner=self.me)
+        self.enemy_ships = game_map.ships(enemy=True)
+        self.owned_ship_ids = {s.id for s in self.owned_ships}
+        self.enemy_ship_ids = {s.id for s in self.enemy_ships}
+
+        # (number of ships, sum of their x, sum of their y)
+        self.fleet = (len(self.owned_ships), sum(s.x for s in self.owned_ships), sum(s.y for s in self.owned_ships))
+
+
+class UnitRegistry(object):
+    """
+    The units of the fleet by ship id, in the order their ships were first seen.
+    """
+
+    def __init__(self):
+        self._units = {}
+
+    def __len__(self):
+        return len(self._units)
+
+    def __iter__(self):
+        return iter(self._units.values())
+
+    def __contains__(self, ship_id):
+        return ship_id in self._units
+
+    def get(self, ship_id):
+        return self._units.get(ship_id)
+
+    def reconcile(self, ship_ids, ships):
+        """
+        Bring the units in line with the fleet of this turn: drop the units whose ship is gone and add one for
+        every ship without a unit, in set differences over the ids rather than searches of the fleet.
+
+        :param set ship_ids: The ids of the ships in the fleet
+        :param ships: The ships in the fleet, new units are added in their order
+        :return: The units dropped and the units added
+        :rtype: (list[Unit], list[Unit])
+        """
+        died = [self._units.pop(ship_id) for ship_id in self._units.keys() - ship_ids]
+        born = [Unit(ship.id) for ship in ships if ship.id not in self._units]
+        for unit in born:
+            self._units[unit.ship] = unit
+        return died, born
 
 
 class Unit(object):
+    __slots__ = ("ship", "task", "target", "target_type", "squadron", "route", "_age")
+
     def __init__(self, ship_id):
         self.ship = ship_id
         self.task = None
         self.target = None
         self.target_type = None
         self.squadron = None
-        self.closest_entities = dict()
-        self.closest_entity = None
+        self.route = None
         self._age = 0
 
     def age(self):
@@ -472,13 +549,6 @@ class Unit(object):
     def get_ship(self):
         return self.ship
 
-    def determine_closest_entities(self, game_map):
-        self.closest_entities = {"planets": sort_entities_by_distance(self.ship, game_map.all_planets()),
-                                 "ships": sort_entities_by_distance(self.ship, game_map._all_ships())}
-
-        closest_planet = dict.itervalues().next()
-        closest_ship = None
-
     def set_target(self, target):
         if not target:
             self.target=None
@@ -488,24 +558,14 @@ class Unit(object):
             self.target = target.id
 
     def get_target(self, game_map):
+        # Ships and planets share ids, the type of the target tells which one is meant
         if self.target_type == hlt.entity.Planet:
-            target_entity = [p for p in game_map.all_planets() if p.id == self.target]
+            return game_map.get_planet(self.target)
         elif self.target_type == hlt.entity.Ship:
-            target_entity = [s for s in game_map._all_ships() if s.id == self.target]
-        else:
-            target_entity = None
-
-        if target_entity:
-            return target_entity[0]
+            return game_map.get_ship(self.target)
         else:
             return None
 
-    def update_reference(self, ships):
-        for s in ships:
-            if s.id == self.ship:
-                self.ship = s.id
-                break
-
 
 def swarm_point_to(ship, target, min_distance=3, swarmsize=1, swarmid=1, swarmspeed=20, offset=0):
     angle = (360 / swarmsize) * swarmid + (offset * swarmspeed) % 360
@@ -516,58 +576,23 @@ def swarm_point_to(ship, target, min_distance=3, swarmsize=1, swarmid=1, swarmsp
     return hlt.entity.Position(x, y)
 
 
-def ship_by_id(ships, id):
-    for ship in ships:
-        # # logging.info(f"searching... {ship.id} - {id}")
-        if ship.id == id:
-            return ship
-    return None
-
-
-def planet_by_id(planets, id):
-    for planet in planets:
-        if planet.id == id:
-            return planet
-    return None
-
+def without_idle(commands):
+    # The commands of a batch, leaving out the units that were given none
+    return {ship_id: command for ship_id, command in commands.items() if command}
 
-def sort_entities_by_distance(ship, entities):
-    unsorted_distances = {}
 
-    for e in entities:
-        unsorted_distances[e] = ship.calculate_distance_between(e)
+def is_empty_planet(planet):
+    return len(planet.all_docked_ships()) == 0
 
-    # # logging.info(f"unsorted: {unsorted_distances}")
-
-    sorted_distances = OrderedDict(sorted(unsorted_distances.items(), key=lambda t: t[1]))
-    # sorted_distances = OrderedDict(sorted(unsorted_distances.values()), key="honey")
-    # sorted_distances = sorted(unsorted_distances.values())
-    # # logging.info(f"sorted: {sorted_distances}")
-    return sorted_distances
-
-
-def closest_entity(ship, entities, exclusions=[], max_distance=15, depth=0):
-    closest = False
-    valid_entities = [e for e in entities if e not in exclusions]
-    for e in valid_entities:
-        distance = ship.calculate_distance_between(e)
-        if not closest and distance < max_distance:
-            closest = e
-        elif closest:
-            if distance < ship.calculate_distance_between(closest):  # optimize b in (a < b)
-                closest = e
-        else:
-            continue
 
-    if closest:
-        return closest
-    elif depth > 2:
-        return None
-    else:
-        return closest_entity(ship, entities, exclusions=exclusions, max_distance=max_distance * 2, depth=depth + 1)
+def closest_entities(distances, ships, group, mask=None, max_distance=15):
+    # Closest match of every ship anywhere, provided one lies within 8 * max_distance (what the old doubling search
+    # reached)
+    return distances.closest_many(ships, group, mask, max_distance=max_distance * 8)
 
 
-game = hlt.Game("CommandCenterV03")
+# Frames are decoded into column arrays when numpy is there, which also feeds the distance matrices
+game = hlt.Game("CommandCenterV03", incremental=True, columnar=hlt.game_map.np is not None, log_mode="async")
 # logging.info("Initializing commmand center.")
 cc = CommandCenter(game)
 
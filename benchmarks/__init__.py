@@ -0,0 +1,5 @@
+"""
+Micro-benchmarks for the hlt starter kit. Run them from the repository root, e.g.
+
+    python -m benchmarks.bench_parse
+"""
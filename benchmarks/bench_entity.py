@@ -0,0 +1,70 @@
+"""
+Per-instance memory and attribute access of the slotted entity classes, compared against equivalent classes that
+keep their attributes in a per-instance __dict__ (as the entities did before).
+"""
+import gc
+import timeit
+import tracemalloc
+
+from hlt import constants, entity
+
+
+class _DictPosition:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.radius = 0
+        self.health = None
+        self.owner = None
+        self.id = None
+
+
+class _DictShip:
+    def __init__(self, player_id, ship_id, x, y, hp, docking_status, planet, progress, cooldown):
+        self.id = ship_id
+        self.x = x
+        self.y = y
+        self.owner = player_id
+        self.radius = constants.SHIP_RADIUS
+        self.health = hp
+        self.docking_status = docking_status
+        self.planet = planet
+        self._docking_progress = progress
+        self._weapon_cooldown = cooldown
+
+
+def _bytes_per_instance(factory, count=20000):
+    gc.collect()
+    tracemalloc.start()
+    instances = [factory(i) for i in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del instances
+    # The list holding the instances is the same for both variants, leave it out
+    return (size - 8 * count) / count
+
+
+def _access_time(instance, number=200000):
+    return min(timeit.repeat(lambda: instance.x + instance.y + instance.radius, number=number, repeat=5)) / number
+
+
+def main():
+    undocked = entity.Ship.DockingStatus.UNDOCKED
+    cases = (
+        ("Position",
+         lambda i: _DictPosition(float(i), float(i)),
+         lambda i: entity.Position(float(i), float(i))),
+        ("Ship",
+         lambda i: _DictShip(0, i, float(i), float(i), 255, undocked, None, 0, 0),
+         lambda i: entity.Ship(0, i, float(i), float(i), 255, 0.0, 0.0, undocked, 0, 0, 0)),
+    )
+    print("{:>10} {:>16} {:>16} {:>18} {:>18}".format("class", "dict (bytes)", "slots (bytes)",
+                                                        "dict access (ns)", "slots access (ns)"))
+    for name, legacy, slotted in cases:
+        print("{:>10} {:>16.0f} {:>16.0f} {:>18.1f} {:>18.1f}".format(
+            name, _bytes_per_instance(legacy), _bytes_per_instance(slotted),
+            1e9 * _access_time(legacy(1)), 1e9 * _access_time(slotted(1))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compare the cursor-based frame parser against the previous parser, which unpacked the token list with
+``first, *remainder = tokens`` at every step and therefore copied the rest of the frame for every entity.
+"""
+import timeit
+
+from hlt import entity, game_map
+from .frames import synthetic_frame
+
+
+def _legacy_parse_ships(player_id, tokens):
+    ships = {}
+    num_ships, *remainder = tokens
+    for _ in range(int(num_ships)):
+        (sid, x, y, hp, vel_x, vel_y,
+         docked, docked_planet, progress, cooldown, *remainder) = remainder
+        sid = int(sid)
+        ships[sid] = entity.Ship(player_id, sid, float(x), float(y), int(hp), float(vel_x), float(vel_y),
+                                 entity.Ship.DockingStatus(int(docked)), int(docked_planet),
+                                 int(progress), int(cooldown))
+    return ships, remainder
+
+
+def _legacy_parse_planets(tokens):
+    planets = {}
+    num_planets, *remainder = tokens
+    for _ in range(int(num_planets)):
+        (plid, x, y, hp, r, docking, current, remaining,
+         owned, owner, num_docked_ships, *remainder) = remainder
+        docked_ships = []
+        for _ in range(int(num_docked_ships)):
+            ship_id, *remainder = remainder
+            docked_ships.append(int(ship_id))
+        planets[int(plid)] = entity.Planet(int(plid), float(x), float(y), int(hp), float(r), int(docking),
+                                           int(current), int(remaining), bool(int(owned)), int(owner),
+                                           docked_ships)
+    return planets, remainder
+
+
+def legacy_parse(game, map_string):
+    """
+    The parser as it was before the cursor rewrite, kept here only as a baseline.
+    """
+    tokens = map_string.split()
+    num_players, *tokens = tokens
+    players = {}
+    for _ in range(int(num_players)):
+        player_id, *tokens = tokens
+        player_id = int(player_id)
+        ships, tokens = _legacy_parse_ships(player_id, tokens)
+        players[player_id] = game_map.Player(player_id, ships)
+    game._players = players
+    game._planets, tokens = _legacy_parse_planets(tokens)
+    assert len(tokens) == 0
+    game._link()
+
+
+def _describe(game):
+    ships = sorted((s.id, s.owner.id, s.x, s.y, s.health, s.docking_status, s.planet and s.planet.id)
+                   for s in game._all_ships())
+    planets = sorted((p.id, p.owner and p.owner.id, p.x, p.y, p.radius, sorted(p._docked_ships))
+                     for p in game.all_planets())
+    return ships, planets
+
+
+def main(repeat=5):
+    print("{:>14} {:>14} {:>14} {:>8}".format("ships/player", "legacy (ms)", "cursor (ms)", "speedup"))
+    for ships_per_player in (50, 200, 500, 1000):
+        frame = synthetic_frame(ships_per_player=ships_per_player)
+        legacy, cursor = game_map.Map(0, 384, 256), game_map.Map(0, 384, 256)
+        legacy_parse(legacy, frame)
+        cursor._parse(frame)
+        assert _describe(legacy) == _describe(cursor)
+
+        number = max(1, 2000 // ships_per_player)
+        legacy_time = min(timeit.repeat(lambda: legacy_parse(legacy, frame), number=number, repeat=repeat))
+        cursor_time = min(timeit.repeat(lambda: cursor._parse(frame), number=number, repeat=repeat))
+        print("{:>14} {:>14.2f} {:>14.2f} {:>7.1f}x".format(ships_per_player,
+                                                            1000 * legacy_time / number,
+                                                            1000 * cursor_time / number,
+                                                            legacy_time / cursor_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Synthetic Halite II frames, shaped like the line the engine sends every turn.
+"""
+import random
+
+
+def synthetic_frame(num_players=4, ships_per_player=200, num_planets=28, width=384, height=256, seed=0):
+    """
+    Build a consistent engine map line: docked ships reference planets owned by their player, and those
+    planets list them as docked.
+
+    :param int num_players: Number of players in the frame
+    :param int ships_per_player: Number of ships every player controls
+    :param int num_planets: Number of planets on the map
+    :param int width: Map width
+    :param int height: Map height
+    :param int seed: Seed for the random generator, so frames are reproducible
+    :return: The map line as the Halite engine would send it
+    :rtype: str
+    """
+    rng = random.Random(seed)
+    planet_owner = {plid: rng.randrange(-1, num_players) for plid in range(num_planets)}
+    docked = {plid: [] for plid in range(num_planets)}
+
+    tokens = [num_players]
+    ship_id = 0
+    for player_id in range(num_players):
+        tokens += [player_id, ships_per_player]
+        owned = [plid for plid, owner in planet_owner.items() if owner == player_id]
+        for _ in range(ships_per_player):
+            status, planet = 0, 0
+            if owned and rng.random() < 0.3:
+                planet = rng.choice(owned)
+                status = 2
+                docked[planet].append(ship_id)
+            tokens += [ship_id,
+                       "{:.4f}".format(rng.uniform(0, width)), "{:.4f}".format(rng.uniform(0, height)),
+                       rng.randint(1, 255), "0.0000", "0.0000",
+                       status, planet, 0, rng.randint(0, 1)]
+            ship_id += 1
+
+    tokens.append(num_planets)
+    for plid in range(num_planets):
+        owner = planet_owner[plid]
+        owned = bool(docked[plid])
+        tokens += [plid,
+                   "{:.4f}".format(rng.uniform(0, width)), "{:.4f}".format(rng.uniform(0, height)),
+                   rng.randint(500, 2000), "{:.4f}".format(rng.uniform(3, 16)), rng.randint(2, 6),
+                   0, 1000, int(owned), owner if owned else 0, len(docked[plid])]
+        tokens += docked[plid]
+
+    return " ".join(str(token) for token in tokens)
+
+
+def synthetic_frames(num_frames, num_players=4, ships_per_player=200, num_planets=28, width=384, height=256, seed=0):
+    """
+    Build the consecutive engine map lines of one game. Between two frames ships move, some of them die and new ones
+    spawn, docked ships undock, planets change hands with new ships docking to them, and now and then a planet is
+    destroyed. Every frame is consistent in the same way as synthetic_frame.
+
+    :param int num_frames: Number of frames
+    :param int num_players: Number of players in the game
+    :param int ships_per_player: Number of ships every player starts with
+    :param int num_planets: Number of planets at the start
+    :param int width: Map width
+    :param int height: Map height
+    :param int seed: Seed for the random generator, so frames are reproducible
+    :return: The map lines as the Halite engine would send them, one per frame
+    :rtype: list[str]
+    """
+    rng = random.Random(seed)
+    planets = {plid: ["{:.4f}".format(rng.uniform(0, width)), "{:.4f}".format(rng.uniform(0, height)),
+                      rng.randint(500, 2000), "{:.4f}".format(rng.uniform(3, 16)), rng.randint(2, 6)]
+               for plid in range(num_planets)}
+    planet_owner = {plid: -1 for plid in planets}
+    docked = {plid: [] for plid in planets}
+    # Ship id -> [owner, x, y, hp, docking status, planet]
+    ships = {}
+    next_id = 0
+    for player_id in range(num_players):
+        for _ in range(ships_per_player):
+            ships[next_id] = [player_id, rng.uniform(0, width), rng.uniform(0, height), rng.randint(1, 255), 0, 0]
+            next_id += 1
+
+    frames = []
+    for _ in range(num_frames):
+        tokens = [num_players]
+        for player_id in range(num_players):
+            fleet = [ship_id for ship_id, ship in ships.items() if ship[0] == player_id]
+            tokens += [player_id, len(fleet)]
+            for ship_id in fleet:
+                _, x, y, hp, status, planet = ships[ship_id]
+                tokens += [ship_id, "{:.4f}".format(x), "{:.4f}".format(y), hp, "0.0000", "0.0000",
+                           status, planet, 0, rng.randint(0, 1)]
+        tokens.append(len(planets))
+        for plid, (x, y, hp, radius, spots) in planets.items():
+            owned = bool(docked[plid])
+            tokens += [plid, x, y, hp, radius, spots, 0, 1000, int(owned), planet_owner[plid] if owned else 0,
+                       len(docked[plid])]
+            tokens += docked[plid]
+        frames.append(" ".join(str(token) for token in tokens))
+
+        # Undocked ships move, some ships die, docked ones undock and new ones spawn
+        for ship in ships.values():
+            if ship[4] == 0:
+                ship[1] = min(max(ship[1] + rng.uniform(-7, 7), 0), width)
+                ship[2] = min(max(ship[2] + rng.uniform(-7, 7), 0), height)
+        for ship_id in [ship_id for ship_id in ships if rng.random() < 0.05]:
+            if ships[ship_id][4] != 0:
+                docked[ships[ship_id][5]].remove(ship_id)
+            del ships[ship_id]
+        for plid in docked:
+            for ship_id in [ship_id for ship_id in docked[plid] if rng.random() < 0.1]:
+                docked[plid].remove(ship_id)
+                ships[ship_id][4:] = [0, 0]
+        for _ in range(rng.randint(0, 3 * num_players)):
+            ships[next_id] = [rng.randrange(num_players), rng.uniform(0, width), rng.uniform(0, height), 255, 0, 0]
+            next_id += 1
+        # A planet that lost its ships goes to another player, whose free ships dock to it
+        for plid in [plid for plid in planets if not docked[plid] and rng.random() < 0.3]:
+            planet_owner[plid] = owner = rng.randrange(num_players)
+            free = [ship_id for ship_id, ship in ships.items() if ship[0] == owner and ship[4] == 0]
+            for ship_id in rng.sample(free, min(len(free), rng.randint(1, planets[plid][4]))):
+                docked[plid].append(ship_id)
+                ships[ship_id][4:] = [2, plid]
+        if len(planets) > 1 and rng.random() < 0.2:
+            plid = rng.choice(list(planets))
+            for ship_id in docked.pop(plid):
+                del ships[ship_id]
+            del planets[plid], planet_owner[plid]
+    return frames
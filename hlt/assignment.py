@@ -0,0 +1,203 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, without it the augmenting paths are searched in plain Python
+    np = None
+
+#: Cost of a pairing that must not be made; a row left with nothing better stays unassigned
+FORBIDDEN = 1e9
+#: Reduced cost below which a pairing counts as tight
+_TIGHT = 1e-7
+
+
+def solve(costs, potentials=None, keep=None):
+    """
+    Min-cost assignment of every row to a distinct column, with the Hungarian algorithm in its shortest augmenting
+    path form: rows are added one at a time, each along the cheapest path of reduced costs from it to a free column,
+    while row and column potentials keep every reduced cost non-negative. Rows beyond the number of columns are
+    matched to padding columns of cost FORBIDDEN.
+
+    A previous solution can be handed in to start from: its column potentials, and pairings to keep. A pairing is
+    kept if it is still tight under those potentials; only the rows not kept are then searched for.
+
+    :param costs: The cost of every pairing, one row per entry (a list of lists or a 2d numpy array)
+    :param list[float] potentials: Start potential of every column, all at most 0 (optional)
+    :param dict[int, int] keep: Row -> column pairings to keep if they are still tight (optional)
+    :return: The column of every row (None for rows on padding), the column potentials, and the number of rows
+        whose column had to be searched for
+    :rtype: (list[int], list[float], int)
+    """
+    rows = len(costs)
+    columns = len(costs[0]) if rows else 0
+    if rows == 0:
+        return [], [0.0] * columns, 0
+    width = max(columns, rows)
+    if np is not None:
+        matrix = np.full((rows, width), FORBIDDEN)
+        matrix[:, :columns] = costs
+    else:
+        matrix = [list(row) + [FORBIDDEN] * (width - columns) for row in costs]
+    start = list(potentials) + [0.0] * (width - columns) if potentials is not None else [0.0] * width
+
+    # Keep the pairings that are still tight. A column keeps its start potential only while it stays matched, so
+    # every free column is at 0, and dropping a pairing may loosen others: repeat until none is dropped
+    kept = {}
+    taken = set()
+    for row, column in (keep or {}).items():
+        if column not in taken and matrix[row][column] < FORBIDDEN:
+            kept[row] = column
+            taken.add(column)
+    while True:
+        matched = set(kept.values())
+        v = [start[column] if column in matched else 0.0 for column in range(width)]
+        if np is not None:
+            v = np.array(v)
+            u = (matrix - v).min(axis=1)
+        else:
+            u = [min(cost - v[column] for column, cost in enumerate(row)) for row in matrix]
+        loose = [row for row, column in kept.items() if matrix[row][column] - u[row] - v[column] > _TIGHT]
+        if not loose:
+            break
+        for row in loose:
+            del kept[row]
+
+    # Column `width` stands for the row being added
+    row_of = [-1] * (width + 1)
+    for row, column in kept.items():
+        row_of[column] = row
+    v = np.append(v, 0.0) if np is not None else v + [0.0]
+    search = _search_numpy if np is not None else _search
+    free = [row for row in range(rows) if row not in kept]
+    for row in free:
+        search(matrix, u, v, row_of, row, width)
+
+    column_of = [None] * rows
+    for column in range(width):
+        if row_of[column] != -1 and column < columns:
+            column_of[row_of[column]] = column
+    return column_of, [float(potential) for potential in v[:columns]], len(free)
+
+
+def _augment(row_of, way, column, width):
+    """
+    Flip the pairings along the path found, ending at the free column reached.
+    """
+    while column != width:
+        previous = way[column]
+        row_of[column] = row_of[previous]
+        column = previous
+
+
+def _search(matrix, u, v, row_of, row, width):
+    """
+    Add a row: grow the tree of tight pairings from it, lowering the potentials until it reaches a free column.
+    """
+    row_of[width] = row
+    column = width
+    slack = [math.inf] * width
+    way = [width] * width
+    used = [False] * (width + 1)
+    while row_of[column] != -1:
+        used[column] = True
+        current = row_of[column]
+        costs = matrix[current]
+        base = u[current]
+        delta, best = math.inf, -1
+        for other in range(width):
+            if not used[other]:
+                reduced = costs[other] - base - v[other]
+                if reduced < slack[other]:
+                    slack[other] = reduced
+                    way[other] = column
+                if slack[other] < delta:
+                    delta, best = slack[other], other
+        for other in range(width + 1):
+            if used[other]:
+                u[row_of[other]] += delta
+                v[other] -= delta
+            elif other < width:
+                slack[other] -= delta
+        column = best
+    _augment(row_of, way, column, width)
+
+
+def _search_numpy(matrix, u, v, row_of, row, width):
+    """
+    _search with the scans over the columns vectorized; u and v are numpy arrays here, updated in place.
+    """
+    row_of[width] = row
+    column = width
+    slack = np.full(width, math.inf)
+    way = np.full(width, width)
+    used = np.zeros(width + 1, dtype=bool)
+    owners = np.array(row_of)
+    while owners[column] != -1:
+        used[column] = True
+        current = owners[column]
+        free = ~used[:width]
+        reduced = matrix[current] - u[current] - v[:width]
+        better = free & (reduced < slack)
+        slack[better] = reduced[better]
+        way[better] = column
+        best = int(np.argmin(np.where(free, slack, math.inf)))
+        delta = slack[best]
+        tree = np.flatnonzero(used)
+        u[owners[tree]] += delta
+        v[tree] -= delta
+        slack[free] -= delta
+        column = best
+    _augment(row_of, way.tolist(), column, width)
+
+
+class Assigner:
+    """
+    Assignment of rows to columns (e.g. ships to targets) that is solved again every turn, starting from the previous
+    turn's solution. Rows and columns are identified by keys, so the solution carries over as ships and targets come
+    and go: pairings that are still optimal are kept, and only the rows that lost theirs are searched for again.
+    With more rows than columns the transposed problem is solved, so that rows which get no column cost nothing.
+
+    :ivar searched: The number of rows whose column had to be searched for in the last assign
+    """
+
+    def __init__(self):
+        self._potentials = {}
+        self._transposed = False
+        self._matches = {}
+        self.searched = 0
+
+    def assign(self, row_keys, column_keys, costs):
+        """
+        :param list row_keys: A key for every row, e.g. ship ids
+        :param list column_keys: A key for every column, e.g. (target id, slot)
+        :param costs: The cost of every pairing, FORBIDDEN for those not to be made, one row per row key (a list of
+            lists or a 2d numpy array)
+        :return: The column key assigned to each row key; rows left without a permitted column are missing
+        :rtype: dict
+        """
+        transposed = len(row_keys) > len(column_keys)
+        matches = self._matches
+        if transposed:
+            row_keys, column_keys = column_keys, row_keys
+            costs = [list(column) for column in zip(*costs)]
+            matches = {column_key: row_key for row_key, column_key in matches.items()}
+        # Potentials of the other orientation belong to the other side's keys
+        previous = self._potentials if transposed == self._transposed else {}
+
+        column_index = {key: column for column, key in enumerate(column_keys)}
+        keep = {}
+        for row, key in enumerate(row_keys):
+            column = column_index.get(matches.get(key))
+            if column is not None:
+                keep[row] = column
+        potentials = [previous.get(key, 0.0) for key in column_keys]
+        column_of, potentials, self.searched = solve(costs, potentials, keep)
+
+        pairs = {}
+        for row, column in enumerate(column_of):
+            if column is not None and costs[row][column] < FORBIDDEN:
+                pairs[row_keys[row]] = column_keys[column]
+        self._potentials = {key: potential for key, potential in zip(column_keys, potentials) if potential}
+        self._transposed = transposed
+        self._matches = {column_key: row_key for row_key, column_key in pairs.items()} if transposed else pairs
+        return dict(self._matches)
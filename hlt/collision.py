@@ -1,4 +1,9 @@
-from .entity import Position, Entity
+import math
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only the batched kernels need it
+    np = None
 
 
 def intersect_segment_circle(start, end, circle, *, fudge=0.5):
@@ -35,6 +40,116 @@ def intersect_segment_circle(start, end, circle, *, fudge=0.5):
 
     closest_x = start.x + dx * t
     closest_y = start.y + dy * t
-    closest_distance = Position(closest_x, closest_y).calculate_distance_between(circle)
+    closest_distance = math.sqrt((circle.x - closest_x) ** 2 + (circle.y - closest_y) ** 2)
 
     return closest_distance <= circle.radius + fudge
+
+
+def segment_distance(start, end, point):
+    """
+    Distance from a point to the closest point of a line segment. Unlike intersect_segment_circle, points behind the
+    start of the segment are measured too, so the distance changes by at most as much as the segment or point move.
+
+    :param Entity start: The start of the line segment. (Needs x, y attributes)
+    :param Entity end: The end of the line segment. (Needs x, y attributes)
+    :param Entity point: The point to measure from. (Needs x, y attributes)
+    :return: The distance
+    :rtype: float
+    """
+    dx = end.x - start.x
+    dy = end.y - start.y
+    a = dx**2 + dy**2
+    t = 0.0 if a == 0.0 else min(max(((point.x - start.x) * dx + (point.y - start.y) * dy) / a, 0.0), 1.0)
+    return math.sqrt((point.x - start.x - dx * t) ** 2 + (point.y - start.y - dy * t) ** 2)
+
+
+def _segment_circle_terms(starts, ends, circles, fudge):
+    """
+    Broadcast M segments against N circles and evaluate the quantities of intersect_segment_circle for every pair.
+
+    :return: Segment deltas (M, 1), squared lengths a (M, 1), unclamped vertex times (M, N), limits (M, N) and the
+        circle coordinates (1, N), all as numpy arrays
+    """
+    if np is None:
+        raise ImportError("The batched collision kernels require numpy")
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+    circles = np.asarray(circles, dtype=float).reshape(-1, 3)
+    fudge = np.asarray(fudge, dtype=float)
+    if fudge.ndim == 1:
+        fudge = fudge[:, None]
+
+    sx, sy = starts[:, 0:1], starts[:, 1:2]
+    ex, ey = ends[:, 0:1], ends[:, 1:2]
+    cx, cy, radius = circles[None, :, 0], circles[None, :, 1], circles[None, :, 2]
+
+    dx = ex - sx
+    dy = ey - sy
+    a = dx**2 + dy**2
+    b = -2 * (sx**2 - sx*ex - sx*cx + ex*cx +
+              sy**2 - sy*ey - sy*cy + ey*cy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vertex = -b / (2 * a)
+    return sx, sy, dx, dy, a, vertex, radius + fudge, cx, cy
+
+
+def _hits(terms):
+    """
+    :param terms: The quantities of every pair, from _segment_circle_terms
+    :return: Hit mask of shape (M, N), see intersect_segments_circles
+    """
+    sx, sy, dx, dy, a, vertex, limit, cx, cy = terms
+    t = np.minimum(vertex, 1.0)
+    closest_x = sx + dx * t
+    closest_y = sy + dy * t
+    closest_distance = np.sqrt((cx - closest_x) ** 2 + (cy - closest_y) ** 2)
+    start_distance = np.sqrt((cx - sx) ** 2 + (cy - sy) ** 2)
+
+    with np.errstate(invalid='ignore'):
+        hits = (t >= 0) & (closest_distance <= limit)
+    return np.where(a == 0.0, start_distance <= limit, hits)
+
+
+def intersect_segments_circles(starts, ends, circles, *, fudge=0.5):
+    """
+    Test M segments against N circles in one vectorized pass, with the same semantics (including the fudge factor)
+    as intersect_segment_circle.
+
+    :param starts: The starts of the segments, as an (M, 2) array-like of x, y
+    :param ends: The ends of the segments, as an (M, 2) array-like of x, y
+    :param circles: The circles to test against, as an (N, 3) array-like of x, y, radius
+    :param fudge: Additional distance to leave between segment and circle; a float or one value per segment
+    :return: Hit mask, True where segment i intersects circle j
+    :rtype: numpy.ndarray of shape (M, N)
+    """
+    return _hits(_segment_circle_terms(starts, ends, circles, fudge))
+
+
+def first_intersection(starts, ends, circles, *, fudge=0.5):
+    """
+    For each of M segments, find which of N circles it runs into first when travelled from its start.
+
+    :param starts: The starts of the segments, as an (M, 2) array-like of x, y
+    :param ends: The ends of the segments, as an (M, 2) array-like of x, y
+    :param circles: The circles to test against, as an (N, 3) array-like of x, y, radius
+    :param fudge: Additional distance to leave between segment and circle; a float or one value per segment
+    :return: Index of the first circle hit by each segment, -1 where it hits none
+    :rtype: numpy.ndarray of shape (M,)
+    """
+    # The hit mask and the entry times come from the same terms
+    terms = _segment_circle_terms(starts, ends, circles, fudge)
+    hits = _hits(terms)
+    if hits.shape[1] == 0:
+        return np.full(hits.shape[0], -1, dtype=np.int64)
+    sx, sy, dx, dy, a, vertex, limit, cx, cy = terms
+
+    # Entry time into the grown circle: back off from the closest approach of the line by half the chord
+    with np.errstate(divide='ignore', invalid='ignore'):
+        off_x = sx + dx * vertex - cx
+        off_y = sy + dy * vertex - cy
+        half_chord = np.sqrt(np.maximum(limit ** 2 - off_x ** 2 - off_y ** 2, 0.0) / a)
+        entry = np.where(a == 0.0, 0.0, np.maximum(vertex - half_chord, 0.0))
+    entry = np.where(hits, entry, np.inf)
+
+    first = np.argmin(entry, axis=1)
+    return np.where(hits.any(axis=1), first, -1)
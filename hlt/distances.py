@@ -0,0 +1,214 @@
+import math
+
+from . import constants, entity
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, without it the matrices are nested lists
+    np = None
+
+#: The user's ships
+OWN_SHIPS = "own_ships"
+#: Ships of every other player
+ENEMY_SHIPS = "enemy_ships"
+#: All planets
+PLANETS = "planets"
+
+
+class DistanceTable:
+    """
+    Centre-to-centre distances of one turn between the user's ships, the enemy ships and the planets. Each matrix is
+    computed in one vectorized pass the first time it is needed and then serves every distance query of the turn.
+    Maps parsed in columnar mode hand over their coordinate arrays, which are then used as they are. Get the table of
+    the current turn from Map.distance_table().
+    """
+
+    def __init__(self, game_map):
+        """
+        :param game_map.Map game_map: The parsed map of the turn
+        """
+        me = game_map.get_me()
+        self._me = me
+        own_ships = me.all_ships() if me is not None else []
+        enemy_ships = [ship for player in game_map.all_players() if player is not me for ship in player.all_ships()]
+        self._entities = {OWN_SHIPS: own_ships, ENEMY_SHIPS: enemy_ships, PLANETS: game_map.all_planets()}
+        self._index = {group: {item.id: index for index, item in enumerate(items)}
+                       for group, items in self._entities.items()}
+        self._matrices = {}
+        self._coordinates = {}
+        ships, planets = game_map.ship_arrays, game_map.planet_arrays
+        if np is not None and ships is not None:
+            # The arrays hold the entities in parse order, which is the order of the groups
+            own = ships.owner == game_map.my_id
+            ship_xy = np.stack((ships.x, ships.y), axis=1)
+            self._coordinates = {OWN_SHIPS: ship_xy[own], ENEMY_SHIPS: ship_xy[~own],
+                                 PLANETS: np.stack((planets.x, planets.y), axis=1)}
+
+    def group_of(self, item):
+        """
+        :param entity.Entity item: A ship or planet of the turn
+        :return: The group the entity belongs to
+        :rtype: str
+        """
+        if isinstance(item, entity.Planet):
+            return PLANETS
+        return OWN_SHIPS if item.owner is self._me else ENEMY_SHIPS
+
+    def entities(self, group):
+        """
+        :param str group: OWN_SHIPS, ENEMY_SHIPS or PLANETS
+        :return: The entities of the group, in matrix order
+        :rtype: list[entity.Entity]
+        """
+        return self._entities[group]
+
+    def matrix(self, rows, columns):
+        """
+        :param str rows: The group along the rows
+        :param str columns: The group along the columns
+        :return: The distances between every pair, a numpy array (nested lists without numpy)
+        """
+        key = (rows, columns)
+        if key not in self._matrices:
+            if (columns, rows) in self._matrices:
+                transposed = self._matrices[(columns, rows)]
+                self._matrices[key] = transposed.T if np is not None else [list(row) for row in zip(*transposed)]
+            else:
+                self._matrices[key] = self._compute(rows, columns)
+        return self._matrices[key]
+
+    def _xy(self, group):
+        """
+        :return: The coordinates of the entities of the group, one row per entity in matrix order
+        :rtype: numpy.ndarray
+        """
+        if group not in self._coordinates:
+            self._coordinates[group] = np.array([(item.x, item.y) for item in self._entities[group]],
+                                                dtype=float).reshape(-1, 2)
+        return self._coordinates[group]
+
+    def _compute(self, rows, columns):
+        if np is None:
+            return [[math.sqrt((target.x - source.x) ** 2 + (target.y - source.y) ** 2)
+                     for target in self._entities[columns]] for source in self._entities[rows]]
+        source_xy, target_xy = self._xy(rows), self._xy(columns)
+        return np.sqrt((target_xy[None, :, 0] - source_xy[:, 0:1]) ** 2 +
+                       (target_xy[None, :, 1] - source_xy[:, 1:2]) ** 2)
+
+    def row(self, source, group):
+        """
+        :param entity.Entity source: A ship or planet of the turn
+        :param str group: The group to measure to
+        :return: The distances from source to every entity of the group, in matrix order
+        """
+        return self.matrix(self.group_of(source), group)[self._index[self.group_of(source)][source.id]]
+
+    def get(self, source, target):
+        """
+        :param entity.Entity source: A ship or planet of the turn
+        :param entity.Entity target: A ship or planet of the turn
+        :return: The distance between their centres
+        :rtype: float
+        """
+        target_group = self.group_of(target)
+        return float(self.row(source, target_group)[self._index[target_group][target.id]])
+
+    def mask(self, group, predicate):
+        """
+        Evaluate a predicate once over a group, e.g. at the start of the turn, for use with within and closest.
+
+        :param str group: OWN_SHIPS, ENEMY_SHIPS or PLANETS
+        :param predicate: Function of an entity
+        :return: One boolean per entity of the group, in matrix order
+        """
+        values = [bool(predicate(item)) for item in self._entities[group]]
+        return np.array(values, dtype=bool) if np is not None else values
+
+    def within(self, source, group, radius, mask=None):
+        """
+        :param entity.Entity source: A ship or planet of the turn
+        :param str group: The group to search
+        :param float radius: Max distance between the centres
+        :param mask: Only consider entities where this is True (see mask)
+        :return: The entities of the group within radius of source, in matrix order, never source itself
+        :rtype: list[entity.Entity]
+        """
+        distances = self.row(source, group)
+        items = self._entities[group]
+        if np is not None:
+            hits = distances <= radius
+            if mask is not None:
+                hits &= mask
+            found = [items[index] for index in np.flatnonzero(hits)]
+        else:
+            found = [item for index, item in enumerate(items)
+                     if distances[index] <= radius and (mask is None or mask[index])]
+        return [item for item in found if item is not source]
+
+    def closest(self, source, group, mask=None, max_distance=math.inf):
+        """
+        :param entity.Entity source: A ship or planet of the turn
+        :param str group: The group to search
+        :param mask: Only consider entities where this is True (see mask)
+        :param float max_distance: Ignore entities further away than this
+        :return: The closest entity of the group, never source itself, or None
+        :rtype: entity.Entity
+        """
+        distances = self.row(source, group)
+        items = self._entities[group]
+        if not items:
+            return None
+        if np is not None:
+            candidates = np.array(distances, dtype=float)
+            if mask is not None:
+                candidates[~mask] = math.inf
+            if group == self.group_of(source):
+                candidates[self._index[group][source.id]] = math.inf
+            index = int(np.argmin(candidates))
+            return items[index] if candidates[index] <= max_distance else None
+        best = None
+        for index, item in enumerate(items):
+            if item is source or (mask is not None and not mask[index]) or distances[index] > max_distance:
+                continue
+            if best is None or distances[index] < distances[best]:
+                best = index
+        return items[best] if best is not None else None
+
+    def closest_many(self, sources, group, mask=None, max_distance=math.inf):
+        """
+        closest for several sources at once, e.g. every ship given the same task this turn. With numpy this is one
+        argmin over their rows of the matrix.
+
+        :param list[entity.Entity] sources: Ships or planets of the turn, all of the same group
+        :param str group: The group to search
+        :param mask: Only consider entities where this is True (see mask)
+        :param float max_distance: Ignore entities further away than this
+        :return: The closest entity of the group for every source, never the source itself, or None
+        :rtype: list[entity.Entity]
+        """
+        items = self._entities[group]
+        if not sources or not items or np is None:
+            return [self.closest(source, group, mask, max_distance) for source in sources]
+        source_group = self.group_of(sources[0])
+        rows = [self._index[source_group][source.id] for source in sources]
+        # Fancy indexing copies the rows, so the matrix itself is left alone
+        candidates = self.matrix(source_group, group)[rows]
+        if mask is not None:
+            candidates[:, ~np.asarray(mask)] = math.inf
+        if group == source_group:
+            candidates[np.arange(len(rows)), rows] = math.inf
+        indices = np.argmin(candidates, axis=1)
+        best = candidates[np.arange(len(rows)), indices]
+        return [items[index] if distance <= max_distance else None
+                for index, distance in zip(indices.tolist(), best.tolist())]
+
+    def can_dock(self, ship, planet):
+        """
+        Same test as entity.Ship.can_dock, served from the distance matrix.
+
+        :param entity.Ship ship: The ship that wants to dock
+        :param entity.Planet planet: The planet wherein you wish to dock
+        :return: True if can dock, False otherwise
+        :rtype: bool
+        """
+        return self.get(ship, planet) <= planet.radius + constants.DOCK_RADIUS + constants.SHIP_RADIUS
@@ -19,6 +19,7 @@ class Entity:
     :ivar owner: The player ID of the owner, if any. If None, Entity is not owned.
     """
     __metaclass__ = abc.ABCMeta
+    __slots__ = ("x", "y", "radius", "health", "owner", "id")
 
     def __init__(self, x, y, radius, health, player, entity_id):
         self.x = x
@@ -92,20 +93,35 @@ class Planet(Entity):
     :ivar owner: The player ID of the owner, if any. If None, Entity is not owned.
 
     """
+    __slots__ = ("num_docking_spots", "current_production", "remaining_resources",
+                 "_docked_ship_ids", "_docked_ships")
 
     def __init__(self, planet_id, x, y, hp, radius, docking_spots, current,
                  remaining, owned, owner, docked_ships):
-        self.id = planet_id
+        super().__init__(x, y, radius, hp, owner if bool(int(owned)) else None, planet_id)
+        self.num_docking_spots = docking_spots
+        self.current_production = current
+        self.remaining_resources = remaining
+        self._docked_ship_ids = docked_ships
+        self._docked_ships = {}
+
+    def _update(self, x, y, hp, radius, docking_spots, current, remaining, owned, owner, docked_ships):
+        """
+        Refresh the planet in place with the values of a new frame. As in the constructor, the owner and docked
+        ships are stored as ids until the planet is linked again.
+
+        :return: nothing
+        """
         self.x = x
         self.y = y
         self.radius = radius
         self.num_docking_spots = docking_spots
+        self.health = hp
         self.current_production = current
         self.remaining_resources = remaining
-        self.health = hp
         self.owner = owner if bool(int(owned)) else None
         self._docked_ship_ids = docked_ships
-        self._docked_ships = {}
+        self._docked_ships.clear()
 
     def get_docked_ship(self, ship_id):
         """
@@ -157,50 +173,62 @@ class Planet(Entity):
                 self._docked_ships[ship] = self.owner.get_ship(ship)
 
     @staticmethod
-    def _parse_single(tokens):
+    def _parse_single(tokens, cursor, planets=None):
         """
         Parse a single planet given tokenized input from the game environment.
 
-        :return: The planet ID, planet object, and unused tokens.
-        :rtype: (int, Planet, list[str])
+        :param list[str] tokens: The tokenized input
+        :param int cursor: Index of the first token describing this planet
+        :param dict[int, Planet] planets: Planets of the previous frame to update in place, if any
+        :return: The planet ID, planet object, and the index of the next unread token.
+        :rtype: (int, Planet, int)
         """
         (plid, x, y, hp, r, docking, current, remaining,
-         owned, owner, num_docked_ships, *remainder) = tokens
+         owned, owner, num_docked_ships) = tokens[cursor:cursor + 11]
+        cursor += 11
 
         plid = int(plid)
-        docked_ships = []
-
-        for _ in range(int(num_docked_ships)):
-            ship_id, *remainder = remainder
-            docked_ships.append(int(ship_id))
-
-        planet = Planet(int(plid),
-                        float(x), float(y),
-                        int(hp), float(r), int(docking),
-                        int(current), int(remaining),
-                        bool(int(owned)), int(owner),
-                        docked_ships)
-
-        return plid, planet, remainder
+        num_docked_ships = int(num_docked_ships)
+        docked_ships = [int(ship_id) for ship_id in tokens[cursor:cursor + num_docked_ships]]
+        cursor += num_docked_ships
+
+        planet = planets.get(plid) if planets else None
+        if planet is not None:
+            planet._update(float(x), float(y),
+                           int(hp), float(r), int(docking),
+                           int(current), int(remaining),
+                           bool(int(owned)), int(owner),
+                           docked_ships)
+        else:
+            planet = Planet(plid,
+                            float(x), float(y),
+                            int(hp), float(r), int(docking),
+                            int(current), int(remaining),
+                            bool(int(owned)), int(owner),
+                            docked_ships)
+
+        return plid, planet, cursor
 
     @staticmethod
-    def _parse(tokens):
+    def _parse(tokens, cursor, previous=None):
         """
         Parse planet data given a tokenized input.
 
         :param list[str] tokens: The tokenized input
-        :return: the populated planet dict and the unused tokens.
-        :rtype: (dict, list[str])
+        :param int cursor: Index of the token holding the number of planets
+        :param dict[int, Planet] previous: Planets of the previous frame to update in place, if any
+        :return: the populated planet dict and the index of the next unread token.
+        :rtype: (dict, int)
         """
-        num_planets, *remainder = tokens
-        num_planets = int(num_planets)
+        num_planets = int(tokens[cursor])
+        cursor += 1
         planets = {}
 
         for _ in range(num_planets):
-            plid, planet, remainder = Planet._parse_single(remainder)
+            plid, planet, cursor = Planet._parse_single(tokens, cursor, previous)
             planets[plid] = planet
 
-        return planets, remainder
+        return planets, cursor
 
 
 class Ship(Entity):
@@ -223,13 +251,26 @@ class Ship(Entity):
         DOCKED = 2
         UNDOCKING = 3
 
+    __slots__ = ("docking_status", "planet", "_docking_progress", "_weapon_cooldown")
+
     def __init__(self, player_id, ship_id, x, y, hp, vel_x, vel_y,
                  docking_status, planet, progress, cooldown):
-        self.id = ship_id
+        super().__init__(x, y, constants.SHIP_RADIUS, hp, player_id, ship_id)
+        self.docking_status = docking_status
+        self.planet = planet if (docking_status is not Ship.DockingStatus.UNDOCKED) else None
+        self._docking_progress = progress
+        self._weapon_cooldown = cooldown
+
+    def _update(self, player_id, x, y, hp, vel_x, vel_y, docking_status, planet, progress, cooldown):
+        """
+        Refresh the ship in place with the values of a new frame. As in the constructor, the owner and planet
+        are stored as ids until the ship is linked again.
+
+        :return: nothing
+        """
         self.x = x
         self.y = y
         self.owner = player_id
-        self.radius = constants.SHIP_RADIUS
         self.health = hp
         self.docking_status = docking_status
         self.planet = planet if (docking_status is not Ship.DockingStatus.UNDOCKED) else None
@@ -330,46 +371,61 @@ class Ship(Entity):
         self.planet = planets.get(self.planet)  # If not will just reset to none
 
     @staticmethod
-    def _parse_single(player_id, tokens):
+    def _parse_single(player_id, tokens, cursor, ships=None):
         """
         Parse a single ship given tokenized input from the game environment.
 
         :param int player_id: The id of the player who controls the ships
-        :param list[tokens]: The remaining tokens
-        :return: The ship ID, ship object, and unused tokens.
-        :rtype: int, Ship, list[str]
+        :param list[str] tokens: The tokenized input
+        :param int cursor: Index of the first token describing this ship
+        :param dict[int, Ship] ships: Ships of the previous frame to update in place, if any
+        :return: The ship ID, ship object, and the index of the next unread token.
+        :rtype: int, Ship, int
         """
         (sid, x, y, hp, vel_x, vel_y,
-         docked, docked_planet, progress, cooldown, *remainder) = tokens
+         docked, docked_planet, progress, cooldown) = tokens[cursor:cursor + 10]
 
         sid = int(sid)
         docked = Ship.DockingStatus(int(docked))
 
-        ship = Ship(player_id,
-                    sid,
-                    float(x), float(y),
-                    int(hp),
-                    float(vel_x), float(vel_y),
-                    docked, int(docked_planet),
-                    int(progress), int(cooldown))
+        ship = ships.get(sid) if ships else None
+        if ship is not None:
+            ship._update(player_id,
+                         float(x), float(y),
+                         int(hp),
+                         float(vel_x), float(vel_y),
+                         docked, int(docked_planet),
+                         int(progress), int(cooldown))
+        else:
+            ship = Ship(player_id,
+                        sid,
+                        float(x), float(y),
+                        int(hp),
+                        float(vel_x), float(vel_y),
+                        docked, int(docked_planet),
+                        int(progress), int(cooldown))
 
-        return sid, ship, remainder
+        return sid, ship, cursor + 10
 
     @staticmethod
-    def _parse(player_id, tokens):
+    def _parse(player_id, tokens, cursor, previous=None):
         """
-        Parse ship data given a tokenized input.
+        Parse ship data given a tokenized input. Ships found in previous are updated in place and reused, ships
+        missing from the frame (destroyed) are simply left out of the result.
 
         :param int player_id: The id of the player who owns the ships
         :param list[str] tokens: The tokenized input
-        :return: The dict of Players and unused tokens.
-        :rtype: (dict, list[str])
+        :param int cursor: Index of the token holding the number of ships
+        :param dict[int, Ship] previous: Ships of the previous frame to update in place, if any
+        :return: The dict of Ships and the index of the next unread token.
+        :rtype: (dict, int)
         """
         ships = {}
-        num_ships, *remainder = tokens
-        for _ in range(int(num_ships)):
-            ship_id, ships[ship_id], remainder = Ship._parse_single(player_id, remainder)
-        return ships, remainder
+        num_ships = int(tokens[cursor])
+        cursor += 1
+        for _ in range(num_ships):
+            ship_id, ships[ship_id], cursor = Ship._parse_single(player_id, tokens, cursor, previous)
+        return ships, cursor
 
 
 class Position(Entity):
@@ -383,14 +439,10 @@ class Position(Entity):
     :ivar health: Unused.
     :ivar owner: Unused.
     """
+    __slots__ = ()
 
     def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.radius = 0
-        self.health = None
-        self.owner = None
-        self.id = None
+        super().__init__(x, y, 0, None, None, None)
 
     def _link(self, players, planets):
         raise NotImplementedError("Position should not have link attributes.")
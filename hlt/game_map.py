@@ -1,4 +1,30 @@
-from . import collision, entity
+import copy
+import heapq
+import math
+from collections import OrderedDict, namedtuple
+from itertools import islice
+from types import MappingProxyType
+
+from . import collision, constants, distances, entity, spatial
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only the columnar parse path needs it
+    np = None
+
+
+#: Column arrays of every ship in the frame, one entry per ship (raw engine values, owner is the player id)
+ShipArrays = namedtuple("ShipArrays", ["id", "x", "y", "hp", "vel_x", "vel_y", "docking_status", "planet",
+                                       "progress", "cooldown", "owner"])
+#: Column arrays of every planet in the frame, one entry per planet (raw engine values). docked_ship_ids holds the
+#: docked ships of all planets one after the other, num_docked_ships of them per planet
+PlanetArrays = namedtuple("PlanetArrays", ["id", "x", "y", "hp", "radius", "docking_spots", "current",
+                                           "remaining", "owned", "owner", "num_docked_ships", "docked_ship_ids"])
+
+#: Owner key of the buckets holding the entities of every player but the user
+_ENEMY = "enemy"
+#: Docking statuses indexed by their engine value
+_DOCKING_STATUSES = tuple(entity.Ship.DockingStatus)
 
 
 class Map:
@@ -8,19 +34,46 @@ class Map:
     :ivar my_id: Current player id associated with the map
     :ivar width: Map width
     :ivar height: Map height
+    :ivar incremental: Whether parsing updates the previous Player, Ship and Planet objects in place
+    :ivar columnar: Whether frames are decoded into column arrays, from which the entities are then built
+    :ivar ShipArrays ship_arrays: Column arrays of all ships in parse order, only filled in columnar mode
+    :ivar PlanetArrays planet_arrays: Column arrays of all planets in parse order, only filled in columnar mode
+    :ivar PlanetClearanceCache planet_cache: Planets that may block a segment, kept across turns (None if disabled)
     """
 
-    def __init__(self, my_id, width, height):
+    def __init__(self, my_id, width, height, incremental=False, columnar=False, planet_cache_size=4096):
         """
         :param my_id: User's id (tag)
         :param width: Map width
         :param height: Map height
+        :param bool incremental: Reuse entity objects across turns instead of rebuilding them (optional)
+        :param bool columnar: Decode every frame into numpy column arrays and build the entities from them
+            (optional, requires numpy)
+        :param int planet_cache_size: Max number of segments in planet_cache, 0 to disable it (optional)
         """
+        if columnar and np is None:
+            raise ImportError("Map(columnar=True) requires numpy")
         self.my_id = my_id
         self.width = width
         self.height = height
+        self.incremental = incremental
+        self.columnar = columnar
+        self.ship_arrays = None
+        self.planet_arrays = None
+        self._forked = None
+        self._ship_grid = spatial.UniformGrid(constants.MAX_SPEED)
+        self._player_grids = None
+        self._planet_index = None
+        self._planet_field = None
+        self.planet_cache = PlanetClearanceCache(planet_cache_size) if planet_cache_size else None
+        self._neighbours = None
+        self._distance_table = None
+        self._ship_buckets = {}
+        self._docked_ships = {}
+        self._planet_buckets = {}
         self._players = {}
         self._planets = {}
+        self._ships = {}
 
     def get_me(self):
         """
@@ -44,6 +97,14 @@ class Map:
         """
         return list(self._players.values())
 
+    def get_ship(self, ship_id):
+        """
+        :param int ship_id:
+        :return: The ship associated with ship_id, whichever player owns it
+        :rtype: entity.Ship
+        """
+        return self._ships.get(ship_id)
+
     def get_planet(self, planet_id):
         """
         :param int planet_id:
@@ -59,6 +120,328 @@ class Map:
         """
         return list(self._planets.values())
 
+    def index_planets(self, planets):
+        """
+        Build the static planet index used by the collision queries, and with numpy the planet distance field.
+        Planets never move, so this is done once, from the initial map, and reused every turn. Game does this when
+        it starts; call it yourself for maps built by hand. The planet cache is dropped, its entries came from the
+        previous index.
+
+        :param planets: The planets to index (need id, x, y, radius attributes)
+        :return: nothing
+        """
+        self._planet_index = spatial.PlanetIndex(planets)
+        if self.planet_cache is not None:
+            self.planet_cache.clear()
+        if np is not None:
+            self._planet_field = spatial.PlanetField(planets, self.width, self.height)
+
+    def track_neighbours(self, reach, skin):
+        """
+        Keep neighbour lists of the ships across turns, so obstacles_near answers moves of up to reach from the list of
+        the ship instead of searching the ship grid. Lists are only rebuilt for ships that moved more than half the
+        skin since theirs was built, which at a skin of two turns of travel is every other turn for a ship at full
+        speed, and never for docked ships. Only worth it for a map that parses every turn, like the one of Game.
+
+        :param float reach: The longest move obstacles_near is asked about
+        :param float skin: The margin kept on top of the interaction radius
+        :return: nothing
+        """
+        # The radius obstacles_near searches for ships, summed the same way
+        self._neighbours = spatial.NeighbourList(reach + constants.SHIP_RADIUS + (constants.SHIP_RADIUS + 0.1), skin)
+        self._neighbours.update(self._ships.values())
+
+    def planet_clearance(self, point):
+        """
+        :param entity.Entity point: The point to measure from
+        :return: Distance from the point to the nearest planet surface, negative inside a planet. Read from the
+            planet distance field when there is one, as a lower bound accurate to about a unit.
+        :rtype: float
+        """
+        if self._planet_field is not None:
+            return self._planet_field.clearance(point)
+        return min((point.calculate_distance_between(planet) - planet.radius for planet in self.all_planets()),
+                   default=math.inf)
+
+    def _planet_candidates(self, planet_ids):
+        """
+        :param list[int] planet_ids: Ids from the planet index
+        :return: The planets of the current turn with those ids, skipping destroyed ones
+        :rtype: list[entity.Planet]
+        """
+        planets = (self._planets.get(planet_id) for planet_id in planet_ids)
+        return [planet for planet in planets if planet is not None]
+
+    def nearest_planet(self, target, predicate=None):
+        """
+        Find the planet whose centre is closest to the target.
+
+        :param entity.Entity target: The point to measure from
+        :param predicate: Only consider planets for which this returns True (optional)
+        :return: The closest planet, or None if there is none
+        :rtype: entity.Planet
+        """
+        if self._planet_index is None:
+            planets = [planet for planet in self.all_planets() if predicate is None or predicate(planet)]
+            return min(planets, key=target.calculate_distance_between, default=None)
+        for _, planet_id in self._planet_index.by_distance(target):
+            planet = self._planets.get(planet_id)
+            if planet is not None and (predicate is None or predicate(planet)):
+                return planet
+        return None
+
+    def nearest(self, target, kinds=(entity.Ship, entity.Planet), k=None, max_distance=math.inf, predicate=None,
+                owners=None):
+        """
+        Lazily iterate over the entities closest to the target (centre to centre), nearest first. Results come from
+        the spatial indexes as they are consumed, so taking only the first one costs little more than a lookup.
+
+        :param entity.Entity target: The entity or position to measure from; it is never part of the result
+        :param tuple kinds: The entity types to consider
+        :param int k: Stop after this many entities (optional)
+        :param float max_distance: Stop once entities are further away than this (optional)
+        :param predicate: Only yield entities for which this returns True (optional)
+        :param owners: Only search the ships of the players with these ids, using their own grids (optional)
+        :return: Generator of entities, nearest first
+        :rtype: Iterator[entity.Entity]
+        """
+        streams = []
+        if issubclass(entity.Ship, kinds):
+            if owners is None:
+                streams.append(self._ship_grid.by_distance(target, max_distance))
+            else:
+                player_grids = self._grids_by_player()
+                streams += [player_grids[player_id].by_distance(target, max_distance)
+                            for player_id in owners if player_id in player_grids]
+        if issubclass(entity.Planet, kinds):
+            if self._planet_index is None:
+                planets = ((target.calculate_distance_between(planet), planet) for planet in self.all_planets())
+                streams.append(iter(sorted(planets, key=lambda item: item[0])))
+            else:
+                streams.append((distance, self._planets.get(planet_id)) for distance, planet_id
+                               in self._planet_index.by_distance(target) if planet_id in self._planets)
+
+        count = 0
+        merged = streams[0] if len(streams) == 1 else heapq.merge(*streams, key=lambda item: item[0])
+        for distance, foreign_entity in merged:
+            if distance > max_distance or (k is not None and count >= k):
+                return
+            if foreign_entity is target or (predicate is not None and not predicate(foreign_entity)):
+                continue
+            count += 1
+            yield foreign_entity
+
+    def _grids_by_player(self):
+        """
+        :return: A grid of the ships of every player, by player id, built the first time a turn asks for them
+        :rtype: dict[int, spatial.UniformGrid]
+        """
+        if self._player_grids is None:
+            self._player_grids = {}
+            for player in self.all_players():
+                player_grid = self._player_grids[player.id] = spatial.UniformGrid(constants.MAX_SPEED)
+                for ship in player.all_ships():
+                    player_grid.insert(ship)
+        return self._player_grids
+
+    def within(self, target, radius, kinds=(entity.Ship, entity.Planet)):
+        """
+        :param entity.Entity target: The entity or position to measure from; it is never part of the result
+        :param float radius: Max distance between the centres
+        :param tuple kinds: The entity types to consider
+        :return: The entities whose centre lies within radius of the target's, ships first
+        :rtype: list[entity.Entity]
+        """
+        candidates = []
+        if issubclass(entity.Ship, kinds):
+            candidates += self._ship_grid.query_radius(target, radius)
+        if issubclass(entity.Planet, kinds):
+            candidates += self.all_planets() if self._planet_index is None \
+                else self._planet_candidates(self._planet_index.query_point(target, radius))
+        return [foreign_entity for foreign_entity in candidates
+                if foreign_entity is not target and target.calculate_distance_between(foreign_entity) <= radius]
+
+    def ships(self, owner=None, status=None, enemy=False, planet=None, near=None):
+        """
+        The ships of this turn that meet every given condition, answered from the buckets filled during parse.
+
+        :param owner: Only the ships of this player, a Player or a player id (optional)
+        :param entity.Ship.DockingStatus status: Only the ships with this docking status (optional)
+        :param bool enemy: Only the ships of the other players (optional)
+        :param planet: Only the ships docked to this planet, a Planet or a planet id (optional)
+        :param near: Only the ships whose centre lies within a distance of a point, as (point, distance) (optional)
+        :return: The matching ships, in parse order. Without planet and near this is the stored bucket itself
+        :rtype: tuple[entity.Ship]
+        """
+        owner = self._owner_key(owner, enemy)
+        if planet is None and near is None:
+            return self._ship_buckets.get((owner, status), ())
+        if planet is not None:
+            candidates = self._docked_ships.get(getattr(planet, "id", planet), ())
+        else:
+            candidates = self._ship_grid.query_radius(*near)
+        return tuple(ship for ship in candidates
+                     if self._owned_by(ship, owner) and (status is None or ship.docking_status is status)
+                     and (near is None or near[0].calculate_distance_between(ship) <= near[1]))
+
+    def planets(self, owner=None, enemy=False, empty=None, full=None, near=None):
+        """
+        The planets of this turn that meet every given condition, answered from the buckets filled during parse.
+
+        :param owner: Only the planets of this player, a Player or a player id (optional)
+        :param bool enemy: Only the planets of the other players (optional)
+        :param bool empty: Only the planets without (True) or with (False) docked ships (optional)
+        :param bool full: Only the planets whose docking spots are all (True) or not all (False) taken (optional)
+        :param near: Only the planets whose centre lies within a distance of a point, as (point, distance) (optional)
+        :return: The matching planets, in parse order. Without near this is the stored bucket itself
+        :rtype: tuple[entity.Planet]
+        """
+        planets = self._planet_buckets.get((self._owner_key(owner, enemy), empty, full), ())
+        if near is None:
+            return planets
+        point, distance = near
+        return tuple(planet for planet in planets if point.calculate_distance_between(planet) <= distance)
+
+    def _owner_key(self, owner, enemy):
+        """
+        :return: The owner part of a bucket key: a player id, _ENEMY, or None for every owner
+        """
+        if enemy:
+            if owner is not None:
+                raise ValueError("Pass either owner or enemy, not both")
+            return _ENEMY
+        return getattr(owner, "id", owner)
+
+    def _owned_by(self, item, owner):
+        """
+        :return: Whether the entity belongs under the owner part of a bucket key
+        :rtype: bool
+        """
+        if owner is None:
+            return True
+        if item.owner is None:
+            return False
+        return item.owner.id != self.my_id if owner is _ENEMY else item.owner.id == owner
+
+    def _fill_buckets(self):
+        """
+        Sort the ships and planets of the frame into buckets, one for every combination of conditions that ships
+        and planets answer with a lookup, and the ships docked to each planet.
+
+        :return: nothing
+        """
+        ships, docked = {}, {}
+        for player in self._players.values():
+            owners = (player.id, None) if player.id == self.my_id else (player.id, _ENEMY, None)
+            for ship in player._ships.values():
+                for owner in owners:
+                    ships.setdefault((owner, ship.docking_status), []).append(ship)
+                    ships.setdefault((owner, None), []).append(ship)
+                if ship.planet is not None:
+                    docked.setdefault(ship.planet.id, []).append(ship)
+
+        planets = {}
+        for planet in self._planets.values():
+            if planet.owner is None:
+                owners = (None,)
+            elif planet.owner.id == self.my_id:
+                owners = (planet.owner.id, None)
+            else:
+                owners = (planet.owner.id, _ENEMY, None)
+            empty = not planet._docked_ship_ids
+            full = planet.is_full()
+            for owner in owners:
+                for key in ((owner, empty, full), (owner, empty, None), (owner, None, full), (owner, None, None)):
+                    planets.setdefault(key, []).append(planet)
+
+        self._ship_buckets = {key: tuple(bucket) for key, bucket in ships.items()}
+        self._docked_ships = {key: tuple(bucket) for key, bucket in docked.items()}
+        self._planet_buckets = {key: tuple(bucket) for key, bucket in planets.items()}
+
+    def distance_table(self):
+        """
+        :return: The pairwise distances of this turn between own ships, enemy ships and planets, built on first use
+        :rtype: distances.DistanceTable
+        """
+        if self._distance_table is None:
+            self._distance_table = distances.DistanceTable(self)
+        return self._distance_table
+
+    def snapshot(self):
+        """
+        :return: An immutable summary of the map: planet geometry and every player's fleet
+        :rtype: MapSnapshot
+        """
+        return MapSnapshot(self)
+
+    def fork(self):
+        """
+        Cheap copy of the map for look-ahead within a turn. The fork shares every player, ship and planet with this
+        map; use edit_ship / edit_planet to get a private copy of an entity before modifying it in the fork. Links
+        of entities that were not edited keep pointing at the shared objects, and spatial indexes, the buckets of
+        ships and planets and the column arrays are shared as well, so they reflect the state of the last parse.
+
+        :return: The forked map
+        :rtype: Map
+        """
+        fork = copy.copy(self)
+        fork._players = dict(self._players)
+        fork._planets = dict(self._planets)
+        fork._ships = dict(self._ships)
+        fork._forked = set()
+        return fork
+
+    def _edit_player(self, player):
+        """
+        :param Player player: A player of this map
+        :return: The player, copied first if it is shared with the map this one was forked from
+        :rtype: Player
+        """
+        if self._forked is None or ("player", player.id) in self._forked:
+            return player
+        player = copy.copy(player)
+        player._ships = dict(player._ships)
+        self._players[player.id] = player
+        self._forked.add(("player", player.id))
+        return player
+
+    def edit_ship(self, ship_id):
+        """
+        Get a ship that may be modified without affecting the map this one was forked from.
+
+        :param int ship_id: The id of the ship to edit
+        :return: The ship private to this map, or None if there is no such ship
+        :rtype: entity.Ship
+        """
+        ship = self._ships.get(ship_id)
+        if ship is None or self._forked is None or ("ship", ship_id) in self._forked:
+            return ship
+        player = self._edit_player(self._players[ship.owner.id])
+        ship = copy.copy(ship)
+        ship.owner = player
+        player._ships[ship_id] = ship
+        self._ships[ship_id] = ship
+        self._forked.add(("ship", ship_id))
+        return ship
+
+    def edit_planet(self, planet_id):
+        """
+        Get a planet that may be modified without affecting the map this one was forked from.
+
+        :param int planet_id: The id of the planet to edit
+        :return: The planet private to this map, or None if there is no such planet
+        :rtype: entity.Planet
+        """
+        planet = self._planets.get(planet_id)
+        if planet is None or self._forked is None or ("planet", planet_id) in self._forked:
+            return planet
+        planet = copy.copy(planet)
+        planet._docked_ship_ids = list(planet._docked_ship_ids)
+        planet._docked_ships = dict(planet._docked_ships)
+        self._planets[planet_id] = planet
+        self._forked.add(("planet", planet_id))
+        return planet
+
     def nearby_entities_by_distance(self, entity):
         """
         :param entity: The source entity to find distances from
@@ -83,19 +466,152 @@ class Map:
 
     def _parse(self, map_string):
         """
-        Parse the map description from the game.
+        Parse the map description from the game. In incremental mode the players, ships and planets of the previous
+        frame are updated in place, so references held by bot code stay valid for as long as the entity lives. In
+        columnar mode the description is decoded into column arrays first, and the entities are built from those.
 
         :param map_string: The string which the Halite engine outputs
         :return: nothing
         """
-        tokens = map_string.split()
+        players, planets = (self._players, self._planets) if self.incremental else (None, None)
 
-        self._players, tokens = Player._parse(tokens)
-        self._planets, tokens = entity.Planet._parse(tokens)
-
-        assert(len(tokens) == 0)  # There should be no remaining tokens at this point
+        if self.columnar:
+            fleets, self.ship_arrays, self.planet_arrays = Map._decode_columns(map_string)
+            self._players = self._players_from_columns(fleets, players)
+            self._planets = self._planets_from_columns(planets)
+        else:
+            tokens = map_string.split()
+            self._players, cursor = Player._parse(tokens, 0, players)
+            self._planets, cursor = entity.Planet._parse(tokens, cursor, planets)
+            assert(cursor == len(tokens))  # There should be no remaining tokens at this point
         self._link()
 
+        self._distance_table = None
+        self._ship_grid = spatial.UniformGrid(constants.MAX_SPEED)
+        self._player_grids = None
+        self._ships = {}
+        for player in self.all_players():
+            for ship in player.all_ships():
+                self._ships[ship.id] = ship
+                self._ship_grid.insert(ship)
+        if self._neighbours is not None:
+            self._neighbours.update(self._ships.values())
+        self._fill_buckets()
+
+    @staticmethod
+    def _decode_columns(map_string):
+        """
+        Decode the map description into numpy column arrays. The whole line is converted to numbers in one call;
+        the ship records of every player are then a contiguous block that is reshaped without a Python loop. Planet
+        records vary in length with their docked ships, so only their starts are found walking the line; the
+        records themselves and the docked ships are gathered in one go.
+
+        :param str map_string: The string which the Halite engine outputs
+        :return: The (player id, number of ships) of every player, and the ship and planet column arrays
+        :rtype: (list[(int, int)], ShipArrays, PlanetArrays)
+        """
+        values = np.fromstring(map_string, sep=' ')
+
+        fleets, blocks, owners = [], [], []
+        cursor = 1
+        for _ in range(int(values[0])):
+            player_id, num_ships = int(values[cursor]), int(values[cursor + 1])
+            cursor += 2
+            fleets.append((player_id, num_ships))
+            blocks.append(values[cursor:cursor + 10 * num_ships].reshape(num_ships, 10))
+            owners.append(np.full(num_ships, player_id, dtype=np.int64))
+            cursor += 10 * num_ships
+        ships = np.concatenate(blocks) if blocks else np.empty((0, 10))
+        ship_ints = ships[:, [0, 3, 6, 7, 8, 9]].astype(np.int64)
+        ship_arrays = ShipArrays(id=ship_ints[:, 0], x=ships[:, 1], y=ships[:, 2], hp=ship_ints[:, 1],
+                                 vel_x=ships[:, 4], vel_y=ships[:, 5], docking_status=ship_ints[:, 2],
+                                 planet=ship_ints[:, 3], progress=ship_ints[:, 4], cooldown=ship_ints[:, 5],
+                                 owner=np.concatenate(owners) if owners else np.empty(0, dtype=np.int64))
+
+        num_planets = int(values[cursor])
+        cursor += 1
+        starts = []
+        for _ in range(num_planets):
+            starts.append(cursor)
+            cursor += 11 + int(values[cursor + 10])
+        assert(cursor == len(values))  # There should be no remaining values at this point
+        starts = np.array(starts, dtype=np.int64)
+        rows = values[starts[:, None] + np.arange(11)].reshape(num_planets, 11)
+        planet_ints = rows[:, [0, 3, 5, 6, 7, 8, 9, 10]].astype(np.int64)
+        counts = planet_ints[:, 7]
+        # Position of every docked ship id: the end of its planet's record plus its rank among that planet's ships
+        first = np.cumsum(counts) - counts
+        ranks = np.arange(int(counts.sum())) - np.repeat(first, counts)
+        docked = values[np.repeat(starts + 11, counts) + ranks].astype(np.int64)
+        planet_arrays = PlanetArrays(id=planet_ints[:, 0], x=rows[:, 1], y=rows[:, 2], hp=planet_ints[:, 1],
+                                     radius=rows[:, 4], docking_spots=planet_ints[:, 2], current=planet_ints[:, 3],
+                                     remaining=planet_ints[:, 4], owned=planet_ints[:, 5].astype(bool),
+                                     owner=planet_ints[:, 6], num_docked_ships=counts, docked_ship_ids=docked)
+
+        return fleets, ship_arrays, planet_arrays
+
+    def _players_from_columns(self, fleets, previous=None):
+        """
+        Build the players and their ships from ship_arrays, as Player._parse does from the tokens.
+
+        :param list[(int, int)] fleets: The (player id, number of ships) of every player, in parse order
+        :param dict[int, Player] previous: Players of the previous frame to update in place, if any
+        :return: The players, by id
+        :rtype: dict[int, Player]
+        """
+        arrays = self.ship_arrays
+        columns = zip(arrays.id.tolist(), arrays.x.tolist(), arrays.y.tolist(), arrays.hp.tolist(),
+                      arrays.vel_x.tolist(), arrays.vel_y.tolist(), arrays.docking_status.tolist(),
+                      arrays.planet.tolist(), arrays.progress.tolist(), arrays.cooldown.tolist())
+        players = {}
+        for player_id, num_ships in fleets:
+            player = previous.get(player_id) if previous else None
+            known = player._ships if player is not None else None
+            ships = {}
+            for ship_id, x, y, hp, vel_x, vel_y, status, planet, progress, cooldown in islice(columns, num_ships):
+                ship = known.get(ship_id) if known else None
+                if ship is not None:
+                    ship._update(player_id, x, y, hp, vel_x, vel_y, _DOCKING_STATUSES[status], planet, progress,
+                                 cooldown)
+                else:
+                    ship = entity.Ship(player_id, ship_id, x, y, hp, vel_x, vel_y, _DOCKING_STATUSES[status], planet,
+                                       progress, cooldown)
+                ships[ship_id] = ship
+            if player is not None:
+                player._ships = ships
+            else:
+                player = Player(player_id, ships)
+            players[player_id] = player
+        return players
+
+    def _planets_from_columns(self, previous=None):
+        """
+        Build the planets from planet_arrays, as entity.Planet._parse does from the tokens.
+
+        :param dict[int, entity.Planet] previous: Planets of the previous frame to update in place, if any
+        :return: The planets, by id
+        :rtype: dict[int, entity.Planet]
+        """
+        arrays = self.planet_arrays
+        docked = arrays.docked_ship_ids.tolist()
+        planets = {}
+        start = 0
+        for planet_id, x, y, hp, radius, spots, current, remaining, owned, owner, count in zip(
+                arrays.id.tolist(), arrays.x.tolist(), arrays.y.tolist(), arrays.hp.tolist(),
+                arrays.radius.tolist(), arrays.docking_spots.tolist(), arrays.current.tolist(),
+                arrays.remaining.tolist(), arrays.owned.tolist(), arrays.owner.tolist(),
+                arrays.num_docked_ships.tolist()):
+            docked_ships = docked[start:start + count]
+            start += count
+            planet = previous.get(planet_id) if previous else None
+            if planet is not None:
+                planet._update(x, y, hp, radius, spots, current, remaining, owned, owner, docked_ships)
+            else:
+                planet = entity.Planet(planet_id, x, y, hp, radius, spots, current, remaining, owned, owner,
+                                       docked_ships)
+            planets[planet_id] = planet
+        return planets
+
     def _all_ships(self):
         """
         Helper function to extract all ships from all players
@@ -116,7 +632,14 @@ class Map:
         :return: The colliding entity if so, else None.
         :rtype: entity.Entity
         """
-        for celestial_object in self._all_ships() + self.all_planets():
+        nearby_ships = self._ship_grid.query_radius(target, constants.SHIP_RADIUS + target.radius + 0.1)
+        if self._planet_field is not None and self._planet_field.clearance(target) > target.radius + 0.1:
+            nearby_planets = []
+        elif self._planet_index is None:
+            nearby_planets = self.all_planets()
+        else:
+            nearby_planets = self._planet_candidates(self._planet_index.query_point(target, target.radius + 0.1))
+        for celestial_object in nearby_ships + nearby_planets:
             if celestial_object is target:
                 continue
             d = celestial_object.calculate_distance_between(target)
@@ -135,15 +658,328 @@ class Map:
         :rtype: list[entity.Entity]
         """
         obstacles = []
-        entities = ([] if issubclass(entity.Planet, ignore) else self.all_planets()) \
-            + ([] if issubclass(entity.Ship, ignore) else self._all_ships())
+        fudge = ship.radius + 0.1
+        if issubclass(entity.Planet, ignore):
+            planets = []
+        elif self._planet_index is None:
+            planets = self.all_planets()
+        elif self.planet_cache is None:
+            planets = self._planet_candidates(self._segment_planet_ids(ship, target, fudge))
+        else:
+            cache = self.planet_cache
+            key = cache.key(ship, target, fudge)
+            planet_ids = cache.get(key)
+            if planet_ids is None:
+                start, end = cache.endpoints(key)
+                planet_ids = self._segment_planet_ids(start, end, fudge + cache.slack)
+                cache.put(key, planet_ids)
+            planets = self._planet_candidates(planet_ids)
+        entities = planets + ([] if issubclass(entity.Ship, ignore)
+                              else self._ship_grid.query_segment(ship, target, constants.SHIP_RADIUS + fudge))
         for foreign_entity in entities:
             if foreign_entity == ship or foreign_entity == target:
                 continue
-            if collision.intersect_segment_circle(ship, target, foreign_entity, fudge=ship.radius + 0.1):
+            if collision.intersect_segment_circle(ship, target, foreign_entity, fudge=fudge):
                 obstacles.append(foreign_entity)
         return obstacles
 
+    def _segment_planet_ids(self, start, end, margin):
+        """
+        :param entity.Entity start: The start of the segment
+        :param entity.Entity end: The end of the segment
+        :param float margin: Distance to keep from the planet surfaces
+        :return: Ids of the planets that come within margin of the segment, in the order of the planet index
+        :rtype: tuple[int]
+        """
+        if self._planet_field is not None and self._planet_field.segment_clear(start, end, margin):
+            return ()
+        planets = self._planet_candidates(self._planet_index.query_segment(start, end, margin))
+        return tuple(planet.id for planet in planets
+                     if collision.segment_distance(start, end, planet) <= planet.radius + margin)
+
+    def obstacles_near(self, ship, reach, ignore=()):
+        """
+        Find everything a straight move of the ship, in any direction, could run into.
+
+        :param entity.Ship ship: Source entity
+        :param float reach: Length of the move
+        :param entity.Entity ignore: Which entity type to ignore
+        :return: The planets, then the ships, whose circle grown by the same fudge as obstacles_between comes within
+            reach of the ship's centre
+        :rtype: list[entity.Entity]
+        """
+        fudge = ship.radius + 0.1
+        if issubclass(entity.Planet, ignore) or \
+                (self._planet_field is not None and self._planet_field.clearance(ship) > reach + fudge):
+            planets = []
+        elif self._planet_index is None:
+            planets = self.all_planets()
+        else:
+            planets = self._planet_candidates(self._planet_index.query_point(ship, reach + fudge))
+        if issubclass(entity.Ship, ignore):
+            ships = []
+        elif self._neighbours is not None and ship in self._neighbours and \
+                reach + constants.SHIP_RADIUS + fudge <= self._neighbours.radius:
+            ships = self._neighbours.neighbours(ship)
+        else:
+            ships = self._ship_grid.query_radius(ship, reach + constants.SHIP_RADIUS + fudge)
+        return [foreign_entity for foreign_entity in planets + ships if foreign_entity != ship and
+                ship.calculate_distance_between(foreign_entity) - foreign_entity.radius - fudge <= reach]
+
+
+class PlanetClearanceCache:
+    """
+    Bounded LRU cache of the planets that may block a segment, for collision checks that only depend on the static
+    planets. Segments are keyed by their endpoints rounded to quantum, so ships flying the same corridor share
+    entries. Every entry holds the planets within reach of the rounded segment grown by the most rounding can move
+    it (slack), a superset of the planets near any segment with the same key; the exact test still runs on them.
+
+    :ivar maxsize: Max number of segments kept
+    :ivar quantum: Grid the endpoints are rounded to
+    :ivar slack: Most a point of a segment can move by rounding its endpoints
+    :ivar hits: Number of lookups answered from the cache
+    :ivar misses: Number of lookups that had to be computed
+    """
+
+    def __init__(self, maxsize=4096, quantum=1.0):
+        """
+        :param int maxsize: Max number of segments kept, the least recently used go first
+        :param float quantum: Grid the endpoints are rounded to; 1 matches the integer speeds of the engine
+        """
+        self.maxsize = maxsize
+        self.quantum = quantum
+        self.slack = quantum * math.sqrt(2) / 2
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, start, end, margin):
+        """
+        :param entity.Entity start: The start of the segment
+        :param entity.Entity end: The end of the segment
+        :param float margin: Distance to keep from the planet surfaces
+        :return: The key of the segment
+        :rtype: tuple
+        """
+        quantum = self.quantum
+        return (round(start.x / quantum), round(start.y / quantum), round(end.x / quantum), round(end.y / quantum),
+                margin)
+
+    def endpoints(self, key):
+        """
+        :param tuple key: A key from key()
+        :return: The rounded start and end of the segment
+        :rtype: (entity.Position, entity.Position)
+        """
+        quantum = self.quantum
+        return (entity.Position(key[0] * quantum, key[1] * quantum),
+                entity.Position(key[2] * quantum, key[3] * quantum))
+
+    def get(self, key):
+        """
+        :param tuple key: A key from key()
+        :return: The cached planet ids, or None on a miss
+        :rtype: tuple[int]
+        """
+        planet_ids = self._entries.get(key)
+        if planet_ids is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return planet_ids
+
+    def put(self, key, planet_ids):
+        """
+        :param tuple key: A key from key()
+        :param tuple[int] planet_ids: The planets near the segment grown by slack
+        :return: nothing
+        """
+        self._entries[key] = planet_ids
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Drop every entry and reset the counters.
+
+        :return: nothing
+        """
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+
+class PlanetSnapshot(namedtuple("PlanetSnapshot", ["id", "x", "y", "radius", "num_docking_spots", "health"])):
+    """
+    Frozen geometry of a planet, as stored in a MapSnapshot. It measures distances and angles like entity.Planet.
+    """
+    __slots__ = ()
+    calculate_distance_between = entity.Entity.calculate_distance_between
+    calculate_angle_between = entity.Entity.calculate_angle_between
+    closest_point_to = entity.Entity.closest_point_to
+
+
+class ShipSnapshot(namedtuple("ShipSnapshot", ["id", "x", "y", "health", "owner"])):
+    """
+    Frozen state of a ship, as stored in a MapSnapshot; owner is the player id. It measures distances and angles like
+    entity.Ship.
+    """
+    __slots__ = ()
+    radius = constants.SHIP_RADIUS
+    calculate_distance_between = entity.Entity.calculate_distance_between
+    calculate_angle_between = entity.Entity.calculate_angle_between
+    closest_point_to = entity.Entity.closest_point_to
+
+
+class PlayerSnapshot(namedtuple("PlayerSnapshot", ["id", "ships"])):
+    """
+    Frozen fleet of a player, as stored in a MapSnapshot, with the read-only part of the Player API.
+    """
+    __slots__ = ()
+
+    def all_ships(self):
+        """
+        :return: All ships of the player
+        :rtype: tuple[ShipSnapshot]
+        """
+        return self.ships
+
+    def get_ship(self, ship_id):
+        """
+        :param int ship_id: The ship id of the desired ship.
+        :return: The ship designated by ship_id belonging to this player, or None
+        :rtype: ShipSnapshot
+        """
+        return next((ship for ship in self.ships if ship.id == ship_id), None)
+
+
+class MapSnapshot:
+    """
+    Immutable summary of a map, e.g. the initial map before the game starts. It holds the frozen geometry of every
+    planet and the fleet of every player, so it is much cheaper to take than a deep copy and safe to share. It answers
+    the read-only queries of Map (get_me, all_players, all_planets, nearby_entities_by_distance, obstacles_between,
+    ...) with PlayerSnapshot, ShipSnapshot and PlanetSnapshot in place of the entities; ship and planet owners are
+    player ids, and docking state is not kept.
+
+    :ivar my_id: Current player id associated with the map
+    :ivar width: Map width
+    :ivar height: Map height
+    """
+    __slots__ = ("my_id", "width", "height", "_planets", "_players")
+
+    def __init__(self, game_map):
+        """
+        :param Map game_map: The map to take the snapshot of
+        """
+        planets = {planet.id: PlanetSnapshot(planet.id, planet.x, planet.y, planet.radius,
+                                             planet.num_docking_spots, planet.health)
+                   for planet in game_map.all_planets()}
+        players = {player.id: PlayerSnapshot(player.id, tuple(ShipSnapshot(ship.id, ship.x, ship.y, ship.health,
+                                                                           player.id)
+                                                              for ship in player.all_ships()))
+                   for player in game_map.all_players()}
+        object.__setattr__(self, "my_id", game_map.my_id)
+        object.__setattr__(self, "width", game_map.width)
+        object.__setattr__(self, "height", game_map.height)
+        object.__setattr__(self, "_planets", MappingProxyType(planets))
+        object.__setattr__(self, "_players", MappingProxyType(players))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MapSnapshot is immutable")
+
+    def get_me(self):
+        """
+        :return: The user's player
+        :rtype: PlayerSnapshot
+        """
+        return self._players.get(self.my_id)
+
+    def get_player(self, player_id):
+        """
+        :param int player_id: The id of the desired player
+        :return: The player associated with player_id
+        :rtype: PlayerSnapshot
+        """
+        return self._players.get(player_id)
+
+    def all_players(self):
+        """
+        :return: All players
+        :rtype: tuple[PlayerSnapshot]
+        """
+        return tuple(self._players.values())
+
+    def get_planet(self, planet_id):
+        """
+        :param int planet_id:
+        :return: The planet associated with planet_id
+        :rtype: PlanetSnapshot
+        """
+        return self._planets.get(planet_id)
+
+    def all_planets(self):
+        """
+        :return: All planets
+        :rtype: tuple[PlanetSnapshot]
+        """
+        return tuple(self._planets.values())
+
+    def all_ships(self):
+        """
+        :return: The ships of every player
+        :rtype: tuple[ShipSnapshot]
+        """
+        return tuple(ship for player in self._players.values() for ship in player.ships)
+
+    def get_fleet(self, player_id):
+        """
+        :param int player_id: The id of the desired player
+        :return: The ships of that player
+        :rtype: tuple[ShipSnapshot]
+        """
+        player = self._players.get(player_id)
+        return player.ships if player is not None else ()
+
+    def all_player_ids(self):
+        """
+        :return: The ids of all players
+        :rtype: tuple[int]
+        """
+        return tuple(self._players)
+
+    def nearby_entities_by_distance(self, entity):
+        """
+        :param entity: The source entity to find distances from
+        :return: Dict containing all ships and planets with their designated distances
+        :rtype: dict
+        """
+        result = {}
+        for foreign_entity in self.all_ships() + self.all_planets():
+            if entity == foreign_entity:
+                continue
+            result.setdefault(entity.calculate_distance_between(foreign_entity), []).append(foreign_entity)
+        return result
+
+    def obstacles_between(self, ship, target, ignore=()):
+        """
+        Check whether there is a straight-line path to the given point, without obstacles in between.
+
+        :param ship: Source entity
+        :param target: Target entity
+        :param ignore: Which entity type to ignore, entity.Ship or entity.Planet
+        :return: The list of obstacles between the ship and target
+        :rtype: list
+        """
+        entities = (() if issubclass(entity.Planet, ignore) else self.all_planets()) + \
+            (() if issubclass(entity.Ship, ignore) else self.all_ships())
+        return [foreign_entity for foreign_entity in entities
+                if foreign_entity != ship and foreign_entity != target and
+                collision.intersect_segment_circle(ship, target, foreign_entity, fudge=ship.radius + 0.1)]
+
 
 class Player:
     """
@@ -173,37 +1009,44 @@ class Player:
         return self._ships.get(ship_id)
 
     @staticmethod
-    def _parse_single(tokens):
+    def _parse_single(tokens, cursor, players=None):
         """
         Parse one user given an input string from the Halite engine.
 
         :param list[str] tokens: The input string as a list of str from the Halite engine.
-        :return: The parsed player id, player object, and remaining tokens
-        :rtype: (int, Player, list[str])
+        :param int cursor: Index of the token holding the player id
+        :param dict[int, Player] players: Players of the previous frame to update in place, if any
+        :return: The parsed player id, player object, and the index of the next unread token
+        :rtype: (int, Player, int)
         """
-        player_id, *remainder = tokens
-        player_id = int(player_id)
-        ships, remainder = entity.Ship._parse(player_id, remainder)
-        player = Player(player_id, ships)
-        return player_id, player, remainder
+        player_id = int(tokens[cursor])
+        player = players.get(player_id) if players else None
+        if player is not None:
+            player._ships, cursor = entity.Ship._parse(player_id, tokens, cursor + 1, player._ships)
+        else:
+            ships, cursor = entity.Ship._parse(player_id, tokens, cursor + 1)
+            player = Player(player_id, ships)
+        return player_id, player, cursor
 
     @staticmethod
-    def _parse(tokens):
+    def _parse(tokens, cursor, previous=None):
         """
         Parse an entire user input string from the Halite engine for all users.
 
         :param list[str] tokens: The input string as a list of str from the Halite engine.
-        :return: The parsed players in the form of player dict, and remaining tokens
-        :rtype: (dict, list[str])
+        :param int cursor: Index of the token holding the number of players
+        :param dict[int, Player] previous: Players of the previous frame to update in place, if any
+        :return: The parsed players in the form of player dict, and the index of the next unread token
+        :rtype: (dict, int)
         """
-        num_players, *remainder = tokens
-        num_players = int(num_players)
+        num_players = int(tokens[cursor])
+        cursor += 1
         players = {}
 
         for _ in range(num_players):
-            player, players[player], remainder = Player._parse_single(remainder)
+            player, players[player], cursor = Player._parse_single(tokens, cursor, previous)
 
-        return players, remainder
+        return players, cursor
 
     def __str__(self):
         return "Player {} with ships {}".format(self.id, self.all_ships())
@@ -0,0 +1,418 @@
+import bisect
+import math
+
+from . import collision, constants, entity, spatial
+
+#: Unit vectors of the integer headings the engine accepts, indexed by angle in degrees
+_COS = tuple(math.cos(math.radians(angle)) for angle in range(360))
+_SIN = tuple(math.sin(math.radians(angle)) for angle in range(360))
+
+#: Blocked intervals are widened by this many degrees, so rounding never lets a blocked heading through
+_EDGE = 1e-6
+
+
+def _wrap(angle):
+    """
+    :param float angle: An angle in degrees
+    :return: The same angle in [-180, 180)
+    :rtype: float
+    """
+    return (angle + 180) % 360 - 180
+
+
+def _half_width(distance, radius, length):
+    """
+    Half-width of the cone of headings in which a segment from the origin runs into a circle, with the semantics of
+    collision.intersect_segment_circle: the segment hits when its closest point lies within radius of the centre,
+    unless the centre lies behind the start.
+
+    :param float distance: Distance from the start of the segment to the centre of the circle
+    :param float radius: Radius of the circle, fudge included
+    :param float length: Length of the segment
+    :return: The half-width in degrees around the bearing of the circle, or None if no heading hits it
+    :rtype: float
+    """
+    if distance <= radius:
+        return 90.0
+    tangent = math.sqrt(distance ** 2 - radius ** 2)
+    if tangent <= length:
+        return math.degrees(math.asin(radius / distance))
+    # The tangent point lies beyond the end of the segment, only the end can reach the circle
+    cosine = (length ** 2 + distance ** 2 - radius ** 2) / (2 * length * distance)
+    return math.degrees(math.acos(min(cosine, 1.0))) if cosine <= 1 + 1e-12 else None
+
+
+def _end(ship, angle, distance):
+    """
+    :param entity.Ship ship: The start of the move
+    :param int angle: An integer heading in [0, 360)
+    :param float distance: The length of the move
+    :return: Where the move ends
+    :rtype: entity.Position
+    """
+    return entity.Position(ship.x + distance * _COS[angle], ship.y + distance * _SIN[angle])
+
+
+def _merge(intervals):
+    """
+    :param list[(float, float)] intervals: Closed intervals
+    :return: The starts and ends of the union, as sorted disjoint intervals
+    :rtype: (list[float], list[float])
+    """
+    starts, ends = [], []
+    for start, end in sorted(intervals):
+        if ends and start <= ends[-1]:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+def _first_free(offset, starts, ends, step):
+    """
+    Walk from offset in whole degrees, in the direction of step, to the first offset outside every interval.
+
+    :param float offset: Offset from the desired heading of the first integer heading to try
+    :param list[float] starts: Sorted starts of disjoint intervals
+    :param list[float] ends: Matching ends
+    :param int step: 1 to walk counter-clockwise, -1 to walk clockwise
+    :return: The offset of the first free integer heading
+    :rtype: float
+    """
+    while True:
+        index = bisect.bisect_right(starts, offset) - 1
+        if index < 0 or ends[index] < offset:
+            return offset
+        if step > 0:
+            offset += math.floor(ends[index] - offset) + 1
+        else:
+            offset -= math.floor(offset - starts[index]) + 1
+
+
+def free_angle(ship, target, obstacles, max_corrections=90, lookahead=None, reject=None):
+    """
+    Find the integer heading closest to the direction of the target along which the straight segment from the ship,
+    as long as the distance to the target (or lookahead if shorter), clears every obstacle. Each obstacle is turned
+    into one blocked interval of headings, the intervals are merged and the free headings on either side of the
+    desired one are compared.
+
+    :param entity.Ship ship: The ship to move
+    :param entity.Entity target: The entity to which you will navigate
+    :param list[entity.Entity] obstacles: The entities to avoid, e.g. from game_map.Map.obstacles_near
+    :param float max_corrections: The maximum number of degrees to deviate from the direction of the target
+    :param float lookahead: How far along the segment obstacles are avoided, None for all the way to the target
+    :param reject: Optional function of a heading that rules out headings the obstacles leave free
+    :return: The heading in degrees, in [0, 360), or None if every heading within max_corrections is blocked
+    :rtype: int
+    """
+    distance = ship.calculate_distance_between(target)
+    if lookahead is not None:
+        distance = min(distance, lookahead)
+    desired = ship.calculate_angle_between(target)
+    fudge = ship.radius + 0.1
+    intervals = []
+    cones = []
+    for obstacle in obstacles:
+        if obstacle == ship or obstacle == target:
+            continue
+        radius = obstacle.radius + fudge
+        dx = obstacle.x - ship.x
+        dy = obstacle.y - ship.y
+        obstacle_distance = math.sqrt(dx ** 2 + dy ** 2)
+        if distance == 0:
+            if obstacle_distance <= radius:
+                return None
+            continue
+        half_width = _half_width(obstacle_distance, radius, distance)
+        if half_width is None:
+            continue
+        half_width += _EDGE
+        offset = _wrap(math.degrees(math.atan2(dy, dx)) - desired)
+        cones.append((offset, half_width, obstacle))
+        intervals.append((offset - half_width, offset + half_width))
+        # Intervals reaching past +-180 degrees also block the other end of the range
+        if offset - half_width < -180:
+            intervals.append((offset - half_width + 360, offset + half_width + 360))
+        elif offset + half_width > 180:
+            intervals.append((offset - half_width - 360, offset + half_width - 360))
+
+    starts, ends = _merge(intervals)
+    counter_clockwise = _first_free(math.ceil(desired) - desired, starts, ends, 1)
+    clockwise = _first_free(math.floor(desired) - desired, starts, ends, -1)
+    while True:
+        turn_left = counter_clockwise <= -clockwise
+        offset = counter_clockwise if turn_left else clockwise
+        if abs(offset) > max_corrections:
+            return None
+        angle = round(desired + offset) % 360
+        end = _end(ship, angle, distance)
+        # Confirm with the exact test against the obstacles whose cone ends within a degree of the heading
+        if not any(collision.intersect_segment_circle(ship, end, obstacle, fudge=fudge)
+                   for centre, half_width, obstacle in cones if abs(_wrap(offset - centre)) <= half_width + 1) \
+                and (reject is None or not reject(angle)):
+            return angle
+        # Rounding right at the edge of a cone, or the heading was rejected; carry on past it on that side
+        if turn_left:
+            counter_clockwise = _first_free(counter_clockwise + 1, starts, ends, 1)
+            if clockwise == 0:
+                clockwise = _first_free(clockwise - 1, starts, ends, -1)
+        else:
+            clockwise = _first_free(clockwise - 1, starts, ends, -1)
+
+
+def _ignored(ignore_ships, ignore_planets):
+    """
+    :return: The entity type to leave out of the obstacles, as understood by game_map.Map.obstacles_between
+    """
+    return () if not (ignore_ships or ignore_planets) \
+        else entity.Ship if (ignore_ships and not ignore_planets) \
+        else entity.Planet if (ignore_planets and not ignore_ships) \
+        else entity.Entity
+
+
+def _heading(ship, target, game_map, max_corrections, lookahead, ignore, skip=(), reject=None):
+    """
+    The integer heading to navigate along, see navigate.
+
+    :param set skip: Entities that are not obstacles
+    :param reject: Optional function of a heading that rules out headings the obstacles leave free
+    :return: The heading in degrees, in [0, 360), or None if every heading within max_corrections is blocked
+    :rtype: int
+    """
+    distance = ship.calculate_distance_between(target)
+    reach = distance if lookahead is None else min(distance, lookahead)
+    angle = ship.calculate_angle_between(target)
+    ceiling, floor = math.ceil(angle), math.floor(angle)
+    nearest = ceiling if ceiling - angle <= angle - floor else floor
+    if abs(nearest - angle) <= max_corrections and \
+            not [obstacle for obstacle in game_map.obstacles_between(ship, _end(ship, nearest % 360, reach), ignore)
+                 if obstacle != target and obstacle not in skip] and \
+            (reject is None or not reject(nearest % 360)):
+        return nearest % 360
+    obstacles = [obstacle for obstacle in game_map.obstacles_near(ship, reach, ignore) if obstacle not in skip]
+    return free_angle(ship, target, obstacles, max_corrections, lookahead, reject)
+
+
+def navigate(ship, target, game_map, speed, avoid_obstacles=True, max_corrections=90, ignore_ships=False,
+             ignore_planets=False, lookahead=None):
+    """
+    Drop-in alternative to entity.Ship.navigate. Instead of rotating the target by a fixed step and rescanning the
+    map after every rotation, it checks the integer heading closest to the target once and, if that is blocked,
+    collects the nearby obstacles once and picks the closest free integer heading on either side (see free_angle).
+    With a lookahead, e.g. a couple of turns of travel, only obstacles that close are considered; the path is checked
+    again every turn, and the fewer obstacles the cheaper the search.
+
+    :param entity.Ship ship: The ship to move
+    :param entity.Entity target: The entity to which you will navigate
+    :param game_map.Map game_map: The map of the game, from which obstacles will be extracted
+    :param int speed: The (max) speed to navigate. If the obstacle is nearer, will adjust accordingly.
+    :param bool avoid_obstacles: Whether to avoid the obstacles in the way (simple pathfinding).
+    :param float max_corrections: The maximum number of degrees to deviate per turn while trying to pathfind. If exceeded returns None.
+    :param bool ignore_ships: Whether to ignore ships in calculations (this will make your movement faster, but more precarious)
+    :param bool ignore_planets: Whether to ignore planets in calculations (useful if you want to crash onto planets)
+    :param float lookahead: How far along the path obstacles are avoided, None for all the way to the target
+    :return string: The command trying to be passed to the Halite engine or None if movement is not possible within max_corrections degrees.
+    :rtype: str
+    """
+    distance = ship.calculate_distance_between(target)
+    angle = ship.calculate_angle_between(target)
+    if avoid_obstacles:
+        angle = _heading(ship, target, game_map, max_corrections, lookahead, _ignored(ignore_ships, ignore_planets))
+        if angle is None:
+            return None
+    speed = speed if (distance >= speed) else distance
+    return ship.thrust(speed, angle)
+
+
+class _Move:
+    """
+    A thrust reserved by a MovePlanner: the ship sweeps from its position along velocity during the turn. x, y is the
+    middle of the swept segment, under which the move is filed in the planner's grid.
+    """
+    __slots__ = ("ship", "speed", "angle", "vel_x", "vel_y", "x", "y", "request")
+
+    def __init__(self, ship, speed, angle, request):
+        self.ship = ship
+        self.speed = speed
+        self.angle = angle
+        self.vel_x = speed * _COS[angle]
+        self.vel_y = speed * _SIN[angle]
+        self.x = ship.x + self.vel_x / 2
+        self.y = ship.y + self.vel_y / 2
+        self.request = request
+
+
+class MovePlanner:
+    """
+    Plans the thrusts of a fleet for one turn so that its ships do not run into each other. Every move handed out is
+    reserved as the segment its ship sweeps during the turn. Ships planned later avoid static obstacles as navigate
+    does, but instead of the starting positions of the ships planned before them, they check the closest approach
+    between both moves over the turn. Ships without a move are treated as standing still.
+
+    If no heading is free, the ship tries lower speeds, then the move that blocks its direct heading is planned again
+    after it, once per ship and turn. Moves handed out earlier may thus change: send commands() at the end of the turn.
+    """
+
+    def __init__(self, game_map, max_corrections=90, lookahead=None):
+        """
+        :param game_map.Map game_map: The map of the turn
+        :param float max_corrections: The maximum number of degrees to deviate from the direction of the target
+        :param float lookahead: How far along the path obstacles are avoided, None for all the way to the target
+        """
+        self._map = game_map
+        self.max_corrections = max_corrections
+        self.lookahead = lookahead
+        self._moves = {}
+        self._planned = set()
+        self._repaired = set()
+        self._grid = spatial.UniformGrid(constants.MAX_SPEED)
+
+    def _reserve(self, move):
+        self._moves[move.ship.id] = move
+        self._planned.add(move.ship)
+        self._grid.insert(move)
+
+    def _release(self, move):
+        del self._moves[move.ship.id]
+        self._planned.discard(move.ship)
+        self._grid.remove(move)
+
+    def _nearby(self, ship, speed):
+        """
+        :return: The reserved moves the ship could run into moving at speed, whatever its heading
+        :rtype: list[_Move]
+        """
+        reach = speed + constants.MAX_SPEED / 2 + 2 * constants.SHIP_RADIUS + 0.1
+        return [move for move in self._grid.query_radius(ship, reach) if move.ship is not ship]
+
+    def _conflict(self, ship, speed, angle, moves):
+        """
+        :param list[_Move] moves: The reserved moves to check, see _nearby
+        :return: The first of the moves that comes within reach of the ship moving at speed along angle, or None
+        :rtype: _Move
+        """
+        vel_x = speed * _COS[angle]
+        vel_y = speed * _SIN[angle]
+        for move in moves:
+            other = move.ship
+            # Closest approach of both ships over the turn, in the frame of this one
+            rel_x, rel_y = other.x - ship.x, other.y - ship.y
+            rel_vx, rel_vy = move.vel_x - vel_x, move.vel_y - vel_y
+            squared = rel_vx ** 2 + rel_vy ** 2
+            t = 0.0 if squared == 0 else min(max(-(rel_x * rel_vx + rel_y * rel_vy) / squared, 0.0), 1.0)
+            if (rel_x + t * rel_vx) ** 2 + (rel_y + t * rel_vy) ** 2 <= (ship.radius + other.radius + 0.1) ** 2:
+                return move
+        return None
+
+    def _plan(self, ship, request):
+        """
+        :return: A free move for the ship, trying lower speeds if needed, or None
+        :rtype: _Move
+        """
+        target, speed, avoid_obstacles, ignore = request
+        distance = ship.calculate_distance_between(target)
+        speed = int(speed if (distance >= speed) else distance)
+        if not avoid_obstacles:
+            return _Move(ship, speed, round(ship.calculate_angle_between(target)) % 360, request)
+        while True:
+            moves = self._nearby(ship, speed)
+            angle = _heading(ship, target, self._map, self.max_corrections, self.lookahead, ignore, self._planned,
+                             lambda heading: self._conflict(ship, speed, heading, moves) is not None)
+            if angle is not None:
+                return _Move(ship, speed, angle, request)
+            if speed <= 1:
+                return None
+            speed //= 2
+
+    def _repair(self, ship, request):
+        """
+        Plan the move blocking the ship's direct heading again after the ship's own. Everything is left as it was
+        if either of them cannot move then.
+
+        :return: The ship's move, or None
+        :rtype: _Move
+        """
+        target, speed, _, _ = request
+        distance = ship.calculate_distance_between(target)
+        speed = int(speed if (distance >= speed) else distance)
+        blocker = self._conflict(ship, speed, round(ship.calculate_angle_between(target)) % 360,
+                                 self._nearby(ship, speed))
+        if blocker is None or blocker.ship.id in self._repaired:
+            return None
+        self._repaired.add(blocker.ship.id)
+        self._release(blocker)
+        move = self._plan(ship, request)
+        if move is not None:
+            self._reserve(move)
+            replanned = self._plan(blocker.ship, blocker.request)
+            if replanned is not None:
+                self._reserve(replanned)
+                return move
+            self._release(move)
+        self._reserve(blocker)
+        return None
+
+    def navigate(self, ship, target, speed, avoid_obstacles=True, ignore_ships=False, ignore_planets=False):
+        """
+        Plan a move of the ship toward the target, like navigate does for a single ship.
+
+        :param entity.Ship ship: The ship to move
+        :param entity.Entity target: The entity to which you will navigate
+        :param int speed: The (max) speed to navigate. If the obstacle is nearer, will adjust accordingly.
+        :param bool avoid_obstacles: Whether to avoid the obstacles in the way (simple pathfinding).
+        :param bool ignore_ships: Whether to ignore the ships the planner did not move in calculations
+        :param bool ignore_planets: Whether to ignore planets in calculations (useful if you want to crash onto planets)
+        :return string: The command for the ship as planned so far, or None if it cannot move
+        :rtype: str
+        """
+        previous = self._moves.get(ship.id)
+        if previous is not None:
+            self._release(previous)
+        request = (target, speed, avoid_obstacles, _ignored(ignore_ships, ignore_planets))
+        move = self._plan(ship, request)
+        if move is None:
+            move = self._repair(ship, request)
+            if move is None:
+                return None
+        else:
+            self._reserve(move)
+        return ship.thrust(move.speed, move.angle)
+
+    def blocked(self, start, end, max_speed=1):
+        """
+        Whether a ship planned so far stays in the way of a ship heading from start to end: it moves no faster than
+        max_speed and stops within reach of the part of the segment that lies within the lookahead. Faster ships are
+        gone by the time the ship gets there, and navigation steers around them this turn. Ships stopping at the end of
+        the segment, e.g. queueing to dock, are where the ship is headed anyway and do not count, and neither does the
+        move of the ship the segment starts from.
+
+        :param entity.Entity start: Where the segment starts, e.g. a ship
+        :param entity.Entity end: Where it ends
+        :param int max_speed: The speed up to which a ship counts as staying
+        :return: True if a reserved move stays in the way
+        :rtype: bool
+        """
+        goal = end
+        distance = start.calculate_distance_between(end)
+        if self.lookahead is not None and distance > self.lookahead:
+            fraction = self.lookahead / distance
+            end = entity.Position(start.x + (end.x - start.x) * fraction, start.y + (end.y - start.y) * fraction)
+        reach = 2 * constants.SHIP_RADIUS + 0.1
+        # Moves are filed under the middle of their segment, at most half a turn of travel from where they stop
+        for move in self._grid.query_segment(start, end, reach + constants.MAX_SPEED / 2):
+            if move.ship is start or move.speed > max_speed:
+                continue
+            stop = entity.Position(move.ship.x + move.vel_x, move.ship.y + move.vel_y)
+            if stop.calculate_distance_between(goal) <= reach + constants.MAX_SPEED:
+                continue
+            if collision.segment_distance(start, end, stop) <= reach:
+                return True
+        return False
+
+    def commands(self):
+        """
+        :return: The command of every ship with a planned move, keyed by ship id
+        :rtype: dict[int, str]
+        """
+        return {ship_id: move.ship.thrust(move.speed, move.angle) for ship_id, move in self._moves.items()}
@@ -1,86 +1,272 @@
 import sys
+import json
+import queue
+import atexit
 import logging
-import copy
+import logging.handlers
 
 from . import game_map
 
 
-class Game:
+class StreamTransport:
     """
-    :ivar map: Current map representation
-    :ivar initial_map: The initial version of the map before game starts
+    Line-based transport over a pair of binary streams. Input is read in large chunks and split on newlines as
+    bytes, so only complete lines are ever decoded; every outgoing line is encoded and written in one call and
+    flushed once.
     """
-    @staticmethod
-    def _send_string(s):
+    def __init__(self, reader, writer, chunk_size=1 << 16):
         """
-        Send data to the game. Call :function:`done_sending` once finished.
+        :param reader: Binary stream the engine writes to (needs read1 or read)
+        :param writer: Binary stream the engine reads from (needs write and flush)
+        :param int chunk_size: Max number of bytes requested per read
+        """
+        self._reader = reader
+        self._writer = writer
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._scanned = 0
 
-        :param str s: String to send
+    def _read_chunk(self):
+        """
+        :return: The next bytes available on the input, empty at end of stream
+        :rtype: bytes
+        """
+        read = getattr(self._reader, "read1", self._reader.read)
+        return read(self._chunk_size)
+
+    def _write(self, data):
+        """
+        :param bytes data: Bytes to send in a single write
         :return: nothing
         """
-        sys.stdout.write(s)
+        self._writer.write(data)
+        self._writer.flush()
 
-    @staticmethod
-    def _done_sending():
+    def read_line(self):
+        """
+        Read one line, without its trailing newline. At the end of the stream the remaining bytes are returned,
+        which is an empty string once everything has been read.
+
+        :return: The line read
+        :rtype: str
         """
-        Finish sending commands to the game.
+        while True:
+            end = self._buffer.find(b'\n', self._scanned)
+            if end >= 0:
+                line = self._buffer[:end].decode()
+                del self._buffer[:end + 1]
+                self._scanned = 0
+                return line
+            # Bytes scanned so far hold no newline, don't search them again after the next chunk comes in
+            self._scanned = len(self._buffer)
+            chunk = self._read_chunk()
+            if not chunk:
+                line = self._buffer.decode()
+                self._buffer.clear()
+                self._scanned = 0
+                return line
+            self._buffer += chunk
 
+    def write_line(self, line):
+        """
+        Send one line, appending the newline.
+
+        :param str line: The line to send
         :return: nothing
         """
-        sys.stdout.write('\n')
-        sys.stdout.flush()
+        self._write((line + '\n').encode())
 
-    @staticmethod
-    def _get_string():
+
+class StdioTransport(StreamTransport):
+    """
+    Transport over the binary layers of stdin and stdout, which is how the Halite engine talks to bots.
+    """
+    def __init__(self, chunk_size=1 << 16):
+        """
+        :param int chunk_size: Max number of bytes requested per read
+        """
+        super().__init__(sys.stdin.buffer, sys.stdout.buffer, chunk_size)
+
+
+class SocketTransport(StreamTransport):
+    """
+    Transport over a connected socket, e.g. to a local engine stand-in.
+    """
+    def __init__(self, sock, chunk_size=1 << 16):
+        """
+        :param socket.socket sock: A connected stream socket
+        :param int chunk_size: Max number of bytes requested per read
+        """
+        super().__init__(None, None, chunk_size)
+        self._socket = sock
+
+    def _read_chunk(self):
+        return self._socket.recv(self._chunk_size)
+
+    def _write(self, data):
+        self._socket.sendall(data)
+
+
+class _StaticCompatible:
+    """
+    Game method that was a static method before games got their own transport. Called on a game it goes through the
+    game's transport; called on the class, as in Game.send_command_queue(commands), it talks over stdin/stdout as it
+    always did.
+    """
+    def __init__(self, method):
+        """
+        :param method: The method, taking the game as its first argument
+        """
+        self._method = method
+        self.__doc__ = method.__doc__
+
+    def __get__(self, game, owner):
+        if game is None:
+            game = owner.__new__(owner)
+            game._transport = StdioTransport()
+        return self._method.__get__(game, owner)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Formats every log record as one JSON object per line.
+    """
+    def format(self, record):
+        entry = {"time": record.created, "level": record.levelname, "message": record.getMessage()}
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that hands records to the writer thread unformatted, so the message is only built off the hot
+    path. Arguments passed along with a message must therefore not be mutated after the logging call.
+    """
+    def prepare(self, record):
+        return record
+
+
+class Game:
+    """
+    :ivar map: Current map representation
+    :ivar game_map.MapSnapshot initial_map: Immutable snapshot of the map before game starts. It answers the read-only
+        queries of the Map API (get_me, all_players, all_planets, obstacles_between, ...) with frozen players, ships
+        and planets instead of entities
+    """
+    #: The handler the last logging set up added to the root logger, and its writer thread in async mode
+    _log_handler = None
+    _log_listener = None
+
+    def _send_string(self, s):
+        """
+        Send one line of data to the game.
+
+        :param str s: String to send
+        :return: nothing
+        """
+        self._transport.write_line(s)
+
+    def _get_string(self):
         """
         Read input from the game.
 
         :return: The input read from the Halite engine
         :rtype: str
         """
-        result = sys.stdin.readline().rstrip('\n')
-        return result
+        return self._transport.read_line()
 
-    @staticmethod
-    def send_command_queue(command_queue):
+    @_StaticCompatible
+    def send_command_queue(self, command_queue):
         """
-        Issue the given list of commands.
+        Issue the given list of commands. The whole queue goes out as a single write. Called on the class instead of
+        a game, e.g. Game.send_command_queue(command_queue), the commands go to stdout.
 
         :param list[str] command_queue: List of commands to send the Halite engine
         :return: nothing
         """
-        for command in command_queue:
-            Game._send_string(command)
+        self._send_string(''.join(command_queue))
+
+    @staticmethod
+    def _tear_down_logging():
+        """
+        Undo the last logging set up: remove its handler, stop its writer thread once the queued records are written
+        and close the log, and enable logging again if it was turned off.
 
-        Game._done_sending()
+        :return: nothing
+        """
+        handler, listener = Game._log_handler, Game._log_listener
+        Game._log_handler = Game._log_listener = None
+        if handler is not None:
+            logging.getLogger().removeHandler(handler)
+            handler.close()
+        if listener is not None:
+            listener.stop()
+            atexit.unregister(listener.stop)
+            for file_handler in listener.handlers:
+                file_handler.close()
+        logging.disable(logging.NOTSET)
 
     @staticmethod
-    def _set_up_logging(tag, name):
+    def _set_up_logging(tag, name, mode="file", log_format="text"):
         """
-        Set up and truncate the log
+        Set up and truncate the log. Setting it up again replaces what the previous set up did, as
+        logging.basicConfig never adds a second handler either.
 
         :param tag: The user tag (used for naming the log)
         :param name: The bot name (used for naming the log)
+        :param str mode: "file" writes records synchronously, "async" queues them to a background writer thread,
+            "off" disables logging altogether
+        :param str log_format: "text" for the classic logging format, "json" for one JSON object per line
         :return: nothing
         """
+        if mode not in ("file", "async", "off"):
+            raise ValueError("Unknown log mode {!r}".format(mode))
+        if log_format not in ("text", "json"):
+            raise ValueError("Unknown log format {!r}".format(log_format))
+        Game._tear_down_logging()
+        if mode == "off":
+            # Every logging call now returns after a single level comparison
+            logging.disable(logging.CRITICAL)
+            return
+
         log_file = "{}_{}.log".format(tag, name)
-        logging.basicConfig(filename=log_file, level=logging.DEBUG, filemode='w')
-        logging.info("Initialized bot {}".format(name))
+        handler = logging.FileHandler(log_file, mode='w')
+        handler.setFormatter(JsonLinesFormatter() if log_format == "json" else logging.Formatter(logging.BASIC_FORMAT))
+        if mode == "async":
+            listener = logging.handlers.QueueListener(queue.SimpleQueue(), handler)
+            listener.start()
+            atexit.register(listener.stop)
+            handler = DeferredQueueHandler(listener.queue)
+            Game._log_listener = listener
+
+        Game._log_handler = handler
+        root = logging.getLogger()
+        root.addHandler(handler)
+        root.setLevel(logging.DEBUG)
+        logging.info("Initialized bot %s", name)
 
-    def __init__(self, name):
+    def __init__(self, name, incremental=False, columnar=False, transport=None, log_mode="file", log_format="text"):
         """
         Initialize the bot with the given name.
 
         :param name: The name of the bot.
+        :param bool incremental: Update the map's entities in place every turn instead of rebuilding them.
+        :param bool columnar: Decode every frame into numpy column arrays and build the map from them (requires numpy).
+        :param StreamTransport transport: How to talk to the engine, stdin/stdout if not given.
+        :param str log_mode: "file" (synchronous), "async" (background writer thread) or "off".
+        :param str log_format: "text" or "json" (JSON lines).
         """
+        self._transport = transport if transport is not None else StdioTransport()
         self._name = name
         self._send_name = False
         tag = int(self._get_string())
-        Game._set_up_logging(tag, name)
+        Game._set_up_logging(tag, name, log_mode, log_format)
         width, height = [int(x) for x in self._get_string().strip().split()]
-        self.map = game_map.Map(tag, width, height)
+        self.map = game_map.Map(tag, width, height, incremental, columnar)
         self.update_map()
-        self.initial_map = copy.deepcopy(self.map)
+        self.initial_map = self.map.snapshot()
+        self.map.index_planets(self.initial_map.all_planets())
         self._send_name = True
 
     def update_map(self):
@@ -92,7 +278,6 @@ class Game:
         """
         if self._send_name:
             self._send_string(self._name)
-            self._done_sending()
             self._send_name = False
         logging.info("---NEW TURN---")
         self.map._parse(self._get_string())
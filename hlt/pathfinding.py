@@ -0,0 +1,305 @@
+import heapq
+import math
+
+from . import collision, constants, entity, spatial
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, without it visibility is tested one segment at a time
+    np = None
+
+
+class VisibilityGraph:
+    """
+    Visibility graph around the planets, for paths across the map. Every planet is grown by the distance ships keep
+    from it and wrapped in a regular polygon whose edges touch the grown circle. The polygon corners are the nodes,
+    and two nodes are linked when the straight segment between them clears every grown planet. Planets never move,
+    so the graph is built once from the initial map; planets destroyed later simply stay in it as obstacles.
+
+    :ivar clearance: Distance kept from the planets on top of the fudge factor of navigation
+    """
+
+    def __init__(self, planets, width, height, clearance=1.0, sides=8):
+        """
+        :param planets: The planets (need id, x, y, radius attributes), e.g. from a MapSnapshot
+        :param float width: Map width
+        :param float height: Map height
+        :param float clearance: Distance kept from the planets on top of the fudge factor of navigation
+        :param int sides: Number of corners of the polygon around each planet
+        """
+        self._planets = list(planets)
+        self.clearance = clearance
+        self._margin = constants.SHIP_RADIUS + 0.1 + clearance
+        self._index = spatial.PlanetIndex(self._planets)
+        self._by_id = {planet.id: planet for planet in self._planets}
+        self._circles = [(planet.x, planet.y, planet.radius) for planet in self._planets]
+
+        # Corners of a polygon whose edges touch the circle lie 1 / cos(pi / sides) further out; a hair more keeps
+        # the edges clear of the exact test
+        stretch = 1 / math.cos(math.pi / sides)
+        self._nodes = []
+        self._planet_nodes = {}
+        for planet in self._planets:
+            corner_radius = (planet.radius + self._margin) * stretch + 1e-3
+            indices = self._planet_nodes[planet.id] = []
+            for side in range(sides):
+                theta = 2 * math.pi * side / sides
+                corner = entity.Position(planet.x + corner_radius * math.cos(theta),
+                                         planet.y + corner_radius * math.sin(theta))
+                if 0 <= corner.x <= width and 0 <= corner.y <= height and not self._covered(corner):
+                    indices.append(len(self._nodes))
+                    self._nodes.append(corner)
+
+        self._edges = [[] for _ in self._nodes]
+        for index, node in enumerate(self._nodes):
+            others = self._nodes[index + 1:]
+            for offset, visible in enumerate(self._visible_many(node, others)):
+                if visible:
+                    other = index + 1 + offset
+                    length = node.calculate_distance_between(self._nodes[other])
+                    self._edges[index].append((other, length))
+                    self._edges[other].append((index, length))
+        self._planet_table = {}
+        for planet in self._planets:
+            self._planet_row(planet.id)
+
+    def _covered(self, point):
+        """
+        :return: True if the point lies within a grown planet
+        :rtype: bool
+        """
+        planets = [self._by_id[planet_id] for planet_id in self._index.query_point(point, self._margin)]
+        return any(point.calculate_distance_between(planet) <= planet.radius + self._margin for planet in planets)
+
+    def visible(self, start, end):
+        """
+        :param entity.Entity start: The start of the segment
+        :param entity.Entity end: The end of the segment
+        :return: True if the segment clears every grown planet, with the semantics of obstacles_between
+        :rtype: bool
+        """
+        return not any(collision.intersect_segment_circle(start, end, self._by_id[planet_id], fudge=self._margin)
+                       for planet_id in self._index.query_segment(start, end, self._margin))
+
+    def reachable(self, start, goal):
+        """
+        Like visible, but a planet only blocks the segment if it does so seen from either end, so a start or goal
+        within the distance kept from a planet can still be left or approached from outside.
+
+        :param entity.Entity start: Where the segment starts
+        :param entity.Entity goal: Where it ends
+        :return: True if the goal can be headed for straight from start
+        :rtype: bool
+        """
+        return not any(collision.intersect_segment_circle(start, goal, planet, fudge=self._margin) and
+                       collision.intersect_segment_circle(goal, start, planet, fudge=self._margin)
+                       for planet in (self._by_id[planet_id]
+                                      for planet_id in self._index.query_segment(start, goal, self._margin)))
+
+    def _visible_many(self, start, ends):
+        """
+        :param entity.Entity start: The common start of the segments
+        :param list[entity.Entity] ends: The other ends
+        :return: Whether each segment clears every grown planet
+        :rtype: list[bool]
+        """
+        if not ends:
+            return []
+        if np is None:
+            return [self.visible(start, end) for end in ends]
+        starts = [(start.x, start.y)] * len(ends)
+        ends = [(end.x, end.y) for end in ends]
+        hits = collision.intersect_segments_circles(starts, ends, self._circles, fudge=self._margin)
+        return (~hits.any(axis=1)).tolist()
+
+    def path(self, start, goal, blocked=None):
+        """
+        Find the shortest way from start to goal around the planets with A*.
+
+        :param entity.Entity start: Where the way starts, e.g. a ship
+        :param entity.Entity goal: Where the way ends
+        :param blocked: Optional function of a segment (start, end) telling whether something else, e.g. the ships
+            moved this turn, is in the way of heading straight for goal; the way then goes around the planets
+        :return: The waypoints after start, the last one being goal itself, or None if there is no way
+        :rtype: list[entity.Entity]
+        """
+        if self.reachable(start, goal) and (blocked is None or not blocked(start, goal)):
+            return [goal]
+        count = len(self._nodes)
+        first = [(index, start.calculate_distance_between(node))
+                 for index, (node, visible) in enumerate(zip(self._nodes, self._visible_many(start, self._nodes)))
+                 if visible]
+        # Tested from the goal outward, so a goal close to a planet, within the distance kept from it, can be reached
+        last = self._visible_many(goal, self._nodes)
+        source, sink = count, count + 1
+
+        costs = {source: 0.0}
+        previous = {}
+        heap = [(start.calculate_distance_between(goal), 0.0, source)]
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node == sink:
+                waypoints = [goal]
+                node = previous[sink]
+                while node != source:
+                    waypoints.append(self._nodes[node])
+                    node = previous[node]
+                waypoints.reverse()
+                return waypoints
+            if cost > costs[node]:
+                continue
+            edges = first if node == source else self._edges[node]
+            if node != source and last[node]:
+                edges = edges + [(sink, self._nodes[node].calculate_distance_between(goal))]
+            for neighbour, length in edges:
+                new_cost = cost + length
+                if new_cost < costs.get(neighbour, math.inf):
+                    costs[neighbour] = new_cost
+                    previous[neighbour] = node
+                    point = goal if neighbour == sink else self._nodes[neighbour]
+                    heapq.heappush(heap, (new_cost + point.calculate_distance_between(goal), new_cost, neighbour))
+        return None
+
+    def _planet_row(self, planet_id):
+        """
+        Dijkstra from every corner around a planet at once. Run for every planet when the graph is built.
+
+        :return: Travel distance from the corners around the planet to the nearest corner around every planet
+        :rtype: dict[int, float]
+        """
+        if planet_id not in self._planet_table:
+            costs = [math.inf] * len(self._nodes)
+            heap = []
+            for index in self._planet_nodes.get(planet_id, ()):
+                costs[index] = 0.0
+                heap.append((0.0, index))
+            while heap:
+                cost, node = heapq.heappop(heap)
+                if cost > costs[node]:
+                    continue
+                for neighbour, length in self._edges[node]:
+                    if cost + length < costs[neighbour]:
+                        costs[neighbour] = cost + length
+                        heapq.heappush(heap, (cost + length, neighbour))
+            self._planet_table[planet_id] = {other: min((costs[index] for index in indices), default=math.inf)
+                                             for other, indices in self._planet_nodes.items()}
+        return self._planet_table[planet_id]
+
+    def travel_distance(self, source, target):
+        """
+        :param source: Planet (or planet id) to start from
+        :param target: Planet (or planet id) to go to
+        :return: Length of the shortest way around the other planets between the polygons of both planets, inf if
+            there is none
+        :rtype: float
+        """
+        source_id = getattr(source, "id", source)
+        target_id = getattr(target, "id", target)
+        return self._planet_row(source_id).get(target_id, math.inf)
+
+    def planet_distances(self):
+        """
+        :return: travel_distance between every pair of planets
+        :rtype: dict[int, dict[int, float]]
+        """
+        return {planet.id: dict(self._planet_row(planet.id)) for planet in self._planets}
+
+
+class Route:
+    """
+    The waypoints a ship follows toward a destination over several turns, from VisibilityGraph.path. A route stays
+    good while the destination stays within a tolerance of where it was planned and the leg the ship is on is clear;
+    only then does it have to be planned again.
+
+    A leg once proven clear of the planets is not tested again while the ship stays within the graph's clearance of
+    it and its end stays within that distance of where it was: every point of the way from the ship then lies that
+    close to a point of the proven leg, so it still clears the planets by the fudge factor of navigation.
+
+    :ivar waypoints: The waypoints still ahead, the last one being the destination as it was planned
+    :ivar destination: The destination the route was planned for
+    :ivar turn: The turn the route was planned
+    """
+    __slots__ = ("waypoints", "destination", "turn", "_proven")
+
+    def __init__(self, waypoints, destination, turn):
+        """
+        :param list[entity.Entity] waypoints: The waypoints from VisibilityGraph.path
+        :param entity.Entity destination: The destination they lead to
+        :param int turn: The current turn
+        """
+        self.waypoints = list(waypoints)
+        self.destination = entity.Position(destination.x, destination.y)
+        self.turn = turn
+        self._proven = None
+
+    def _leg_end(self, destination):
+        return self.waypoints[0] if len(self.waypoints) > 1 else destination
+
+    def _after(self, destination):
+        return self.waypoints[1] if len(self.waypoints) > 2 else destination
+
+    def _clear(self, start, end, graph, blocked):
+        """
+        :return: Whether a ship at start can head straight for end, see VisibilityGraph.reachable and the blocked
+            function of is_valid
+        :rtype: bool
+        """
+        if blocked is not None and blocked(start, end):
+            return False
+        proven = self._proven
+        if proven is not None and end.calculate_distance_between(proven[1]) <= graph.clearance and \
+                collision.segment_distance(proven[0], proven[1], start) <= graph.clearance:
+            return True
+        if graph.visible(start, end):
+            self._proven = (entity.Position(start.x, start.y), entity.Position(end.x, end.y))
+            return True
+        # Legs that only end close to a planet are tested again every time
+        return graph.reachable(start, end)
+
+    def is_valid(self, ship, destination, graph, tolerance, blocked=None):
+        """
+        :param entity.Ship ship: The ship following the route
+        :param entity.Entity destination: Where the ship is headed this turn
+        :param VisibilityGraph graph: The graph the route was planned on
+        :param float tolerance: How far the destination may have moved since the route was planned
+        :param blocked: Optional function of a segment (start, end) telling whether something else, e.g. the ships
+            moved this turn, is in the way of the leg
+        :return: Whether the route can still be followed
+        :rtype: bool
+        """
+        if destination.calculate_distance_between(self.destination) > tolerance:
+            return False
+        if len(self.waypoints) > 1 and ship.calculate_distance_between(self.waypoints[0]) <= ship.radius:
+            # At the corner already, the route goes on from there
+            return self._clear(self.waypoints[0], self._after(destination), graph, blocked)
+        return self._clear(ship, self._leg_end(destination), graph, blocked)
+
+    def next_waypoint(self, ship, destination, graph, reach=None, blocked=None):
+        """
+        Skip the waypoints the ship reached, or no longer needs as the one after is in sight already. Steering straight
+        for a corner would cut the ship's speed to the distance left to it; once the corner is within reach, the point
+        returned lies past it on the next leg instead, as far as the rest of the turn's travel takes the ship.
+
+        :param entity.Ship ship: The ship following the route
+        :param entity.Entity destination: Where the ship is headed this turn, which replaces the planned one
+        :param VisibilityGraph graph: The graph the route was planned on
+        :param float reach: How far the ship travels this turn (optional)
+        :param blocked: Optional function of a segment (start, end) telling whether something else is in the way, see
+            is_valid; waypoints are only skipped, and corners only cut, where it is not
+        :return: The point to steer for this turn
+        :rtype: entity.Entity
+        """
+        while len(self.waypoints) > 1 and (ship.calculate_distance_between(self.waypoints[0]) <= ship.radius or
+                                           self._clear(ship, self._after(destination), graph, blocked)):
+            self.waypoints.pop(0)
+        corner = self._leg_end(destination)
+        if reach is None or len(self.waypoints) == 1:
+            return corner
+        left = reach - ship.calculate_distance_between(corner)
+        after = self._after(destination)
+        length = corner.calculate_distance_between(after)
+        if left <= 0 or length == 0:
+            return corner
+        fraction = min(left / length, 1.0)
+        past = entity.Position(corner.x + (after.x - corner.x) * fraction, corner.y + (after.y - corner.y) * fraction)
+        return past if graph.visible(ship, past) and (blocked is None or not blocked(ship, past)) else corner
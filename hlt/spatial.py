@@ -0,0 +1,513 @@
+import heapq
+import math
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only the planet distance field needs it
+    np = None
+
+#: Grids holding at most this many entities answer distance-ordered queries with a plain scan
+_SCAN_BELOW = 32
+
+
+class UniformGrid:
+    """
+    Uniform grid spatial hash over entity centres. Candidates of every query are returned in insertion order, so
+    filtering them gives exactly the result of a linear scan over the inserted entities.
+
+    :ivar cell_size: Side length of a grid cell
+    """
+
+    def __init__(self, cell_size):
+        """
+        :param float cell_size: Side length of a grid cell
+        """
+        self.cell_size = cell_size
+        self._cells = {}
+        self._entities = []
+        self._removed = 0
+        self._bounds = None
+
+    def __len__(self):
+        return len(self._entities) - self._removed
+
+    def _cell_of(self, x, y):
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def insert(self, item):
+        """
+        Add an entity to the grid, using its position at insertion time.
+
+        :param entity.Entity item: The entity to add (needs x, y attributes)
+        :return: nothing
+        """
+        cx, cy = self._cell_of(item.x, item.y)
+        self._cells.setdefault((cx, cy), []).append(len(self._entities))
+        self._entities.append(item)
+        if self._bounds is None:
+            self._bounds = [cx, cy, cx, cy]
+        else:
+            bounds = self._bounds
+            bounds[0], bounds[1] = min(bounds[0], cx), min(bounds[1], cy)
+            bounds[2], bounds[3] = max(bounds[2], cx), max(bounds[3], cy)
+
+    def remove(self, item):
+        """
+        Take an entity out of the grid. It is looked up by its position, which must not have changed since insertion.
+
+        :param entity.Entity item: The entity to remove
+        :return: nothing
+        """
+        cell = self._cells.get(self._cell_of(item.x, item.y), [])
+        for position, index in enumerate(cell):
+            if self._entities[index] is item:
+                del cell[position]
+                self._removed += 1
+                return
+        raise ValueError("Entity not in the grid")
+
+    def _collect(self, found):
+        return [self._entities[index] for index in sorted(found)]
+
+    def query_segment(self, start, end, margin):
+        """
+        Find the entities whose centre may lie within margin of a segment. Only the cells the segment's corridor
+        crosses are visited: for every column of cells, the corridor's y-range within that column is computed.
+
+        :param entity.Entity start: The start of the segment (needs x, y attributes)
+        :param entity.Entity end: The end of the segment (needs x, y attributes)
+        :param float margin: Half-width of the corridor around the segment
+        :return: Candidate entities, in insertion order
+        :rtype: list[entity.Entity]
+        """
+        cell_size = self.cell_size
+        # Widened a hair so that rounding in the interpolation below never drops a candidate on the boundary
+        margin += 1e-9
+        x0, y0, x1, y1 = start.x, start.y, end.x, end.y
+        if x0 > x1:
+            x0, y0, x1, y1 = x1, y1, x0, y0
+        dx = x1 - x0
+        dy = y1 - y0
+
+        found = set()
+        for cx in range(math.floor((x0 - margin) / cell_size), math.floor((x1 + margin) / cell_size) + 1):
+            low = max(x0, cx * cell_size - margin)
+            high = min(x1, (cx + 1) * cell_size + margin)
+            if low > high:
+                continue
+            if dx == 0:
+                y_low, y_high = y0, y1
+            else:
+                y_low = y0 + dy * (low - x0) / dx
+                y_high = y0 + dy * (high - x0) / dx
+            if y_low > y_high:
+                y_low, y_high = y_high, y_low
+            for cy in range(math.floor((y_low - margin) / cell_size), math.floor((y_high + margin) / cell_size) + 1):
+                cell = self._cells.get((cx, cy))
+                if cell:
+                    found.update(cell)
+        return self._collect(found)
+
+    def query_radius(self, center, radius):
+        """
+        Find the entities whose centre may lie within radius of a point.
+
+        :param entity.Entity center: The point to search around (needs x, y attributes)
+        :param float radius: The search radius
+        :return: Candidate entities, in insertion order
+        :rtype: list[entity.Entity]
+        """
+        radius += 1e-9
+        min_x, min_y = self._cell_of(center.x - radius, center.y - radius)
+        max_x, max_y = self._cell_of(center.x + radius, center.y + radius)
+        found = set()
+        for cx in range(min_x, max_x + 1):
+            for cy in range(min_y, max_y + 1):
+                cell = self._cells.get((cx, cy))
+                if cell:
+                    found.update(cell)
+        return self._collect(found)
+
+    def _ring(self, cx, cy, ring):
+        """
+        :return: The cells at Chebyshev distance ring from cell (cx, cy)
+        :rtype: list[(int, int)]
+        """
+        if ring == 0:
+            return [(cx, cy)]
+        cells = []
+        for x in range(cx - ring, cx + ring + 1):
+            cells.append((x, cy - ring))
+            cells.append((x, cy + ring))
+        for y in range(cy - ring + 1, cy + ring):
+            cells.append((cx - ring, y))
+            cells.append((cx + ring, y))
+        return cells
+
+    def by_distance(self, point, max_distance=math.inf):
+        """
+        Lazily walk the entities in order of increasing distance between their centre and a point. Rings of cells
+        around the point are only opened once everything closer has been handed out, so stopping after the first
+        few results leaves the rest of the grid untouched.
+
+        :param entity.Entity point: The point to measure from (needs x, y attributes)
+        :param float max_distance: Stop once entities are further away than this
+        :return: Generator of (distance, entity), ties in insertion order
+        :rtype: Iterator[(float, entity.Entity)]
+        """
+        if self._bounds is None:
+            return
+        x, y = point.x, point.y
+        if len(self) <= _SCAN_BELOW:
+            # Cheaper to measure everything than to open rings of mostly empty cells
+            entities = self._entities
+            distances = sorted((math.sqrt((entities[index].x - x) ** 2 + (entities[index].y - y) ** 2), index)
+                               for cell in self._cells.values() for index in cell)
+            for distance, index in distances:
+                if distance > max_distance:
+                    return
+                yield distance, self._entities[index]
+            return
+        cell_size = self.cell_size
+        cx, cy = self._cell_of(x, y)
+        min_cx, min_cy, max_cx, max_cy = self._bounds
+        last_ring = max(cx - min_cx, max_cx - cx, cy - min_cy, max_cy - cy, 0)
+
+        heap = [(0.0, 0, 0)]
+        while heap:
+            distance, kind, item = heapq.heappop(heap)
+            if distance > max_distance:
+                return
+            if kind == 1:
+                yield distance, self._entities[item]
+                continue
+            for cell in self._ring(cx, cy, item):
+                for index in self._cells.get(cell, ()):
+                    other = self._entities[index]
+                    heapq.heappush(heap, (math.sqrt((other.x - x) ** 2 + (other.y - y) ** 2), 1, index))
+            ring = item + 1
+            if ring <= last_ring:
+                # Everything in the next ring lies outside the square of cells opened so far
+                bound = min(x - (cx - ring + 1) * cell_size, (cx + ring) * cell_size - x,
+                            y - (cy - ring + 1) * cell_size, (cy + ring) * cell_size - y)
+                heapq.heappush(heap, (bound, 0, ring))
+
+
+class _Node:
+    """
+    Node of a PlanetIndex: the bounding box of its circles, and either two children or the circles themselves.
+    """
+    __slots__ = ("min_x", "min_y", "max_x", "max_y", "left", "right", "circles")
+
+    def __init__(self, circles, leaf_size):
+        self.min_x = min(x - r for _, _, x, y, r in circles)
+        self.min_y = min(y - r for _, _, x, y, r in circles)
+        self.max_x = max(x + r for _, _, x, y, r in circles)
+        self.max_y = max(y + r for _, _, x, y, r in circles)
+        self.left = self.right = self.circles = None
+        if len(circles) <= leaf_size:
+            self.circles = circles
+            return
+        axis = 2 if (self.max_x - self.min_x) >= (self.max_y - self.min_y) else 3
+        circles = sorted(circles, key=lambda circle: circle[axis])
+        half = len(circles) // 2
+        self.left = _Node(circles[:half], leaf_size)
+        self.right = _Node(circles[half:], leaf_size)
+
+    def distance_to(self, x, y):
+        dx = max(self.min_x - x, 0.0, x - self.max_x)
+        dy = max(self.min_y - y, 0.0, y - self.max_y)
+        return math.sqrt(dx * dx + dy * dy)
+
+    def crosses(self, x0, y0, x1, y1, margin):
+        """
+        Slab test of the segment against the box grown by margin.
+        """
+        low, high = 0.0, 1.0
+        for start, delta, box_min, box_max in ((x0, x1 - x0, self.min_x - margin, self.max_x + margin),
+                                               (y0, y1 - y0, self.min_y - margin, self.max_y + margin)):
+            if delta == 0:
+                if start < box_min or start > box_max:
+                    return False
+                continue
+            t0 = (box_min - start) / delta
+            t1 = (box_max - start) / delta
+            if t0 > t1:
+                t0, t1 = t1, t0
+            low = max(low, t0)
+            high = min(high, t1)
+            if low > high:
+                return False
+        return True
+
+
+class PlanetIndex:
+    """
+    Bounding-volume hierarchy over planet circles. Planets never move, so it is built once from the initial map and
+    only answers with planet ids; callers resolve them against the current map, which carries the ownership and
+    docking state of the turn and no longer holds destroyed planets.
+    """
+
+    def __init__(self, planets, leaf_size=2):
+        """
+        :param planets: The planets to index (need id, x, y, radius attributes), e.g. from a MapSnapshot
+        :param int leaf_size: Max number of circles kept in a leaf
+        """
+        circles = [(rank, planet.id, planet.x, planet.y, planet.radius) for rank, planet in enumerate(planets)]
+        self._root = _Node(circles, leaf_size) if circles else None
+
+    def _collect(self, test):
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            if not test(node):
+                continue
+            if node.circles is not None:
+                found.extend(node.circles)
+            else:
+                stack.append(node.left)
+                stack.append(node.right)
+        found.sort()
+        return found
+
+    def query_segment(self, start, end, margin):
+        """
+        Find the planets whose circle, grown by margin, may touch a segment.
+
+        :param entity.Entity start: The start of the segment (needs x, y attributes)
+        :param entity.Entity end: The end of the segment (needs x, y attributes)
+        :param float margin: Extra distance to keep from the planet surfaces
+        :return: Candidate planet ids, in the order the planets were indexed
+        :rtype: list[int]
+        """
+        x0, y0, x1, y1 = start.x, start.y, end.x, end.y
+        margin += 1e-9
+        return [planet_id for _, planet_id, _, _, _ in
+                self._collect(lambda node: node.crosses(x0, y0, x1, y1, margin))]
+
+    def query_point(self, point, margin):
+        """
+        Find the planets whose circle, grown by margin, may contain a point.
+
+        :param entity.Entity point: The point to test (needs x, y attributes)
+        :param float margin: Extra distance around the planet surfaces
+        :return: Candidate planet ids, in the order the planets were indexed
+        :rtype: list[int]
+        """
+        x, y = point.x, point.y
+        margin += 1e-9
+        return [planet_id for _, planet_id, _, _, _ in self._collect(lambda node: node.distance_to(x, y) <= margin)]
+
+    def by_distance(self, point):
+        """
+        Lazily walk the planets in order of increasing distance between their centre and a point.
+
+        :param entity.Entity point: The point to measure from (needs x, y attributes)
+        :return: Generator of (distance, planet id)
+        :rtype: Iterator[(float, int)]
+        """
+        if self._root is None:
+            return
+        x, y = point.x, point.y
+        # Boxes bound the circles, hence also their centres, so the box distance never overestimates
+        heap = [(self._root.distance_to(x, y), 0, 0, self._root)]
+        counter = 1
+        while heap:
+            distance, kind, _, item = heapq.heappop(heap)
+            if kind == 1:
+                yield distance, item
+            elif item.circles is not None:
+                for _, planet_id, cx, cy, _ in item.circles:
+                    heapq.heappush(heap, (math.sqrt((cx - x) ** 2 + (cy - y) ** 2), 1, counter, planet_id))
+                    counter += 1
+            else:
+                for child in (item.left, item.right):
+                    heapq.heappush(heap, (child.distance_to(x, y), 0, counter, child))
+                    counter += 1
+
+
+class PlanetField:
+    """
+    Signed distance field of the planets: on a grid of samples, the distance from each sample to the nearest planet
+    surface, negative inside a planet. Moving by some distance changes the distance to the planets by at most as
+    much, so one sample bounds it for a whole disc around the point, which lets segment_clear prove a segment clear of
+    the planets with a few lookups (sphere tracing). Planets never move, so it is rasterized once from the initial
+    map; destroyed planets stay in it, which keeps every bound safe.
+    """
+
+    def __init__(self, planets, width, height, resolution=0.5):
+        """
+        :param planets: The planets (need x, y, radius attributes), e.g. from a MapSnapshot
+        :param float width: Map width
+        :param float height: Map height
+        :param float resolution: Distance between samples
+        """
+        if np is None:
+            raise ImportError("The planet distance field requires numpy")
+        self.resolution = resolution
+        self._columns = int(math.ceil(width / resolution)) + 1
+        self._rows = int(math.ceil(height / resolution)) + 1
+        xs = np.arange(self._columns, dtype=float)[:, None] * resolution
+        ys = np.arange(self._rows, dtype=float)[None, :] * resolution
+        values = np.full((self._columns, self._rows), np.inf)
+        for planet in planets:
+            np.minimum(values, np.sqrt((xs - planet.x) ** 2 + (ys - planet.y) ** 2) - planet.radius, out=values)
+        self._values = values
+
+    def clearance(self, point):
+        """
+        :param entity.Entity point: The point to measure from (needs x, y attributes)
+        :return: A lower bound of the distance from the point to the nearest planet surface, negative inside a planet
+        :rtype: float
+        """
+        return self._clearance_at(point.x, point.y)
+
+    def _clearance_at(self, x, y):
+        column = min(max(round(x / self.resolution), 0), self._columns - 1)
+        row = min(max(round(y / self.resolution), 0), self._rows - 1)
+        offset = math.sqrt((x - column * self.resolution) ** 2 + (y - row * self.resolution) ** 2)
+        return self._values.item(column, row) - offset
+
+    def segment_clear(self, start, end, margin, max_steps=16):
+        """
+        Sphere-trace from start to end, every step jumping as far as the bound at the current point allows.
+
+        :param entity.Entity start: The start of the segment (needs x, y attributes)
+        :param entity.Entity end: The end of the segment (needs x, y attributes)
+        :param float margin: Distance to keep from the planet surfaces
+        :param int max_steps: Give up after this many lookups
+        :return: True if every point of the segment is proven further than margin from the planets, False if that
+            could not be shown (it may still be clear)
+        :rtype: bool
+        """
+        dx = end.x - start.x
+        dy = end.y - start.y
+        length = math.sqrt(dx ** 2 + dy ** 2)
+        travelled = 0.0
+        for _ in range(max_steps):
+            fraction = travelled / length if length > 0 else 0.0
+            step = self._clearance_at(start.x + dx * fraction, start.y + dy * fraction) - margin
+            if step <= 1e-9:
+                return False
+            travelled += step
+            if travelled > length:
+                return True
+        return False
+
+
+class NeighbourList:
+    """
+    Verlet neighbour lists over moving entities: for every entity, the others within the interaction radius plus a
+    skin. Membership is decided on the positions the lists were last built at (the references), and an entity's list
+    is only rebuilt once it strays more than half the skin from its reference. Two entities can then only have come
+    within the interaction radius of each other while being listed as neighbours, so the lists stay complete while
+    entities that stand still, or barely move, cost nothing from one update to the next.
+
+    :ivar radius: The interaction radius
+    :ivar skin: The margin kept on top of the interaction radius
+    :ivar rebuilt: The number of lists rebuilt by the last update
+    """
+
+    def __init__(self, radius, skin):
+        """
+        :param float radius: The interaction radius
+        :param float skin: The margin kept on top of the interaction radius
+        """
+        self.radius = radius
+        self.skin = skin
+        self.rebuilt = 0
+        self._cell_size = radius + skin
+        self._cells = {}
+        self._references = {}
+        self._lists = {}
+        self._entities = {}
+
+    def __len__(self):
+        return len(self._entities)
+
+    def __contains__(self, item):
+        """
+        :return: Whether the item is the very entity tracked under its id by the last update
+        """
+        return self._entities.get(getattr(item, "id", None)) is item
+
+    def _cell_of(self, x, y):
+        return math.floor(x / self._cell_size), math.floor(y / self._cell_size)
+
+    def _drop(self, entity_id):
+        """
+        Forget the reference of an entity and take it off the lists of its neighbours.
+        """
+        x, y = self._references.pop(entity_id)
+        cell = self._cells[self._cell_of(x, y)]
+        cell.discard(entity_id)
+        for other_id in self._lists.pop(entity_id):
+            self._lists[other_id].discard(entity_id)
+
+    def _build(self, entity_id):
+        """
+        Build the list of an entity from the references around its own, and add it to the lists it belongs on.
+        """
+        x, y = self._references[entity_id]
+        reach = (self.radius + self.skin) ** 2
+        found = self._lists[entity_id]
+        cx, cy = self._cell_of(x, y)
+        for column in range(cx - 1, cx + 2):
+            for row in range(cy - 1, cy + 2):
+                for other_id in self._cells.get((column, row), ()):
+                    if other_id == entity_id:
+                        continue
+                    other_x, other_y = self._references[other_id]
+                    if (other_x - x) ** 2 + (other_y - y) ** 2 <= reach:
+                        found.add(other_id)
+                        self._lists[other_id].add(entity_id)
+
+    def update(self, entities):
+        """
+        Bring the lists up to date with the current positions. Entities no longer present are dropped, new ones are
+        added, and only the entities that moved more than half the skin since their list was built get a new one.
+
+        :param entities: Every entity currently on the map that should be tracked (need id, x, y attributes)
+        :return: nothing
+        """
+        current = {item.id: item for item in entities}
+        for entity_id in self._references.keys() - current.keys():
+            self._drop(entity_id)
+        self._entities = current
+
+        limit = (self.skin / 2) ** 2
+        moved = []
+        for entity_id, item in current.items():
+            reference = self._references.get(entity_id)
+            if reference is not None:
+                if (item.x - reference[0]) ** 2 + (item.y - reference[1]) ** 2 <= limit:
+                    continue
+                self._drop(entity_id)
+            self._references[entity_id] = (item.x, item.y)
+            self._cells.setdefault(self._cell_of(item.x, item.y), set()).add(entity_id)
+            self._lists[entity_id] = set()
+            moved.append(entity_id)
+        for entity_id in moved:
+            self._build(entity_id)
+        self.rebuilt = len(moved)
+
+    def neighbours(self, item):
+        """
+        :param entity.Entity item: A tracked entity
+        :return: Its neighbours as of the last update: every other entity within the interaction radius, plus some
+            that may be up to the interaction radius plus twice the skin away
+        :rtype: list[entity.Entity]
+        """
+        return [self._entities[other_id] for other_id in self._lists.get(item.id, ())]
+
+    def within(self, item, radius=None):
+        """
+        :param entity.Entity item: A tracked entity
+        :param float radius: The distance between centres to search within, at most the interaction radius (defaults
+            to the interaction radius)
+        :return: The other entities currently within that distance of it
+        :rtype: list[entity.Entity]
+        """
+        radius = self.radius if radius is None else radius
+        return [other for other in self.neighbours(item) if item.calculate_distance_between(other) <= radius]
@@ -0,0 +1,105 @@
+"""
+The assignment solver against brute force over every possible pairing, on small random cost matrices.
+"""
+import itertools
+import random
+
+import pytest
+
+from hlt import assignment
+
+
+@pytest.fixture(params=["numpy", "python"])
+def solver(request, monkeypatch):
+    """
+    Run a test with the numpy kernels and again with the plain Python ones.
+    """
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(assignment, "np", None)
+    return assignment
+
+
+def _random_costs(rng, rows, columns):
+    return [[rng.randint(0, 50) for _ in range(columns)] for _ in range(rows)]
+
+
+def _brute_force(costs):
+    """
+    :return: The lowest total cost of pairing every row, or every column if there are fewer of them, with a distinct
+        partner on the other side
+    :rtype: float
+    """
+    rows, columns = len(costs), len(costs[0])
+    if rows <= columns:
+        return min(sum(costs[row][column] for row, column in enumerate(chosen))
+                   for chosen in itertools.permutations(range(columns), rows))
+    return min(sum(costs[row][column] for column, row in enumerate(chosen))
+               for chosen in itertools.permutations(range(rows), columns))
+
+
+def _total(costs, column_of):
+    return sum(costs[row][column] for row, column in enumerate(column_of) if column is not None)
+
+
+@pytest.mark.parametrize("rows, columns", [(1, 1), (3, 3), (3, 5), (5, 5), (6, 4)])
+def test_solve_is_optimal(solver, rows, columns):
+    rng = random.Random(rows * 10 + columns)
+    for _ in range(20):
+        costs = _random_costs(rng, rows, columns)
+        column_of, potentials, searched = solver.solve(costs)
+        assigned = [column for column in column_of if column is not None]
+        assert len(assigned) == len(set(assigned)) == min(rows, columns)
+        assert _total(costs, column_of) == _brute_force(costs)
+        assert searched == rows
+        assert all(potential <= 1e-9 for potential in potentials)
+
+
+def test_solve_warm_start(solver):
+    rng = random.Random(1)
+    for _ in range(20):
+        costs = _random_costs(rng, 5, 6)
+        column_of, potentials, _ = solver.solve(costs)
+        # Next turn a few costs change; the pairings that are still tight are kept, the result stays optimal
+        for row in rng.sample(range(5), 2):
+            costs[row][rng.randrange(6)] = rng.randint(0, 50)
+        keep = {row: column for row, column in enumerate(column_of)}
+        warm, _, searched = solver.solve(costs, potentials, keep)
+        assert _total(costs, warm) == _brute_force(costs)
+        assert searched <= 5
+
+
+def test_solve_unchanged_costs_search_nothing(solver):
+    costs = _random_costs(random.Random(2), 4, 5)
+    column_of, potentials, _ = solver.solve(costs)
+    again, _, searched = solver.solve(costs, potentials, dict(enumerate(column_of)))
+    assert again == column_of
+    assert searched == 0
+
+
+@pytest.mark.parametrize("rows, columns", [(4, 6), (6, 3)])
+def test_assigner_follows_changing_keys(solver, rows, columns):
+    rng = random.Random(rows + columns)
+    assigner = solver.Assigner()
+    row_keys = list(range(rows))
+    column_keys = ["t%d" % column for column in range(columns)]
+    for turn in range(10):
+        # Keys come and go between turns
+        if turn % 3 == 2:
+            row_keys = row_keys[1:] + [max(row_keys) + 1]
+        if turn % 4 == 3:
+            column_keys = column_keys[1:] + ["t%d-%d" % (turn, len(column_keys))]
+        costs = _random_costs(rng, len(row_keys), len(column_keys))
+        pairs = assigner.assign(row_keys, column_keys, costs)
+        assert len(pairs) == min(rows, columns)
+        assert len(set(pairs.values())) == len(pairs)
+        index = {key: column for column, key in enumerate(column_keys)}
+        total = sum(costs[row_keys.index(row_key)][index[column_key]] for row_key, column_key in pairs.items())
+        assert total == _brute_force(costs)
+
+
+def test_assigner_leaves_forbidden_pairs_out(solver):
+    costs = [[1, assignment.FORBIDDEN], [assignment.FORBIDDEN, assignment.FORBIDDEN], [assignment.FORBIDDEN, 2]]
+    pairs = solver.Assigner().assign(["a", "b", "c"], ["x", "y"], costs)
+    assert pairs == {"a": "x", "c": "y"}
@@ -0,0 +1,78 @@
+"""
+The batched segment-circle kernels against the scalar intersect_segment_circle, pair by pair.
+"""
+import math
+import random
+
+import pytest
+
+from hlt import collision, entity
+
+np = pytest.importorskip("numpy")
+
+
+def _circle(x, y, radius):
+    circle = entity.Position(x, y)
+    circle.radius = radius
+    return circle
+
+
+def _random_case(rng, count_segments=40, count_circles=15):
+    starts = [entity.Position(rng.uniform(0, 60), rng.uniform(0, 60)) for _ in range(count_segments)]
+    ends = [entity.Position(start.x + rng.uniform(-25, 25), start.y + rng.uniform(-25, 25)) for start in starts]
+    # A few segments of length 0
+    ends[0] = entity.Position(starts[0].x, starts[0].y)
+    circles = [_circle(rng.uniform(0, 60), rng.uniform(0, 60), rng.uniform(0.5, 8)) for _ in range(count_circles)]
+    return starts, ends, circles
+
+
+def _arrays(starts, ends, circles):
+    return ([(point.x, point.y) for point in starts], [(point.x, point.y) for point in ends],
+            [(circle.x, circle.y, circle.radius) for circle in circles])
+
+
+def _entry(start, end, circle, limit, steps=4000):
+    """
+    :return: The first fraction of the segment, sampled, at which it is within limit of the circle centre
+    """
+    for step in range(steps + 1):
+        t = step / steps
+        if math.hypot(start.x + (end.x - start.x) * t - circle.x, start.y + (end.y - start.y) * t - circle.y) <= limit:
+            return t
+    return math.inf
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_intersect_segments_circles_matches_scalar(seed):
+    rng = random.Random(seed)
+    starts, ends, circles = _random_case(rng)
+    fudges = [rng.uniform(0, 2) for _ in starts]
+    hits = collision.intersect_segments_circles(*_arrays(starts, ends, circles), fudge=np.array(fudges))
+    expected = [[collision.intersect_segment_circle(start, end, circle, fudge=fudge) for circle in circles]
+                for start, end, fudge in zip(starts, ends, fudges)]
+    assert hits.tolist() == expected
+    assert any(any(row) for row in expected)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_first_intersection_is_the_earliest_hit(seed):
+    rng = random.Random(seed)
+    starts, ends, circles = _random_case(rng)
+    fudge = 0.6
+    first = collision.first_intersection(*_arrays(starts, ends, circles), fudge=fudge).tolist()
+    hit_some = 0
+    for start, end, index in zip(starts, ends, first):
+        hit = [collision.intersect_segment_circle(start, end, circle, fudge=fudge) for circle in circles]
+        if not any(hit):
+            assert index == -1
+            continue
+        hit_some += 1
+        assert hit[index]
+        entries = [_entry(start, end, circle, circle.radius + fudge)
+                   for circle, was_hit in zip(circles, hit) if was_hit]
+        assert _entry(start, end, circles[index], circles[index].radius + fudge) <= min(entries) + 1e-3
+    assert hit_some > 0
+
+
+def test_first_intersection_without_circles():
+    assert collision.first_intersection([(0, 0), (1, 1)], [(5, 5), (2, 2)], np.empty((0, 3))).tolist() == [-1, -1]
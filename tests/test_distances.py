@@ -0,0 +1,87 @@
+"""
+The per-turn distance table against plain loops over the entities of the frame.
+"""
+import math
+import random
+
+import pytest
+
+from benchmarks.frames import synthetic_frame
+from hlt import distances, game_map
+
+WIDTH, HEIGHT = 240, 160
+GROUPS = (distances.OWN_SHIPS, distances.ENEMY_SHIPS, distances.PLANETS)
+
+
+@pytest.fixture(params=["numpy", "columnar", "python"])
+def table(request, monkeypatch):
+    """
+    The table of a parsed frame, with numpy matrices, with numpy matrices fed by the column arrays, and with the
+    nested lists.
+    """
+    if request.param == "python":
+        monkeypatch.setattr(distances, "np", None)
+    else:
+        pytest.importorskip("numpy")
+    game = game_map.Map(1, WIDTH, HEIGHT, columnar=request.param == "columnar")
+    game._parse(synthetic_frame(3, 40, 12, WIDTH, HEIGHT, 5))
+    return game, game.distance_table()
+
+
+def _group(game, group):
+    me = game.get_me()
+    if group == distances.OWN_SHIPS:
+        return me.all_ships()
+    if group == distances.ENEMY_SHIPS:
+        return [ship for player in game.all_players() if player is not me for ship in player.all_ships()]
+    return game.all_planets()
+
+
+def test_entities_rows_and_get(table):
+    game, distance_table = table
+    for group in GROUPS:
+        assert distance_table.entities(group) == _group(game, group)
+    for source_group in GROUPS:
+        for source in _group(game, source_group)[::7]:
+            assert distance_table.group_of(source) == source_group
+            for group in GROUPS:
+                expected = [source.calculate_distance_between(target) for target in _group(game, group)]
+                assert list(distance_table.row(source, group)) == pytest.approx(expected)
+                for target in _group(game, group)[::5]:
+                    expected = source.calculate_distance_between(target)
+                    assert distance_table.get(source, target) == pytest.approx(expected)
+
+
+def test_within_and_closest(table):
+    game, distance_table = table
+    rng = random.Random(5)
+    for group in GROUPS:
+        items = _group(game, group)
+        predicate = lambda item: item.health % 3 != 0
+        mask = distance_table.mask(group, predicate)
+        assert list(mask) == [predicate(item) for item in items]
+        sources = _group(game, distances.OWN_SHIPS)
+        for source in sources[::3]:
+            radius = rng.uniform(0, 60)
+            for current in (None, mask):
+                allowed = [item for index, item in enumerate(items) if current is None or current[index]]
+                inside = [item for item in allowed
+                          if item is not source and source.calculate_distance_between(item) <= radius]
+                assert distance_table.within(source, group, radius, current) == inside
+                for max_distance in (math.inf, radius):
+                    candidates = [item for item in allowed if item is not source and
+                                  source.calculate_distance_between(item) <= max_distance]
+                    expected = min(candidates, key=source.calculate_distance_between, default=None)
+                    assert distance_table.closest(source, group, current, max_distance) is expected
+        for current in (None, mask):
+            assert distance_table.closest_many(sources, group, current, 30) == \
+                [distance_table.closest(source, group, current, 30) for source in sources]
+    assert distance_table.closest_many([], distances.PLANETS) == []
+
+
+def test_can_dock(table):
+    game, distance_table = table
+    pairs = [(ship, planet) for ship in _group(game, distances.OWN_SHIPS) for planet in game.all_planets()]
+    assert [distance_table.can_dock(ship, planet) for ship, planet in pairs] == \
+        [ship.can_dock(planet) for ship, planet in pairs]
+    assert any(ship.can_dock(planet) for ship, planet in pairs)
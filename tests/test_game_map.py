@@ -0,0 +1,327 @@
+"""
+Map parsing and queries against fresh parses and linear scans over the entities of the frame.
+"""
+import math
+import random
+
+import pytest
+
+from benchmarks.frames import synthetic_frames
+from hlt import collision, constants, distances, entity, game_map
+
+WIDTH, HEIGHT = 240, 160
+
+
+def _describe(game):
+    """
+    :return: Everything the bot can read from the map, with links resolved to ids
+    """
+    players = sorted((player.id, sorted(ship.id for ship in player.all_ships())) for player in game.all_players())
+    ships = sorted((ship.id, ship.owner.id, ship.x, ship.y, ship.health, ship.docking_status,
+                    ship.planet and ship.planet.id, ship._docking_progress, ship._weapon_cooldown)
+                   for ship in game._all_ships())
+    planets = sorted((planet.id, planet.owner and planet.owner.id, planet.x, planet.y, planet.radius, planet.health,
+                      planet.num_docking_spots, planet.current_production, planet.remaining_resources,
+                      planet.is_full(), sorted(ship.id for ship in planet.all_docked_ships()))
+                     for planet in game.all_planets())
+    return players, ships, planets
+
+
+def _links(game):
+    """
+    :return: Whether every link between entities points at the objects the map holds this turn
+    :rtype: bool
+    """
+    for ship in game._all_ships():
+        if game.get_player(ship.owner.id) is not ship.owner or game.get_ship(ship.id) is not ship:
+            return False
+        if ship.planet is not None and game.get_planet(ship.planet.id) is not ship.planet:
+            return False
+    for planet in game.all_planets():
+        if planet.owner is not None and game.get_player(planet.owner.id) is not planet.owner:
+            return False
+        if any(game.get_ship(ship.id) is not ship for ship in planet.all_docked_ships()):
+            return False
+    return True
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_incremental_parse_matches_fresh_parse(seed):
+    frames = synthetic_frames(25, 3, 30, 15, WIDTH, HEIGHT, seed)
+    incremental = game_map.Map(0, WIDTH, HEIGHT, incremental=True)
+    previous = {}
+    for frame in frames:
+        incremental._parse(frame)
+        fresh = game_map.Map(0, WIDTH, HEIGHT)
+        fresh._parse(frame)
+        assert _describe(incremental) == _describe(fresh)
+        assert _links(incremental)
+        # Entities that live on are the objects of the previous turn
+        ships = {ship.id: ship for ship in incremental._all_ships()}
+        assert all(ships[ship_id] is ship for ship_id, ship in previous.items() if ship_id in ships)
+        previous = ships
+
+
+def test_synthetic_frames_change_the_map():
+    frames = synthetic_frames(25, 3, 30, 15, WIDTH, HEIGHT, 0)
+    first, last = game_map.Map(0, WIDTH, HEIGHT), game_map.Map(0, WIDTH, HEIGHT)
+    first._parse(frames[0])
+    last._parse(frames[-1])
+    first_ships, last_ships = {ship.id for ship in first._all_ships()}, {ship.id for ship in last._all_ships()}
+    assert first_ships - last_ships and last_ships - first_ships
+    assert len(last.all_planets()) < len(first.all_planets())
+    assert any(planet.owner is not None for planet in last.all_planets())
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_columnar_parse_matches_token_parse(incremental):
+    np = pytest.importorskip("numpy")
+    columnar = game_map.Map(0, WIDTH, HEIGHT, incremental=incremental, columnar=True)
+    for frame in synthetic_frames(25, 3, 30, 15, WIDTH, HEIGHT, 1):
+        columnar._parse(frame)
+        tokens = game_map.Map(0, WIDTH, HEIGHT)
+        tokens._parse(frame)
+        assert _describe(columnar) == _describe(tokens)
+        assert _links(columnar)
+
+        # The columns hold the entities in parse order
+        ships = [ship for player in tokens.all_players() for ship in player.all_ships()]
+        arrays = columnar.ship_arrays
+        assert arrays.id.tolist() == [ship.id for ship in ships]
+        assert arrays.owner.tolist() == [ship.owner.id for ship in ships]
+        assert arrays.x.tolist() == [ship.x for ship in ships] and arrays.y.tolist() == [ship.y for ship in ships]
+        assert arrays.hp.tolist() == [ship.health for ship in ships]
+        assert arrays.docking_status.tolist() == [ship.docking_status.value for ship in ships]
+        planets = tokens.all_planets()
+        arrays = columnar.planet_arrays
+        assert arrays.id.tolist() == [planet.id for planet in planets]
+        assert arrays.radius.tolist() == [planet.radius for planet in planets]
+        assert arrays.owned.tolist() == [planet.owner is not None for planet in planets]
+        assert arrays.docked_ship_ids.tolist() == [ship_id for planet in planets for ship_id in planet._docked_ship_ids]
+
+        # The distance table reads the coordinates from the columns
+        table, expected = columnar.distance_table(), distances.DistanceTable(tokens)
+        for rows in (distances.OWN_SHIPS, distances.ENEMY_SHIPS, distances.PLANETS):
+            assert [item.id for item in table.entities(rows)] == [item.id for item in expected.entities(rows)]
+            for columns in (distances.OWN_SHIPS, distances.ENEMY_SHIPS, distances.PLANETS):
+                assert np.array_equal(table.matrix(rows, columns), expected.matrix(rows, columns))
+
+
+def _ids(entities):
+    return sorted((type(item).__name__.replace("Snapshot", ""), item.id) for item in entities)
+
+
+def test_snapshot_answers_like_the_map():
+    game = game_map.Map(1, WIDTH, HEIGHT)
+    game._parse(synthetic_frames(1, 3, 20, 10, WIDTH, HEIGHT, 2)[0])
+    snapshot = game.snapshot()
+    with pytest.raises(AttributeError):
+        snapshot.my_id = 2
+    assert snapshot.get_me().id == 1
+    assert [player.id for player in snapshot.all_players()] == [player.id for player in game.all_players()]
+    for player in game.all_players():
+        frozen = snapshot.get_player(player.id)
+        assert [(ship.id, ship.x, ship.y, ship.health, ship.owner) for ship in frozen.all_ships()] == \
+            [(ship.id, ship.x, ship.y, ship.health, player.id) for ship in player.all_ships()]
+        assert all(frozen.get_ship(ship.id).id == ship.id for ship in player.all_ships())
+    assert _ids(snapshot.all_ships()) == _ids(game._all_ships())
+    assert _ids(snapshot.all_planets()) == _ids(game.all_planets())
+
+    ships = game.get_me().all_ships()
+    for ship, frozen in zip(ships, snapshot.get_me().all_ships()):
+        nearby = {distance: _ids(items) for distance, items in game.nearby_entities_by_distance(ship).items()}
+        assert {distance: _ids(items) for distance, items in snapshot.nearby_entities_by_distance(frozen).items()} \
+            == nearby
+        for target in ships[:5]:
+            frozen_target = snapshot.get_me().get_ship(target.id)
+            for ignore in ((), entity.Ship, entity.Planet):
+                assert _ids(snapshot.obstacles_between(frozen, frozen_target, ignore)) == \
+                    _ids(game.obstacles_between(ship, target, ignore))
+            assert frozen.calculate_distance_between(frozen_target) == ship.calculate_distance_between(target)
+            assert frozen.calculate_angle_between(frozen_target) == ship.calculate_angle_between(target)
+
+
+def _linear_obstacles(game, ship, target, ignore):
+    """
+    The obstacles as the original obstacles_between found them, testing every planet and ship
+    """
+    entities = ([] if issubclass(entity.Planet, ignore) else game.all_planets()) + \
+        ([] if issubclass(entity.Ship, ignore) else game._all_ships())
+    return [item for item in entities if item != ship and item != target and
+            collision.intersect_segment_circle(ship, target, item, fudge=ship.radius + 0.1)]
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_obstacles_between_matches_linear_scan(indexed):
+    rng = random.Random(3)
+    for frame in synthetic_frames(3, 3, 80, 20, WIDTH, HEIGHT, 3):
+        game = game_map.Map(0, WIDTH, HEIGHT)
+        game._parse(frame)
+        if indexed:
+            game.index_planets(game.all_planets())
+        ships = game._all_ships()
+        found = 0
+        for ship in rng.sample(ships, 60):
+            for target in (rng.choice(ships), rng.choice(game.all_planets()),
+                           entity.Position(ship.x + rng.uniform(-30, 30), ship.y + rng.uniform(-30, 30))):
+                for ignore in ((), entity.Ship, entity.Planet):
+                    expected = _linear_obstacles(game, ship, target, ignore)
+                    assert sorted(map(id, game.obstacles_between(ship, target, ignore))) == sorted(map(id, expected))
+                    found += len(expected)
+        assert found > 0
+
+
+def _linear_nearest(game, target, kinds, k=None, max_distance=math.inf, predicate=None, owners=None):
+    candidates = []
+    if issubclass(entity.Ship, kinds):
+        candidates += [ship for ship in game._all_ships() if owners is None or ship.owner.id in owners]
+    if issubclass(entity.Planet, kinds):
+        candidates += game.all_planets()
+    found = sorted((item for item in candidates if item is not target and
+                    target.calculate_distance_between(item) <= max_distance and
+                    (predicate is None or predicate(item))), key=target.calculate_distance_between)
+    return found if k is None else found[:k]
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_nearest_queries_match_sorted_scan(indexed):
+    rng = random.Random(4)
+    game = game_map.Map(0, WIDTH, HEIGHT, incremental=True)
+    for frame in synthetic_frames(4, 3, 40, 15, WIDTH, HEIGHT, 4):
+        game._parse(frame)
+        if indexed:
+            game.index_planets(game.all_planets())
+        ships = game._all_ships()
+        for _ in range(40):
+            target = rng.choice(ships) if rng.random() < 0.5 else \
+                entity.Position(rng.uniform(0, WIDTH), rng.uniform(0, HEIGHT))
+            kinds = rng.choice([(entity.Ship, entity.Planet), entity.Ship, entity.Planet])
+            options = {"k": rng.choice([None, 1, 5]), "max_distance": rng.choice([math.inf, 30.0]),
+                       "predicate": rng.choice([None, lambda item: item.health % 2 == 0]),
+                       "owners": rng.choice([None, [0], [1, 2], [7]])}
+            assert list(game.nearest(target, kinds, **options)) == _linear_nearest(game, target, kinds, **options)
+
+            radius = rng.uniform(0, 40)
+            assert sorted(map(id, game.within(target, radius, kinds))) == \
+                sorted(map(id, _linear_nearest(game, target, kinds, max_distance=radius)))
+
+            predicate = rng.choice([None, lambda planet: planet.owner is None])
+            expected = _linear_nearest(game, target, entity.Planet, k=1, predicate=predicate)
+            assert game.nearest_planet(target, predicate) is (expected[0] if expected else None)
+
+
+def test_planet_cache_evicts_least_recently_used():
+    cache = game_map.PlanetClearanceCache(maxsize=3)
+    keys = [cache.key(entity.Position(index, 0), entity.Position(index, 10), 0.6) for index in range(4)]
+    for key in keys[:3]:
+        assert cache.get(key) is None
+        cache.put(key, (keys.index(key),))
+    assert (cache.hits, cache.misses, len(cache)) == (0, 3, 3)
+    assert cache.get(keys[0]) == (0,)
+    cache.put(keys[3], (3,))
+    assert len(cache) == 3
+    assert cache.get(keys[1]) is None
+    assert [cache.get(key) for key in (keys[0], keys[2], keys[3])] == [(0,), (2,), (3,)]
+    assert (cache.hits, cache.misses) == (4, 4)
+    cache.clear()
+    assert (cache.hits, cache.misses, len(cache)) == (0, 0, 0)
+    assert cache.get(keys[0]) is None
+
+
+def test_planet_cache_answers_like_no_cache():
+    rng = random.Random(6)
+    cached = game_map.Map(0, WIDTH, HEIGHT, incremental=True, planet_cache_size=64)
+    uncached = game_map.Map(0, WIDTH, HEIGHT, incremental=True, planet_cache_size=0)
+    assert uncached.planet_cache is None
+    for turn, frame in enumerate(synthetic_frames(4, 3, 60, 20, WIDTH, HEIGHT, 6)):
+        for game in (cached, uncached):
+            game._parse(frame)
+            if turn == 0:
+                game.index_planets(game.all_planets())
+        segments = []
+        for ship in rng.sample(cached._all_ships(), 50):
+            target = entity.Position(ship.x + rng.uniform(-40, 40), ship.y + rng.uniform(-40, 40))
+            segments.append((ship, target))
+            # The same corridor again, off by less than the rounding of the endpoints
+            segments.append((ship, entity.Position(target.x + rng.uniform(-0.3, 0.3), target.y)))
+        found = 0
+        for ship, target in segments + segments[::3]:
+            expected = uncached.obstacles_between(uncached.get_player(ship.owner.id).get_ship(ship.id), target)
+            assert _ids(cached.obstacles_between(ship, target)) == _ids(expected)
+            found += any(isinstance(item, entity.Planet) for item in expected)
+        assert found > 0
+        assert len(cached.planet_cache) <= 64
+    assert cached.planet_cache.hits > 0 and cached.planet_cache.misses > 0
+    cached.index_planets(cached.all_planets())
+    assert (cached.planet_cache.hits, cached.planet_cache.misses, len(cached.planet_cache)) == (0, 0, 0)
+
+
+def test_obstacles_near_reads_the_neighbour_lists():
+    rng = random.Random(8)
+    reach = 2 * constants.MAX_SPEED
+    tracked = game_map.Map(0, WIDTH, HEIGHT, incremental=True)
+    tracked.track_neighbours(reach, 2 * constants.MAX_SPEED)
+    fresh = game_map.Map(0, WIDTH, HEIGHT, incremental=True)
+    for turn, frame in enumerate(synthetic_frames(6, 3, 80, 15, WIDTH, HEIGHT, 8)):
+        for game in (tracked, fresh):
+            game._parse(frame)
+            if turn == 0:
+                game.index_planets(game.all_planets())
+        found = 0
+        for ship in rng.sample(tracked._all_ships(), 80):
+            same = fresh.get_player(ship.owner.id).get_ship(ship.id)
+            for distance in (reach, rng.uniform(0, reach)):
+                for ignore in ((), entity.Planet):
+                    expected = fresh.obstacles_near(same, distance, ignore)
+                    assert _ids(tracked.obstacles_near(ship, distance, ignore)) == _ids(expected)
+                    found += len(expected)
+        assert found > 0
+    # Moves longer than the lists were kept for, and ships the lists do not track, search the grid
+    ship = tracked._all_ships()[0]
+    assert _ids(tracked.obstacles_near(ship, 3 * reach)) == \
+        _ids(fresh.obstacles_near(fresh.get_player(ship.owner.id).get_ship(ship.id), 3 * reach))
+    assert ship in tracked._neighbours
+    assert tracked.snapshot().get_player(ship.owner.id).get_ship(ship.id) not in tracked._neighbours
+
+
+def _matches(item, owner, enemy, my_id):
+    if enemy:
+        return item.owner is not None and item.owner.id != my_id
+    return owner is None or (item.owner is not None and item.owner.id == getattr(owner, "id", owner))
+
+
+@pytest.mark.parametrize("mode", ["fresh", "incremental", "columnar"])
+def test_buckets_match_list_comprehensions(mode):
+    if mode == "columnar":
+        pytest.importorskip("numpy")
+    rng = random.Random(9)
+    game = game_map.Map(1, WIDTH, HEIGHT, incremental=mode != "fresh", columnar=mode == "columnar")
+    for frame in synthetic_frames(5, 3, 40, 15, WIDTH, HEIGHT, 9):
+        game._parse(frame)
+        ships, planets = game._all_ships(), game.all_planets()
+        players = game.all_players()
+        owners = [(None, False), (None, True), (99, False)] + [(player.id, False) for player in players] + \
+            [(player, False) for player in players]
+        for owner, enemy in owners:
+            for status in (None,) + tuple(entity.Ship.DockingStatus):
+                expected = [ship for ship in ships if _matches(ship, owner, enemy, game.my_id) and
+                            (status is None or ship.docking_status is status)]
+                assert list(game.ships(owner, status, enemy)) == expected
+                for planet in rng.sample(planets, 3):
+                    assert list(game.ships(owner, status, enemy, planet=rng.choice([planet, planet.id]))) == \
+                        [ship for ship in expected if ship.planet is planet]
+                point, distance = rng.choice(ships), rng.uniform(0, 40)
+                assert list(game.ships(owner, status, enemy, near=(point, distance))) == \
+                    [ship for ship in expected if point.calculate_distance_between(ship) <= distance]
+            for empty in (None, True, False):
+                for full in (None, True, False):
+                    expected = [planet for planet in planets if _matches(planet, owner, enemy, game.my_id) and
+                                (empty is None or empty == (not planet.all_docked_ships())) and
+                                (full is None or full == planet.is_full())]
+                    assert list(game.planets(owner, enemy, empty, full)) == expected
+                    point, distance = rng.choice(ships), rng.uniform(0, 80)
+                    assert list(game.planets(owner, enemy, empty, full, near=(point, distance))) == \
+                        [planet for planet in expected if point.calculate_distance_between(planet) <= distance]
+    assert game.ships(enemy=True) and game.planets(empty=False) and game.planets(empty=True)
+    with pytest.raises(ValueError):
+        game.ships(0, enemy=True)
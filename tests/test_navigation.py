@@ -0,0 +1,141 @@
+"""
+Heading search and fleet move planning against brute force over every integer heading and every pair of ships.
+"""
+import math
+import random
+
+import pytest
+
+from benchmarks.frames import synthetic_frame
+from hlt import collision, constants, entity, game_map, navigation
+
+WIDTH, HEIGHT = 240, 160
+
+
+def _map(seed, ships_per_player=60):
+    game = game_map.Map(0, WIDTH, HEIGHT)
+    game._parse(synthetic_frame(3, ships_per_player, 25, WIDTH, HEIGHT, seed))
+    game.index_planets(game.all_planets())
+    return game
+
+
+def _undocked(game):
+    return [ship for ship in game.get_me().all_ships() if ship.docking_status == entity.Ship.DockingStatus.UNDOCKED]
+
+
+def _random_point(rng):
+    return entity.Position(rng.uniform(0, WIDTH), rng.uniform(0, HEIGHT))
+
+
+def _end(ship, angle, distance):
+    return entity.Position(ship.x + distance * math.cos(math.radians(angle)),
+                           ship.y + distance * math.sin(math.radians(angle)))
+
+
+def _deviation(angle, desired):
+    return abs((angle - desired + 180) % 360 - 180)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_free_angle_finds_the_closest_free_heading(seed):
+    game = _map(seed)
+    rng = random.Random(seed)
+    lookahead = 14
+    for ship in _undocked(game)[:40]:
+        target = _random_point(rng)
+        obstacles = game.obstacles_near(ship, lookahead)
+        angle = navigation.free_angle(ship, target, obstacles, 90, lookahead)
+        desired = ship.calculate_angle_between(target)
+        distance = min(ship.calculate_distance_between(target), lookahead)
+        free = [heading for heading in range(360) if _deviation(heading, desired) <= 90 and
+                not any(collision.intersect_segment_circle(ship, _end(ship, heading, distance), obstacle,
+                                                           fudge=ship.radius + 0.1)
+                        for obstacle in obstacles if obstacle != ship and obstacle != target)]
+        if not free:
+            assert angle is None
+            continue
+        assert angle in free
+        assert _deviation(angle, desired) == pytest.approx(min(_deviation(heading, desired) for heading in free))
+
+
+def _velocities(commands):
+    velocities = {}
+    for ship_id, command in commands.items():
+        _, _, speed, angle = command.split()
+        angle = math.radians(int(angle))
+        velocities[int(ship_id)] = (int(speed) * math.cos(angle), int(speed) * math.sin(angle))
+    return velocities
+
+
+def _closest_approach(first, first_velocity, second, second_velocity):
+    rel_x, rel_y = second.x - first.x, second.y - first.y
+    rel_vx, rel_vy = second_velocity[0] - first_velocity[0], second_velocity[1] - first_velocity[1]
+    squared = rel_vx ** 2 + rel_vy ** 2
+    t = 0.0 if squared == 0 else min(max(-(rel_x * rel_vx + rel_y * rel_vy) / squared, 0.0), 1.0)
+    return math.sqrt((rel_x + t * rel_vx) ** 2 + (rel_y + t * rel_vy) ** 2)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_move_planner_commands_do_not_collide(seed):
+    game = _map(seed, ships_per_player=150)
+    rng = random.Random(seed)
+    planner = navigation.MovePlanner(game, 90, 14)
+    ships = _undocked(game)
+    for ship in ships:
+        planner.navigate(ship, _random_point(rng), constants.MAX_SPEED)
+    # Ships planned again release their earlier move
+    for ship in ships[::5]:
+        planner.navigate(ship, _random_point(rng), constants.MAX_SPEED)
+    commands = planner.commands()
+    assert len(commands) > len(ships) / 2
+    velocities = _velocities(commands)
+    fleet = game.get_me().all_ships()
+    for index, first in enumerate(fleet):
+        for second in fleet[index + 1:]:
+            first_velocity = velocities.get(first.id, (0.0, 0.0))
+            second_velocity = velocities.get(second.id, (0.0, 0.0))
+            if first_velocity == second_velocity == (0.0, 0.0) or \
+                    first.calculate_distance_between(second) <= 2 * constants.SHIP_RADIUS:
+                continue
+            assert _closest_approach(first, first_velocity, second, second_velocity) > 2 * constants.SHIP_RADIUS
+
+
+def _two_ships():
+    """
+    :return: A map without planets holding two ships of the user, the first 5 units east of the second
+    """
+    game = game_map.Map(0, 100, 100)
+    game._parse("1 0 2 0 45.0 50.0 255 0.0 0.0 0 0 0 0 1 40.0 50.0 255 0.0 0.0 0 0 0 0 0")
+    return game.get_ship(0), game.get_ship(1), game
+
+
+def test_move_planner_releases_the_earlier_move_of_a_ship():
+    first, second, game = _two_ships()
+    planner = navigation.MovePlanner(game)
+    east = entity.Position(60, 50)
+    # Standing still, the first ship is in the way of the second heading east
+    assert planner.navigate(first, entity.Position(first.x, first.y), constants.MAX_SPEED) == "t 0 0 0"
+    assert planner.navigate(second, east, constants.MAX_SPEED) != "t 1 7 0"
+    # Planned again heading north, it is gone from where it stood, and the second ship can go straight
+    assert planner.navigate(first, entity.Position(first.x, 90), constants.MAX_SPEED) == "t 0 7 90"
+    assert planner.navigate(second, east, constants.MAX_SPEED) == "t 1 7 0"
+    assert planner.commands() == {0: "t 0 7 90", 1: "t 1 7 0"}
+
+
+def test_move_planner_blocked_by_reserved_ships():
+    game = _map(0, ships_per_player=3)
+    ship, other = _undocked(game)[:2]
+    planner = navigation.MovePlanner(game, 90, 14)
+    # The other ship parks 6 units ahead of the ship, away from every obstacle
+    other.x, other.y = ship.x + 6, ship.y
+    planner.navigate(other, entity.Position(other.x, other.y), constants.MAX_SPEED, avoid_obstacles=False)
+    ahead = entity.Position(ship.x + 30, ship.y)
+    assert planner.blocked(ship, ahead)
+    assert not planner.blocked(ship, entity.Position(ship.x + 30, ship.y + 30))
+    # Ships stopping where the segment ends, and a ship's own move, do not count
+    assert not planner.blocked(ship, entity.Position(ship.x + 6.5, ship.y))
+    assert not planner.blocked(other, ahead)
+    # Planned again, the other ship leaves, and its earlier move no longer blocks anything
+    planner.navigate(other, entity.Position(other.x, other.y + 50), constants.MAX_SPEED, avoid_obstacles=False)
+    assert not planner.blocked(ship, ahead)
+    assert list(planner.commands()) == [other.id]
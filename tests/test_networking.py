@@ -0,0 +1,162 @@
+"""
+The engine transports and Game against byte streams standing in for the engine.
+"""
+import io
+import json
+import logging
+import socket
+import sys
+import threading
+
+import pytest
+
+from benchmarks.frames import synthetic_frame
+from hlt import networking
+
+
+class _Chunks:
+    """
+    Binary reader that hands out at most size bytes per read, like a pipe the engine writes to piece by piece.
+    """
+    def __init__(self, data, size):
+        self._data = data
+        self._size = size
+
+    def read(self, size):
+        chunk, self._data = self._data[:min(size, self._size)], self._data[min(size, self._size):]
+        return chunk
+
+
+@pytest.fixture(autouse=True)
+def _restore_logging():
+    """
+    Games set up the logging of the whole process; undo that after every test.
+    """
+    level = logging.getLogger().level
+    yield
+    networking.Game._tear_down_logging()
+    logging.getLogger().setLevel(level)
+
+
+LINES = ["0", "240 160", "héllo wörld €", "", "t 1 7 90 d 2 3 ", "∑ last"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 8, 64, 1 << 16])
+def test_read_line_across_chunks(chunk_size):
+    data = "\n".join(LINES).encode()
+    # Multibyte characters end up split between chunks for the small sizes
+    transport = networking.StreamTransport(_Chunks(data, chunk_size), io.BytesIO(), chunk_size=chunk_size)
+    assert [transport.read_line() for _ in LINES] == LINES
+    # The last line had no newline; past the end of the stream every read is empty
+    assert transport.read_line() == ""
+    assert transport.read_line() == ""
+
+
+def test_read_line_at_end_of_stream():
+    transport = networking.StreamTransport(_Chunks(b"12 34\n", 4), io.BytesIO())
+    assert transport.read_line() == "12 34"
+    assert transport.read_line() == ""
+
+
+def test_write_line():
+    writer = io.BytesIO()
+    transport = networking.StreamTransport(io.BytesIO(), writer)
+    transport.write_line("héllo")
+    transport.write_line("")
+    assert writer.getvalue() == "héllo\n\n".encode()
+
+
+def test_socket_transport():
+    first, second = socket.socketpair()
+    try:
+        sender, receiver = networking.SocketTransport(first), networking.SocketTransport(second, chunk_size=3)
+        for line in LINES:
+            sender.write_line(line)
+        assert [receiver.read_line() for _ in LINES] == LINES
+    finally:
+        first.close()
+        second.close()
+
+
+def _game(writer):
+    frame = synthetic_frame(2, 5, 4, 240, 160, 0)
+    reader = io.BytesIO("0\n240 160\n{}\n".format(frame).encode())
+    return networking.Game("Test", transport=networking.StreamTransport(reader, writer), log_mode="off")
+
+
+def test_send_command_queue_uses_the_game_transport():
+    writer = io.BytesIO()
+    game = _game(writer)
+    game.send_command_queue(["t 0 7 90 ", "d 1 2 "])
+    assert writer.getvalue() == b"t 0 7 90 d 1 2 \n"
+
+
+def test_send_command_queue_on_the_class_writes_to_stdout(monkeypatch):
+    stdout = io.TextIOWrapper(io.BytesIO())
+    monkeypatch.setattr(sys, "stdout", stdout)
+    networking.Game.send_command_queue(["t 0 7 90 ", "u 3 "])
+    assert stdout.buffer.getvalue() == b"t 0 7 90 u 3 \n"
+
+
+def _our_handlers():
+    return [handler for handler in logging.getLogger().handlers if handler is networking.Game._log_handler]
+
+
+@pytest.mark.parametrize("log_format", ["text", "json"])
+def test_file_logging(tmp_path, monkeypatch, log_format):
+    monkeypatch.chdir(tmp_path)
+    networking.Game._set_up_logging(1, "Test", "file", log_format)
+    logging.info("turn %d", 3)
+    networking.Game._tear_down_logging()
+    lines = (tmp_path / "1_Test.log").read_text().splitlines()
+    if log_format == "json":
+        entries = [json.loads(line) for line in lines]
+        assert [entry["message"] for entry in entries] == ["Initialized bot Test", "turn 3"]
+        assert entries[1]["level"] == "INFO"
+    else:
+        assert lines == ["INFO:root:Initialized bot Test", "INFO:root:turn 3"]
+
+
+def test_async_logging_writes_every_record_off_the_caller_thread(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    networking.Game._set_up_logging(2, "Test", "async", "json")
+    assert isinstance(networking.Game._log_handler, networking.DeferredQueueHandler)
+    for turn in range(100):
+        logging.info("turn %d", turn)
+    networking.Game._tear_down_logging()
+    messages = [json.loads(line)["message"] for line in (tmp_path / "2_Test.log").read_text().splitlines()]
+    assert messages == ["Initialized bot Test"] + ["turn %d" % turn for turn in range(100)]
+
+
+def test_setting_up_again_replaces_the_handler_and_writer_thread(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    networking.Game._set_up_logging(3, "Test", "async")
+    threads = threading.active_count()
+    handlers = len(logging.getLogger().handlers)
+    networking.Game._set_up_logging(3, "Test", "async")
+    networking.Game._set_up_logging(3, "Test", "file")
+    networking.Game._set_up_logging(3, "Test", "async")
+    assert len(logging.getLogger().handlers) == handlers
+    assert len(_our_handlers()) == 1
+    assert threading.active_count() == threads
+
+
+def test_logging_off_and_on_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    networking.Game._set_up_logging(4, "Test", "file")
+    networking.Game._set_up_logging(4, "Test", "off")
+    assert not _our_handlers()
+    assert not logging.getLogger().isEnabledFor(logging.CRITICAL)
+    logging.critical("dropped")
+    networking.Game._set_up_logging(4, "Test", "file")
+    assert logging.getLogger().isEnabledFor(logging.DEBUG)
+    logging.info("kept")
+    networking.Game._tear_down_logging()
+    assert (tmp_path / "4_Test.log").read_text().splitlines() == ["INFO:root:Initialized bot Test", "INFO:root:kept"]
+
+
+def test_unknown_logging_settings():
+    with pytest.raises(ValueError):
+        networking.Game._set_up_logging(5, "Test", "syslog")
+    with pytest.raises(ValueError):
+        networking.Game._set_up_logging(5, "Test", "file", "xml")
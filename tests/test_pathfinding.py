@@ -0,0 +1,127 @@
+"""
+Paths on the visibility graph against Dijkstra over every visible pair of corners.
+"""
+import heapq
+import math
+import random
+
+import pytest
+
+from benchmarks.frames import synthetic_frame
+from hlt import collision, constants, entity, game_map, pathfinding
+
+WIDTH, HEIGHT = 240, 160
+#: Distance the graph keeps from the planet surfaces with its default clearance
+MARGIN = constants.SHIP_RADIUS + 0.1 + 1.0
+
+
+@pytest.fixture(params=["numpy", "python"])
+def graphs(request, monkeypatch):
+    """
+    Build the graphs with the batched visibility tests and again one segment at a time.
+    """
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(pathfinding, "np", None)
+    return pathfinding
+
+
+def _planets(seed):
+    game = game_map.Map(0, WIDTH, HEIGHT)
+    game._parse(synthetic_frame(2, 1, 15, WIDTH, HEIGHT, seed))
+    return game.all_planets()
+
+
+def _free_points(rng, planets, count):
+    points = []
+    while len(points) < count:
+        point = entity.Position(rng.uniform(0, WIDTH), rng.uniform(0, HEIGHT))
+        if all(point.calculate_distance_between(planet) > planet.radius + MARGIN for planet in planets):
+            points.append(point)
+    return points
+
+
+def _dijkstra(graph, nodes, adjacent, start, goal):
+    """
+    :return: The length of the shortest way from start over the nodes to goal, inf if there is none
+    :rtype: float
+    """
+    if graph.reachable(start, goal):
+        return start.calculate_distance_between(goal)
+    count = len(nodes)
+    best = [math.inf] * count
+    heap = []
+    for index, node in enumerate(nodes):
+        if graph.visible(start, node):
+            best[index] = start.calculate_distance_between(node)
+            heapq.heappush(heap, (best[index], index))
+    result = math.inf
+    while heap:
+        length, index = heapq.heappop(heap)
+        if length > best[index]:
+            continue
+        if graph.visible(goal, nodes[index]):
+            result = min(result, length + nodes[index].calculate_distance_between(goal))
+        for other in adjacent[index]:
+            candidate = length + nodes[index].calculate_distance_between(nodes[other])
+            if candidate < best[other]:
+                best[other] = candidate
+                heapq.heappush(heap, (candidate, other))
+    return result
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_path_is_clear_and_shortest(graphs, seed):
+    planets = _planets(seed)
+    graph = graphs.VisibilityGraph(planets, WIDTH, HEIGHT)
+    nodes = graph._nodes
+    adjacent = [[other for other in range(len(nodes)) if other != index and graph.visible(node, nodes[other])]
+                for index, node in enumerate(nodes)]
+    rng = random.Random(seed)
+    points = _free_points(rng, planets, 60)
+    found = 0
+    for start, goal in zip(points[::2], points[1::2]):
+        path = graph.path(start, goal)
+        shortest = _dijkstra(graph, nodes, adjacent, start, goal)
+        if path is None:
+            assert shortest == math.inf
+            continue
+        found += 1
+        assert path[-1] is goal
+        length = 0.0
+        previous = start
+        for waypoint in path:
+            assert not any(collision.intersect_segment_circle(previous, waypoint, planet, fudge=MARGIN - 1e-6)
+                           for planet in planets)
+            length += previous.calculate_distance_between(waypoint)
+            previous = waypoint
+        assert length == pytest.approx(shortest)
+    assert found > 0
+
+
+def test_path_goes_straight_when_in_sight(graphs):
+    planets = _planets(0)
+    graph = graphs.VisibilityGraph(planets, WIDTH, HEIGHT)
+    start, goal = _free_points(random.Random(0), planets, 2)
+    goal = entity.Position(start.x + (goal.x - start.x) * 1e-3, start.y + (goal.y - start.y) * 1e-3)
+    assert graph.path(start, goal) == [goal]
+    assert graph.path(start, goal, blocked=lambda first, second: True) != [goal]
+
+
+def test_route_replans_once_the_destination_moved():
+    planets = _planets(1)
+    graph = pathfinding.VisibilityGraph(planets, WIDTH, HEIGHT)
+    rng = random.Random(1)
+    for start, goal in zip(*[iter(_free_points(rng, planets, 40))] * 2):
+        ship = entity.Ship(0, 0, start.x, start.y, 255, 0.0, 0.0, entity.Ship.DockingStatus.UNDOCKED, 0, 0, 0)
+        waypoints = graph.path(ship, goal)
+        if waypoints is None or len(waypoints) < 2:
+            continue
+        route = pathfinding.Route(waypoints, goal, 0)
+        assert route.is_valid(ship, goal, graph, 2)
+        moved = entity.Position(goal.x + 3, goal.y)
+        assert not route.is_valid(ship, moved, graph, 2)
+        assert route.next_waypoint(ship, goal, graph) is waypoints[0]
+        return
+    pytest.fail("no path around a planet")
@@ -0,0 +1,141 @@
+"""
+The spatial indexes against linear scans over the entities they hold.
+"""
+import random
+
+import pytest
+
+from benchmarks.frames import synthetic_frame, synthetic_frames
+from hlt import collision, entity, game_map, spatial
+
+WIDTH, HEIGHT = 240, 160
+
+
+def _planets(seed):
+    game = game_map.Map(0, WIDTH, HEIGHT)
+    game._parse(synthetic_frame(2, 1, 25, WIDTH, HEIGHT, seed))
+    return game.all_planets()
+
+
+def _random_point(rng):
+    return entity.Position(rng.uniform(0, WIDTH), rng.uniform(0, HEIGHT))
+
+
+def _grid_with_removals(rng):
+    grid = spatial.UniformGrid(8)
+    points = [_random_point(rng) for _ in range(200)]
+    for point in points:
+        grid.insert(point)
+    for point in points[::4]:
+        grid.remove(point)
+    return grid, [point for index, point in enumerate(points) if index % 4]
+
+
+def test_uniform_grid_query_radius():
+    rng = random.Random(0)
+    grid, kept = _grid_with_removals(rng)
+    assert len(grid) == len(kept)
+    for _ in range(100):
+        center = _random_point(rng)
+        radius = rng.uniform(0, 30)
+        found = [point for point in grid.query_radius(center, radius)
+                 if center.calculate_distance_between(point) <= radius]
+        assert found == [point for point in kept if center.calculate_distance_between(point) <= radius]
+        nearest = [point for _, point in grid.by_distance(center, radius)]
+        assert nearest == sorted(found, key=lambda point: (center.calculate_distance_between(point), kept.index(point)))
+
+
+def test_uniform_grid_query_segment():
+    rng = random.Random(1)
+    grid, kept = _grid_with_removals(rng)
+    for _ in range(200):
+        start = _random_point(rng)
+        end = entity.Position(start.x + rng.uniform(-40, 40), start.y + rng.uniform(-40, 40))
+        margin = rng.uniform(0, 3)
+        found = [point for point in grid.query_segment(start, end, margin)
+                 if collision.segment_distance(start, end, point) <= margin]
+        assert found == [point for point in kept if collision.segment_distance(start, end, point) <= margin]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_planet_index_query_segment(seed):
+    planets = _planets(seed)
+    index = spatial.PlanetIndex(planets)
+    order = [planet.id for planet in planets]
+    rng = random.Random(seed)
+    for _ in range(300):
+        start, end = _random_point(rng), _random_point(rng)
+        margin = rng.uniform(0, 3)
+        found = index.query_segment(start, end, margin)
+        touching = [planet.id for planet in planets
+                    if collision.segment_distance(start, end, planet) <= planet.radius + margin]
+        assert set(touching) <= set(found)
+        assert found == sorted(found, key=order.index)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_planet_index_query_point_and_order(seed):
+    planets = _planets(seed)
+    index = spatial.PlanetIndex(planets)
+    rng = random.Random(seed)
+    for _ in range(300):
+        point = _random_point(rng)
+        margin = rng.uniform(0, 3)
+        inside = [planet.id for planet in planets if point.calculate_distance_between(planet) <= planet.radius + margin]
+        assert set(inside) <= set(index.query_point(point, margin))
+        distances = [distance for distance, _ in index.by_distance(point)]
+        assert distances == sorted(point.calculate_distance_between(planet) for planet in planets)
+
+
+def test_empty_planet_index():
+    index = spatial.PlanetIndex([])
+    assert index.query_segment(entity.Position(0, 0), entity.Position(10, 10), 1) == []
+    assert index.query_point(entity.Position(0, 0), 1) == []
+    assert list(index.by_distance(entity.Position(0, 0))) == []
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_planet_field_bounds_are_safe(seed):
+    pytest.importorskip("numpy")
+    planets = _planets(seed)
+    field = spatial.PlanetField(planets, WIDTH, HEIGHT)
+    rng = random.Random(seed)
+    proven = 0
+    for _ in range(300):
+        start, end = _random_point(rng), _random_point(rng)
+        nearest = min(start.calculate_distance_between(planet) - planet.radius for planet in planets)
+        assert field.clearance(start) <= nearest + 1e-9
+        margin = rng.uniform(0, 3)
+        if field.segment_clear(start, end, margin):
+            proven += 1
+            assert all(collision.segment_distance(start, end, planet) > planet.radius + margin for planet in planets)
+    assert proven > 0
+
+
+def test_neighbour_list_matches_radius_scan_as_ships_move():
+    radius, skin = 15.1, 14
+    neighbours = spatial.NeighbourList(radius, skin)
+    game = game_map.Map(0, WIDTH, HEIGHT, incremental=True)
+    rebuilt, counts = [], []
+    for frame in synthetic_frames(8, 3, 60, 12, WIDTH, HEIGHT, 7):
+        game._parse(frame)
+        ships = game._all_ships()
+        neighbours.update(ships)
+        rebuilt.append(neighbours.rebuilt)
+        counts.append(len(ships))
+        assert len(neighbours) == len(ships)
+        for ship in ships:
+            assert ship in neighbours
+            found = {other.id for other in neighbours.neighbours(ship)}
+            for distance in (radius, radius / 3):
+                inside = [other for other in ships if other is not ship and
+                          ship.calculate_distance_between(other) <= distance]
+                assert {other.id for other in inside} <= found
+                assert sorted(other.id for other in neighbours.within(ship, distance)) == \
+                    sorted(other.id for other in inside)
+            assert all(ship.calculate_distance_between(other) <= radius + 2 * skin
+                       for other in neighbours.neighbours(ship))
+    # Docked ships and ships that moved less than half the skin keep their lists
+    assert rebuilt[0] == counts[0]
+    assert all(0 < count < total for count, total in zip(rebuilt[1:], counts[1:]))
+    assert entity.Position(0, 0) not in neighbours